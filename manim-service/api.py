@@ -1,16 +1,32 @@
 """
 Simple Flask API for generating Manim visualizations
 """
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Request, Response, request, jsonify, send_file
 from flask_cors import CORS
+from werkzeug.exceptions import RequestEntityTooLarge
+import hashlib
 import json
 import os
-import subprocess
+import re
+import sys
+import threading
+import time
 import uuid
-import shutil
+from collections import OrderedDict
 from pathlib import Path
 from dotenv import load_dotenv
-from tts_generator import generate_tts, combine_video_audio
+from render_pool import get_render_pool
+from render_pipeline import (MEDIA_DIR, RENDER_TIERS, DEFAULT_TIER, PipelineError,
+                             check_code, check_spec, hls_dir, in_flight_ids, profile_dir,
+                             render_dynamic, render_template, validate_dynamic)
+from ffmpeg_tools import HLS_PLAYLIST, hls_complete
+from jobs import FINISHED_EVENTS, FINISHED_STATUSES, get_job_store
+from video_cache import get_video_cache
+from tts_cache import get_tts_cache
+import metrics
+import segment_store
+import svg_cache
+from media_gc import get_media_collector, mark_served
 
 # Load environment variables from parent directory's .env.local
 parent_env = Path(__file__).parent.parent / '.env.local'
@@ -23,15 +39,114 @@ latex_path = "/Library/TeX/texbin"
 if os.path.exists(latex_path) and latex_path not in os.environ.get('PATH', ''):
     os.environ['PATH'] = f"{latex_path}:{os.environ.get('PATH', '')}"
 
+
+class LimitedRequest(Request):
+    """Request that reports a body cut off at MAX_CONTENT_LENGTH as too large"""
+
+    def on_json_loading_failed(self, e):
+        # Werkzeug stops reading a chunked body at the limit without raising, so
+        # an oversized body looks like truncated JSON; one more read raises 413
+        if self.content_length is None and e is not None:
+            self.stream.read(1)
+        return super().on_json_loading_failed(e)
+
+
 app = Flask(__name__)
+app.request_class = LimitedRequest
 CORS(app)
 
-# Configuration
-MEDIA_DIR = Path("./media")
-MEDIA_DIR.mkdir(exist_ok=True)
+# Largest request body accepted, answered with 413 above it; a full batch of
+# generated scenes is well under the default
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_REQUEST_BYTES', str(2 * 1024 * 1024)))
+
+# Video serving: long-lived caching for immutable video IDs, and optionally hand
+# the file transfer to a fronting web server (nginx/Apache) via X-Sendfile
+VIDEO_MAX_AGE = 365 * 24 * 3600
+app.use_x_sendfile = os.getenv('USE_X_SENDFILE', '').lower() in ('1', 'true', 'yes')
 
-TEMP_DIR = Path("./temp")
-TEMP_DIR.mkdir(exist_ok=True)
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', '100'))
+
+# HLS files a video directory may hold, and the seconds a client is told to wait
+# before asking again for a playlist whose first segment is not written yet
+HLS_FILE_RE = re.compile(r'^(index\.m3u8|init\.mp4|seg_\d+\.m4s)$')
+HLS_RETRY_AFTER = 1
+
+# Job event streams poll the job's event log, and send a comment now and then
+# so proxies do not close idle connections
+EVENTS_POLL_INTERVAL = 0.25
+EVENTS_KEEPALIVE = 15
+
+# Gauges read on every /metrics scrape; the media size is the one measured by the
+# last collector pass, since walking media/ on every scrape would be costly
+metrics.Gauge('manim_jobs_in_flight', 'Jobs queued or rendering',
+              lambda: get_job_store().in_flight())
+metrics.Gauge('manim_renders_in_flight', 'Visualizations being rendered, including blocking requests',
+              lambda: len(in_flight_ids()))
+metrics.Gauge('manim_media_bytes', 'Media bytes counted against the budget at the last collector pass',
+              lambda: get_media_collector().stats()['media_bytes'])
+
+ETAG_MEMO_SIZE = 4096
+_etag_memo = OrderedDict()
+_etag_lock = threading.Lock()
+
+
+def requested_tiers(data: dict) -> list:
+    """
+    Render tiers asked for by a request body, in publishing order
+
+    "tier" picks a single entry of RENDER_TIERS, and "progressive": true renders a
+    preview first and upgrades it to the standard tier in place.
+
+    Raises:
+        ValueError: Unknown tier
+    """
+    if data.get('progressive'):
+        return ['preview', DEFAULT_TIER]
+    tier = data.get('tier', DEFAULT_TIER)
+    if tier not in RENDER_TIERS:
+        raise ValueError(f"Unknown tier '{tier}', expected one of {', '.join(RENDER_TIERS)}")
+    return [tier]
+
+
+def job_request(data: dict) -> tuple:
+    """
+    Turn a /jobs request body into a (kind, payload) pair for the job store
+
+    Raises:
+        ValueError: The body has no code or problem, or asks for an unknown tier
+        PipelineError: The code fails the pre-flight checks, or the problem is
+                       not a valid spec
+    """
+    tiers = requested_tiers(data)
+
+    if data.get('code'):
+        # Reject code that cannot render now, rather than from a failed job later
+        check_code(data['code'])
+        return 'dynamic', {
+            'code': data['code'],
+            'narration': data.get('narration', ''),
+            'tiers': tiers,
+            'parallel': bool(data.get('parallel')),
+            'hls': bool(data.get('hls')),
+            'profile': bool(data.get('profile')),
+        }
+    if isinstance(data.get('problem'), dict):
+        return 'template', {'problem': check_spec(data['problem']), 'tiers': tiers,
+                            'hls': bool(data.get('hls')),
+                            'profile': bool(data.get('profile'))}
+    raise ValueError("No code or problem provided")
+
+
+@app.errorhandler(413)
+def request_too_large(e):
+    """
+    Answer bodies over MAX_CONTENT_LENGTH, with or without a Content-Length
+
+    Flask raises the error when a view reads the body, so views re-raise it
+    rather than reporting it as a 500.
+    """
+    max_bytes = app.config['MAX_CONTENT_LENGTH']
+    return jsonify({"error": f"Request body is larger than {max_bytes} bytes"}), 413
 
 
 @app.route('/health', methods=['GET'])
@@ -40,6 +155,24 @@ def health_check():
     return jsonify({"status": "healthy", "service": "manim-visualizer"})
 
 
+@app.route('/stats', methods=['GET'])
+def stats():
+    """Cache statistics"""
+    return jsonify({
+        "video_cache": get_video_cache().stats(),
+        "tts_cache": get_tts_cache().stats(),
+        "svg_cache": svg_cache.stats(),
+        "segment_cache": segment_store.stats(),
+        "media_gc": get_media_collector().stats(),
+    })
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Stage latencies, failures and gauges in the Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
 @app.route('/generate-dynamic', methods=['POST'])
 def generate_dynamic_visualization():
     """
@@ -48,7 +181,11 @@ def generate_dynamic_visualization():
     Request body:
     {
         "code": "Python code with GeneratedScene class",
-        "narration": "Optional text for voice narration (TTS)"
+        "narration": "Optional text for voice narration (TTS)",
+        "tier": "Optional render tier, preview or standard (default)",
+        "parallel": "Optional, true to render slices of a long scene on several workers",
+        "hls": "Optional, true to also package the video as HLS (adds hls_url)",
+        "profile": "Optional, true to profile the render (adds profile_url)"
     }
     """
     try:
@@ -59,99 +196,58 @@ def generate_dynamic_visualization():
         if not code:
             return jsonify({"error": "No code provided"}), 400
 
+        tier = data.get('tier', DEFAULT_TIER)
+        if tier not in RENDER_TIERS:
+            return jsonify({"error": f"Unknown tier '{tier}'"}), 400
+
         # Generate unique ID
         viz_id = str(uuid.uuid4())
-        output_file = f"scene_{viz_id}"
-
-        # Write code to temporary file (in temp dir to avoid Flask auto-reload)
-        code_file = TEMP_DIR / f"{viz_id}.py"
-        with open(code_file, 'w') as f:
-            f.write(code)
-
-        # Execute the generated code
-        result = subprocess.run(
-            [
-                './venv/bin/python',
-                'dynamic_scene_generator.py',
-                str(code_file),
-                output_file
-            ],
-            capture_output=True,
-            text=True,
-            cwd=os.path.dirname(os.path.abspath(__file__)),
-            timeout=60  # 60 second timeout
-        )
 
-        # Clean up code file
-        code_file.unlink()
+        return jsonify(render_dynamic(viz_id, code, narration, tier=tier,
+                                      parallel=bool(data.get('parallel')),
+                                      hls=bool(data.get('hls')),
+                                      profile=bool(data.get('profile'))))
 
-        if result.returncode != 0:
-            return jsonify({
-                "error": "Failed to generate visualization",
-                "details": result.stderr
-            }), 500
+    except PipelineError as e:
+        return jsonify(e.to_dict()), e.status
+    except RequestEntityTooLarge:
+        raise
+    except Exception as e:
+        return jsonify({
+            "error": "Internal server error",
+            "details": str(e)
+        }), 500
 
-        # Find the generated video file
-        video_path = None
-        possible_paths = [
-            MEDIA_DIR / "videos" / "720p30" / f"{output_file}.mp4",
-            MEDIA_DIR / "videos" / "1080p60" / f"{output_file}.mp4",
-        ]
 
-        for path in possible_paths:
-            if path.exists():
-                video_path = path
-                break
-
-        if not video_path:
-            media_contents = list(MEDIA_DIR.rglob("*.mp4"))
-            return jsonify({
-                "error": "Video file not found",
-                "found_files": [str(p) for p in media_contents[:5]]
-            }), 500
-
-        # Generate TTS and combine with video if narration is provided
-        final_video_path = video_path
-        if narration:
-            print(f"[API] Generating TTS for narration...")
-            audio_path = MEDIA_DIR / f"{viz_id}_audio.wav"
-
-            # Generate TTS
-            if generate_tts(narration, audio_path):
-                # Combine video with audio
-                combined_path = MEDIA_DIR / f"{viz_id}_with_audio.mp4"
-                if combine_video_audio(video_path, audio_path, combined_path):
-                    final_video_path = combined_path
-                    print(f"[API] Successfully added voice narration to video")
-                else:
-                    print(f"[API] Failed to combine video and audio, using silent video")
-
-                # Clean up temporary audio file
-                if audio_path.exists():
-                    audio_path.unlink()
-            else:
-                print(f"[API] Failed to generate TTS, using silent video")
+@app.route('/validate', methods=['POST'])
+def validate_code():
+    """
+    Dry-run AI-generated Manim code without rendering it
 
-        # Copy final video to public directory
-        public_file = MEDIA_DIR / f"{viz_id}.mp4"
-        shutil.copy(final_video_path, public_file)
+    Runs GeneratedScene.construct with animations skipped, so no frames are
+    drawn and no video is encoded.
 
-        # Clean up temporary combined video if it was created
-        if final_video_path != video_path and final_video_path.exists():
-            final_video_path.unlink()
+    Request body:
+    {
+        "code": "Python code with GeneratedScene class"
+    }
 
-        return jsonify({
-            "success": True,
-            "video_id": viz_id,
-            "video_url": f"/video/{viz_id}",
-            "file_path": str(public_file),
-            "has_audio": narration != '' and final_video_path != video_path
-        })
-
-    except subprocess.TimeoutExpired:
-        return jsonify({
-            "error": "Visualization generation timed out (>60s)"
-        }), 500
+    Returns 200 with the estimated "duration" in seconds, or 422 with the
+    "error", the traceback as "details" and the offending "line" of the code.
+    """
+    try:
+        data = request.json or {}
+        code = data.get('code')
+
+        if not code:
+            return jsonify({"error": "No code provided"}), 400
+
+        return jsonify(validate_dynamic(code))
+
+    except PipelineError as e:
+        return jsonify(e.to_dict()), e.status
+    except RequestEntityTooLarge:
+        raise
     except Exception as e:
         return jsonify({
             "error": "Internal server error",
@@ -167,85 +263,189 @@ def generate_visualization():
     Request body:
     {
         "type": "equation|graph|geometry|number_line|function|generic",
+        "title": "Optional title",
         "content": "problem description",
         "equation": "x^2 + 2x + 1 = 0",  // for equation type
-        "steps": ["step1", "step2"],      // for equation type
+        "steps": ["step1", {"tex": "step2", "note": "..."}],  // for equation type
         "function": "x**2",               // for graph/function type
+        "functions": [{"function": "sin(x)", "color": "red"}],  // for graph type
+        "transformations": ["(x-1)^2"],   // for function type
         "shapes": [...],                  // for geometry type
         "points": [...]                   // for number_line type
     }
+
+    The body is validated against the spec format in scene_spec.py; malformed
+    specs are rejected with 422 and the "path" of the offending value.
+    "hls": true also packages the video as HLS and adds its "hls_url", and
+    "profile": true profiles the render and adds its "profile_url".
     """
     try:
         problem_data = request.json
 
         # Generate unique ID for this visualization
         viz_id = str(uuid.uuid4())
-        output_file = f"scene_{viz_id}"
-
-        # Add output file to problem data
-        problem_data['output_file'] = output_file
-
-        # Convert problem data to JSON string
-        problem_json = json.dumps(problem_data)
-
-        # Run manim scene generator
-        result = subprocess.run(
-            [
-                './venv/bin/python',
-                'scene_generator.py',
-                problem_json
-            ],
-            capture_output=True,
-            text=True,
-            cwd=os.path.dirname(os.path.abspath(__file__))
-        )
 
-        if result.returncode != 0:
-            return jsonify({
-                "error": "Failed to generate visualization",
-                "details": result.stderr
-            }), 500
+        options = problem_data if isinstance(problem_data, dict) else {}
+
+        return jsonify(render_template(viz_id, problem_data, hls=bool(options.get('hls')),
+                                       profile=bool(options.get('profile'))))
+
+    except PipelineError as e:
+        return jsonify(e.to_dict()), e.status
+    except RequestEntityTooLarge:
+        raise
+    except Exception as e:
+        return jsonify({
+            "error": "Internal server error",
+            "details": str(e)
+        }), 500
+
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """
+    Queue a visualization and return its job ID immediately
+
+    Request body is either a /generate-dynamic body:
+    {
+        "code": "Python code with GeneratedScene class",
+        "narration": "Optional text for voice narration (TTS)"
+    }
+    or a /generate body wrapped in "problem":
+    {
+        "problem": {"type": "equation", "equation": "x^2 = 4", ...}
+    }
+    Either may add "tier": "preview" | "standard", or "progressive": true to
+    publish a quick preview first and replace it with the standard render.
+    Code may add "parallel": true to render slices of a long scene on several
+    workers at once, and either may add "hls": true to also package every
+    published tier as HLS, or "profile": true to profile every tier's render.
+    With "hls", the "muxing" stage event of each tier carries its "hls_url",
+    whose segments can be played while the rest of the video is muxed.
+
+    Code that fails the static pre-flight checks is rejected with 422 and the
+    offending "kind" and "line", without queueing a job.
+    """
+    try:
+        data = request.json or {}
+
+        try:
+            kind, payload = job_request(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
-        # Find the generated video file
-        video_path = MEDIA_DIR / "videos" / "1080p60" / f"{output_file}.mp4"
+        job = get_job_store().submit(kind, payload)
 
-        # Alternative paths manim might use
-        alt_paths = [
-            MEDIA_DIR / "videos" / "scene_generator" / "1080p60" / f"{output_file}.mp4",
-            MEDIA_DIR / "videos" / "scene_generator" / "720p30" / f"{output_file}.mp4",
-            MEDIA_DIR / "videos" / "720p30" / f"{output_file}.mp4",
+        return jsonify({
+            "job_id": job["job_id"],
+            "status": job["status"],
+            "status_url": f"/jobs/{job['job_id']}"
+        }), 202
+
+    except PipelineError as e:
+        return jsonify(e.to_dict()), e.status
+    except RequestEntityTooLarge:
+        raise
+    except Exception as e:
+        return jsonify({
+            "error": "Internal server error",
+            "details": str(e)
+        }), 500
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Report the status of a queued visualization
+
+    Status is one of queued, rendering, tts, muxing, done or failed.
+    Finished jobs include the /generate response as "result", failed jobs
+    include "error" and "details". "available_tier" names the tier currently
+    published at the video URL; progressive jobs set it to "preview" and keep
+    rendering until the standard tier replaces it.
+    """
+    job = get_job_store().get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+
+@app.route('/jobs/<job_id>/profile', methods=['GET'])
+def get_profile(job_id):
+    """
+    Where the time went in a job's profiled renders, by tier
+
+    Also answers for renders of the blocking endpoints, by video ID. Each tier
+    has the seconds spent per phase (tex, text, mobject_updates, rasterize,
+    encode, combine and other), per-frame costs, the functions with the most
+    cumulative time, and the URL of the full cProfile dump.
+    """
+    breakdowns = {}
+    for path in sorted(profile_dir(job_id).glob('*.json')):
+        with open(path) as f:
+            breakdowns[path.stem] = dict(json.load(f),
+                                         profile_url=f"/jobs/{job_id}/profile/{path.stem}.prof")
+    if not breakdowns:
+        return jsonify({"error": "Profile not found"}), 404
+    return jsonify({"job_id": job_id, "tiers": breakdowns})
+
+
+@app.route('/jobs/<job_id>/profile/<tier>.prof', methods=['GET'])
+def download_profile(job_id, tier):
+    """The cProfile dump of a tier's render, for python -m pstats or snakeviz"""
+    path = profile_dir(job_id) / f"{tier}.prof"
+    if tier not in RENDER_TIERS or not path.exists():
+        return jsonify({"error": "Profile not found"}), 404
+    return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                     download_name=f"{job_id}.{tier}.prof")
+
+
+@app.route('/generate-batch', methods=['POST'])
+def generate_batch():
+    """
+    Queue many visualizations at once, spread across every render worker
+
+    Request body:
+    {
+        "items": [
+            {"code": "...", "narration": "..."},
+            {"problem": {"type": "graph", "function": "x**2"}},
+            ...
         ]
+    }
 
-        # Check all possible paths
-        found_path = None
-        if video_path.exists():
-            found_path = video_path
-        else:
-            for alt_path in alt_paths:
-                if alt_path.exists():
-                    found_path = alt_path
-                    break
-
-        if not found_path:
-            # List what was actually created
-            media_contents = list(MEDIA_DIR.rglob("*.mp4"))
-            return jsonify({
-                "error": "Video file not found",
-                "expected": str(video_path),
-                "found_files": [str(p) for p in media_contents]
-            }), 500
-
-        # Copy to public directory with consistent naming
-        public_file = MEDIA_DIR / f"{viz_id}.mp4"
-        shutil.copy(found_path, public_file)
+    Each item is a /jobs body. The whole batch is rejected (with the failing
+    "index") if any item is invalid, otherwise it answers 202 with the batch ID;
+    poll GET /batches/<batch_id> for per-item results as they finish.
+    """
+    try:
+        data = request.json or {}
+        items = data.get('items')
+
+        if not isinstance(items, list) or not items:
+            return jsonify({"error": "No items provided"}), 400
+        if len(items) > BATCH_MAX_ITEMS:
+            return jsonify({"error": f"At most {BATCH_MAX_ITEMS} items per batch"}), 400
+
+        job_requests = []
+        for index, item in enumerate(items):
+            try:
+                job_requests.append(job_request(item if isinstance(item, dict) else {}))
+            except ValueError as e:
+                return jsonify({"error": str(e), "index": index}), 400
+            except PipelineError as e:
+                return jsonify({**e.to_dict(), "index": index}), e.status
+
+        batch = get_job_store().submit_batch(job_requests)
 
         return jsonify({
-            "success": True,
-            "video_id": viz_id,
-            "video_url": f"/video/{viz_id}",
-            "file_path": str(public_file)
-        })
+            "batch_id": batch["batch_id"],
+            "job_ids": batch["job_ids"],
+            "status_url": f"/batches/{batch['batch_id']}"
+        }), 202
 
+    except RequestEntityTooLarge:
+        raise
     except Exception as e:
         return jsonify({
             "error": "Internal server error",
@@ -253,16 +453,195 @@ def generate_visualization():
         }), 500
 
 
+@app.route('/batches/<batch_id>', methods=['GET'])
+def get_batch(batch_id):
+    """
+    Report the progress of a batch
+
+    Includes every item's job record in submission order, counts by status,
+    "done" once every item has finished, and the batch's "wall_seconds" against
+    the "render_seconds" its items spent rendering.
+    """
+    batch = get_job_store().get_batch(batch_id)
+    if batch is None:
+        return jsonify({"error": "Batch not found"}), 404
+    return jsonify(batch)
+
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """
+    Stream a job's progress as server-sent events
+
+    Event types:
+        stage      - status change: queued, rendering, tts or muxing (with the tier)
+        animation  - a Scene.play/wait finished rendering: "index", "frames",
+                     "run_time", "scene_time" and "elapsed" seconds since the render began
+        published  - a preview tier is playable, with its "result"
+        done       - the job finished, with its "result" (the stream then ends)
+        failed     - the job failed, with "error" and "details" (the stream then ends)
+
+    Event IDs are offsets into the log, so a reconnecting client resumes after
+    the last event it saw via Last-Event-ID.
+    """
+    store = get_job_store()
+    if store.get(job_id) is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    # An ID this server did not send starts the stream over
+    try:
+        offset = max(int(request.headers.get('Last-Event-ID', 0)), 0)
+    except ValueError:
+        offset = 0
+
+    def format_event(event_id, event):
+        return f"id: {event_id}\nevent: {event['event']}\ndata: {json.dumps(event)}\n\n"
+
+    def stream(offset):
+        last_sent = time.monotonic()
+        while True:
+            events = store.read_events(job_id, offset)
+            for offset, event in events:
+                yield format_event(offset, event)
+                if event['event'] in FINISHED_EVENTS:
+                    return
+
+            if events:
+                last_sent = time.monotonic()
+            else:
+                # A finished job whose log is gone still gets its final event
+                job = store.get(job_id)
+                if job is None or (job['status'] in FINISHED_STATUSES
+                                   and not store.read_events(job_id, offset)):
+                    if job is not None:
+                        yield format_event(offset, {"event": job['status'], **job})
+                    return
+                if time.monotonic() - last_sent > EVENTS_KEEPALIVE:
+                    yield ": keep-alive\n\n"
+                    last_sent = time.monotonic()
+            time.sleep(EVENTS_POLL_INTERVAL)
+
+    return Response(stream(offset), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
+
+def video_etag(video_path: Path) -> str:
+    """
+    Strong ETag for a published video, derived from its content
+
+    Videos are never modified in place, so the hash is computed once per file
+    and remembered for as long as its size and modification time are unchanged.
+    """
+    stat = video_path.stat()
+    memo_key = (str(video_path), stat.st_mtime_ns, stat.st_size)
+
+    with _etag_lock:
+        etag = _etag_memo.get(memo_key)
+        if etag is not None:
+            _etag_memo.move_to_end(memo_key)
+            return etag
+
+    hasher = hashlib.sha256()
+    with open(video_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            hasher.update(chunk)
+    etag = hasher.hexdigest()
+
+    with _etag_lock:
+        _etag_memo[memo_key] = etag
+        while len(_etag_memo) > ETAG_MEMO_SIZE:
+            _etag_memo.popitem(last=False)
+    return etag
+
+
 @app.route('/video/<video_id>', methods=['GET'])
 def get_video(video_id):
-    """Serve a generated video file"""
+    """
+    Serve a generated video file
+
+    Supports byte-range requests (206) for seeking, and conditional requests
+    against a strong content ETag and Last-Modified. Video IDs never change
+    content once their job is finished, so responses may be cached for a year;
+    a preview awaiting its upgrade must be revalidated instead.
+    """
     try:
         video_path = MEDIA_DIR / f"{video_id}.mp4"
 
         if not video_path.exists():
             return jsonify({"error": "Video not found"}), 404
 
-        return send_file(video_path, mimetype='video/mp4')
+        start = time.perf_counter()
+        job = get_job_store().get(video_id)
+        final = job is None or job.get('status') in FINISHED_STATUSES
+
+        mark_served(video_path)
+        response = send_file(
+            video_path,
+            mimetype='video/mp4',
+            conditional=True,
+            etag=video_etag(video_path),
+            max_age=VIDEO_MAX_AGE if final else 0
+        )
+        response.cache_control.public = True
+        if final:
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.no_cache = True
+        # Time to answer, hashing included; the transfer itself is left to the
+        # WSGI server's file wrapper (or X-Sendfile) and is not part of it
+        metrics.STAGE_SECONDS.observe(time.perf_counter() - start, stage='serve')
+        return response
+
+    except Exception as e:
+        return jsonify({
+            "error": "Failed to retrieve video",
+            "details": str(e)
+        }), 500
+
+
+@app.route('/video/<video_id>/hls/<tier>/<name>', methods=['GET'])
+def get_hls(video_id, tier, name):
+    """
+    Serve the HLS playlist or a segment of a video packaged with "hls": true
+
+    The playlist is rewritten as segments are written, so it is only cacheable
+    once it ends with #EXT-X-ENDLIST; segments never change once written. A
+    playlist asked for while the video is rendering, or before its first
+    segment is muxed, is answered with 202 and Retry-After.
+    """
+    try:
+        if tier not in RENDER_TIERS or not HLS_FILE_RE.match(name):
+            return jsonify({"error": "Not found"}), 404
+
+        output_dir = hls_dir(video_id, tier)
+        path = output_dir / name
+        video_path = MEDIA_DIR / f"{video_id}.mp4"
+
+        if name == HLS_PLAYLIST and not path.exists() and (
+                output_dir.exists() or video_id in in_flight_ids()):
+            # Still rendering, or muxing and yet to write the first segment
+            return jsonify({"status": "pending"}), 202, {'Retry-After': str(HLS_RETRY_AFTER)}
+
+        if not path.exists():
+            return jsonify({"error": "Not found"}), 404
+
+        if name == HLS_PLAYLIST:
+            final = hls_complete(output_dir)
+            mark_served(video_path)
+            response = send_file(path, mimetype='application/vnd.apple.mpegurl',
+                                 conditional=True, max_age=VIDEO_MAX_AGE if final else 0)
+        else:
+            final = True
+            response = send_file(path, mimetype='video/mp4', conditional=True,
+                                 max_age=VIDEO_MAX_AGE)
+        response.cache_control.public = True
+        if final:
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.no_cache = True
+        return response
 
     except Exception as e:
         return jsonify({
@@ -273,13 +652,16 @@ def get_video(video_id):
 
 @app.route('/cleanup', methods=['POST'])
 def cleanup():
-    """Clean up old video files"""
+    """
+    Run a media garbage collection pass now
+
+    Removes stale partial files, expired files and least recently served
+    videos over the media byte budget; renders in flight are left alone.
+    """
     try:
-        # Remove all .mp4 files in media directory
-        for video_file in MEDIA_DIR.glob("*.mp4"):
-            video_file.unlink()
+        summary = get_media_collector().collect()
 
-        return jsonify({"success": True, "message": "Cleanup completed"})
+        return jsonify({"success": True, "message": "Cleanup completed", **summary})
 
     except Exception as e:
         return jsonify({
@@ -289,10 +671,22 @@ def cleanup():
 
 
 if __name__ == '__main__':
+    # The Flask debug server only runs when asked for; otherwise hand over to
+    # the production server, which imports this module itself
+    if '--dev' not in sys.argv[1:]:
+        serve_py = str(Path(__file__).with_name('serve.py'))
+        os.execv(sys.executable, [sys.executable, serve_py])
+
     # Use stat reloader instead of watchdog to avoid restarts when
     # media files are generated. Stat reloader only watches Python files.
     os.environ['WERKZEUG_RUN_MAIN'] = os.environ.get('WERKZEUG_RUN_MAIN', 'false')
 
+    # Warm up render workers and start the media collector in the serving
+    # process only, not the reloader parent
+    if os.environ['WERKZEUG_RUN_MAIN'] == 'true':
+        get_render_pool().start()
+        get_media_collector().start()
+
     app.run(
         host='0.0.0.0',
         port=5001,
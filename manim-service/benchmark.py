@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Reproducible render benchmark over a versioned scene corpus, no server needed
+Usage: python benchmark.py [--runs N] [--corpus DIR] [--output FILE] [--baseline FILE] [--save-baseline]
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Every run starts cold: no SVGs or segments left over from another run or render
+os.environ['SVG_CACHE_DISABLED'] = '1'
+os.environ['SEGMENT_CACHE_DISABLED'] = '1'
+
+SERVICE_DIR = Path(__file__).parent.resolve()
+BENCHMARKS_DIR = SERVICE_DIR / 'benchmarks'
+CORPUS_DIR = BENCHMARKS_DIR / 'corpus' / 'v1'
+RESULTS_DIR = BENCHMARKS_DIR / 'results'
+BASELINE_FILE = BENCHMARKS_DIR / 'baseline.json'
+
+METRICS = ('wall_seconds', 'cpu_seconds', 'peak_rss_mb', 'output_bytes', 'mux_seconds')
+
+# A metric regresses when its median grows by more than the tolerance and by more
+# than its noise floor, so millisecond jitter on quick scenes is not reported
+TOLERANCE = float(os.getenv('BENCHMARK_TOLERANCE', '0.10'))
+NOISE_FLOOR = {
+    'wall_seconds': 0.1,
+    'cpu_seconds': 0.1,
+    'peak_rss_mb': 20,
+    'output_bytes': 4096,
+    'mux_seconds': 0.05,
+}
+
+
+def load_corpus(corpus_dir: Path) -> dict:
+    """Read a corpus manifest, inlining the code of its dynamic scenes"""
+    with open(corpus_dir / 'manifest.json') as f:
+        corpus = json.load(f)
+    for scene in corpus['scenes']:
+        if scene['kind'] == 'dynamic':
+            scene['code'] = (corpus_dir / scene['code_file']).read_text()
+    return corpus
+
+
+def render_job(scene: dict, tier: str, work_dir: Path) -> dict:
+    """The render worker job for a corpus scene, as the render pipeline builds it"""
+    from render_pipeline import RENDER_TIERS
+    from scene_spec import parse_spec
+
+    job = {
+        'kind': scene['kind'],
+        'output_file': scene['name'],
+        'output_dir': str(work_dir / 'render'),
+        'render_config': RENDER_TIERS[tier],
+    }
+    if scene['kind'] == 'dynamic':
+        job['code'] = scene['code']
+    else:
+        job['problem_data'] = parse_spec(scene['problem'])
+    return job
+
+
+def render_child(job_file: Path):
+    """
+    Render one job in this (fresh) process and write its measurements next to it
+
+    Runs in its own interpreter so peak RSS belongs to this scene alone. Manim
+    is imported, as a render worker does, before anything is measured.
+    """
+    os.chdir(SERVICE_DIR)
+    with open(job_file) as f:
+        job = json.load(f)
+    work_dir = job_file.parent
+
+    from manim import config
+    import dynamic_scene_generator
+    import scene_generator  # noqa: F401
+    from render_worker import max_rss_mb, run_job
+    dynamic_scene_generator._base_namespace()
+    config.progress_bar = "none"
+    # Compile every TeX and Text string, as the first render of a string does
+    config.tex_dir = str(work_dir / 'Tex')
+    config.text_dir = str(work_dir / 'texts')
+
+    self_before = resource.getrusage(resource.RUSAGE_SELF)
+    children_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = time.perf_counter()
+    video_path = run_job(job)
+    wall_seconds = time.perf_counter() - start
+    self_after = resource.getrusage(resource.RUSAGE_SELF)
+    children_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    # Frames are encoded on threads of this process; LaTeX and dvisvgm are children
+    cpu_seconds = sum(after.ru_utime - before.ru_utime + after.ru_stime - before.ru_stime
+                      for before, after in ((self_before, self_after),
+                                            (children_before, children_after)))
+
+    with open(work_dir / 'measurements.json', 'w') as f:
+        json.dump({
+            'video_path': video_path,
+            'wall_seconds': wall_seconds,
+            'cpu_seconds': cpu_seconds,
+            'peak_rss_mb': max_rss_mb(),
+        }, f)
+
+
+def run_scene(scene: dict, tier: str) -> dict:
+    """
+    Render a corpus scene in a fresh process, then mux a tone into it
+
+    Returns:
+        dict: One sample of every metric
+    """
+    from ffmpeg_tools import probe_duration, run_ffmpeg
+    from tts_generator import combine_video_audio
+
+    (SERVICE_DIR / 'temp').mkdir(exist_ok=True)
+    work_dir = Path(tempfile.mkdtemp(prefix=f"bench-{scene['name']}-", dir=SERVICE_DIR / 'temp'))
+    try:
+        job_file = work_dir / 'job.json'
+        with open(job_file, 'w') as f:
+            json.dump(render_job(scene, tier, work_dir), f)
+        child = subprocess.run([sys.executable, str(Path(__file__).resolve()),
+                                '--render-child', str(job_file)],
+                               cwd=SERVICE_DIR, capture_output=True, text=True)
+        if child.returncode != 0:
+            raise RuntimeError(child.stderr.strip()[-2000:] or f"exit code {child.returncode}")
+        with open(work_dir / 'measurements.json') as f:
+            sample = json.load(f)
+        video_path = Path(sample.pop('video_path'))
+        sample['output_bytes'] = video_path.stat().st_size
+
+        # A deterministic stand-in for narration, as long as the video
+        audio_path = work_dir / 'narration.wav'
+        run_ffmpeg(['-y', '-f', 'lavfi', '-i', f"sine=frequency=440:duration={probe_duration(video_path):.3f}",
+                    '-ac', '1', '-ar', '24000', str(audio_path)])
+        start = time.perf_counter()
+        if not combine_video_audio(video_path, audio_path, work_dir / 'with_audio.mp4'):
+            raise RuntimeError("Muxing the narration failed")
+        sample['mux_seconds'] = time.perf_counter() - start
+        return sample
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def summarize(samples: list) -> dict:
+    return {
+        'median': statistics.median(samples),
+        'min': min(samples),
+        'max': max(samples),
+        'samples': samples,
+    }
+
+
+def environment() -> dict:
+    """What the results depend on besides the code, to tell apart baselines from other machines"""
+    try:
+        from importlib.metadata import version
+        manim_version = version('manim')
+    except Exception:
+        manim_version = None
+    return {
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'manim': manim_version,
+    }
+
+
+def run_corpus(corpus: dict, runs: int) -> dict:
+    """Render every scene runs times, interleaving scenes so drift affects them all alike"""
+    tier = corpus.get('tier', 'standard')
+    samples = {scene['name']: {metric: [] for metric in METRICS} for scene in corpus['scenes']}
+    errors = {}
+
+    for run in range(runs):
+        for scene in corpus['scenes']:
+            name = scene['name']
+            if name in errors:
+                continue
+            try:
+                sample = run_scene(scene, tier)
+            except Exception as e:
+                errors[name] = str(e)
+                print(f"  {name}: failed\n{e}")
+                continue
+            for metric in METRICS:
+                samples[name][metric].append(sample[metric])
+            print(f"  run {run + 1}/{runs} {name:<14} {sample['wall_seconds']:6.2f}s wall "
+                  f"{sample['cpu_seconds']:6.2f}s cpu {sample['peak_rss_mb']:6.0f} MB "
+                  f"{sample['output_bytes'] / 1024:7.0f} KB mux {sample['mux_seconds']:.2f}s")
+
+    return {
+        'corpus': corpus['version'],
+        'tier': tier,
+        'runs': runs,
+        'created_at': time.time(),
+        'environment': environment(),
+        'scenes': {name: ({'error': errors[name]} if name in errors else
+                          {metric: summarize(values) for metric, values in metrics.items()})
+                   for name, metrics in samples.items()},
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float = TOLERANCE) -> list:
+    """
+    Compare the medians of two result files
+
+    Returns:
+        list: (scene, metric, baseline median, new median) of every regression;
+              a scene that failed or is missing from the results also counts
+    """
+    if results['corpus'] != baseline['corpus'] or results['tier'] != baseline['tier']:
+        raise ValueError(f"Results of corpus {results['corpus']} at {results['tier']} cannot be "
+                         f"compared with a baseline of {baseline['corpus']} at {baseline['tier']}")
+
+    regressions = []
+    for name, base in baseline['scenes'].items():
+        if 'error' in base:
+            continue
+        new = results['scenes'].get(name)
+        if new is None or 'error' in new:
+            regressions.append((name, 'error', None, None))
+            continue
+        for metric in METRICS:
+            before, after = base[metric]['median'], new[metric]['median']
+            if after > before * (1 + tolerance) and after - before > NOISE_FLOOR[metric]:
+                regressions.append((name, metric, before, after))
+    return regressions
+
+
+def print_comparison(results: dict, baseline: dict):
+    print(f"\n{'scene':<14} " + ' '.join(f"{metric:>18}" for metric in METRICS))
+    for name, new in results['scenes'].items():
+        base = baseline['scenes'].get(name, {})
+        if 'error' in new or 'error' in base or not base:
+            print(f"{name:<14} {'failed' if 'error' in new else 'not in baseline'}")
+            continue
+        cells = []
+        for metric in METRICS:
+            before, after = base[metric]['median'], new[metric]['median']
+            change = (after - before) / before * 100 if before else 0.0
+            cells.append(f"{after:>10.4g} {change:+6.1f}%")
+        print(f"{name:<14} " + ' '.join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=3, help="renders of each scene (default: 3)")
+    parser.add_argument('--corpus', type=Path, default=CORPUS_DIR, help="corpus directory")
+    parser.add_argument('--output', type=Path, help="results file (default: benchmarks/results/...)")
+    parser.add_argument('--baseline', type=Path, default=BASELINE_FILE,
+                        help="results to compare with (default: benchmarks/baseline.json)")
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="also store the results as the baseline")
+    parser.add_argument('--render-child', type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.render_child:
+        render_child(args.render_child)
+        return 0
+
+    os.chdir(SERVICE_DIR)
+    corpus = load_corpus(args.corpus)
+    print(f"Benchmarking corpus {corpus['version']}: {len(corpus['scenes'])} scenes, "
+          f"{args.runs} runs each\n")
+    results = run_corpus(corpus, args.runs)
+
+    output = args.output or RESULTS_DIR / time.strftime(f"{corpus['version']}-%Y%m%d-%H%M%S.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    status = 1 if any('error' in scene for scene in results['scenes'].values()) else 0
+    if args.baseline.exists() and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['environment'] != results['environment']:
+            print(f"Warning: the baseline was recorded on {baseline['environment']}")
+        print_comparison(results, baseline)
+        regressions = compare(results, baseline)
+        for name, metric, before, after in regressions:
+            print(f"REGRESSION {name} {metric}" +
+                  ("" if before is None else f": {before:.4g} -> {after:.4g}"))
+        if regressions:
+            status = 1
+        else:
+            print(f"\nNo regressions against {args.baseline} (tolerance {TOLERANCE:.0%})")
+
+    if args.save_baseline:
+        shutil.copyfile(output, args.baseline)
+        print(f"Baseline saved to {args.baseline}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Benchmark /generate template throughput: warm in-process workers vs one subprocess per scene
+Usage: python benchmark_templates.py [rounds]
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Measure rendering, not segments reused from the previous round
+os.environ.setdefault('SEGMENT_CACHE_DISABLED', '1')
+
+from render_pipeline import DEFAULT_TIER, RENDER_TIERS, RENDER_TIMEOUT  # noqa: E402
+from render_pool import get_render_pool  # noqa: E402
+from scene_spec import parse_spec  # noqa: E402
+
+SERVICE_DIR = Path(__file__).parent.resolve()
+
+# One spec per template, in the original problem data format
+SPECS = [
+    {"type": "equation", "equation": "2x + 3 = 7", "steps": ["2x = 4", "x = 2"]},
+    {"type": "graph", "function": "x**2"},
+    {"type": "geometry", "shapes": [{"type": "circle", "radius": 1},
+                                    {"type": "square", "side": 2}]},
+    {"type": "number_line", "start": -5, "end": 5, "points": [{"value": 2, "label": "x"}]},
+    {"type": "function", "function": "x^2", "transformations": ["(x-1)^2"]},
+    {"type": "generic", "content": "Find the sum of the first ten odd numbers"},
+]
+
+
+def render_in_process(spec: dict, work_dir: Path, index: int):
+    """Render on the warm pool, as render_template does minus the video cache"""
+    result = get_render_pool().render({
+        'kind': 'template',
+        'problem_data': parse_spec(spec),
+        'output_file': f"bench_{index}",
+        'output_dir': str(work_dir / f"bench_{index}"),
+        # The command line always renders at the standard tier
+        'render_config': RENDER_TIERS[DEFAULT_TIER],
+    }, RENDER_TIMEOUT)
+    if not result.get('ok'):
+        raise RuntimeError(result.get('error'))
+
+
+def render_subprocess(spec: dict, work_dir: Path, index: int):
+    """Render with a fresh interpreter, the way /generate used to call scene_generator.py"""
+    problem = {**spec, 'output_file': f"bench_{index}"}
+    subprocess.run([sys.executable, str(SERVICE_DIR / 'scene_generator.py'), json.dumps(problem)],
+                   cwd=work_dir, check=True, capture_output=True, timeout=RENDER_TIMEOUT)
+
+
+def run(render, rounds: int, concurrency: int) -> float:
+    """Render every spec rounds times with concurrency at once, returning the wall time"""
+    work_dir = Path(tempfile.mkdtemp(prefix='bench-', dir=SERVICE_DIR / 'temp'))
+    try:
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [executor.submit(render, spec, work_dir, i)
+                       for i, spec in enumerate(SPECS * rounds)]
+            for future in futures:
+                future.result()
+        return time.time() - start
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 2
+    os.chdir(SERVICE_DIR)
+    (SERVICE_DIR / 'temp').mkdir(exist_ok=True)
+
+    pool = get_render_pool()
+    concurrency = pool.size
+    scenes = len(SPECS) * rounds
+    print(f"Rendering {scenes} scenes, {concurrency} at a time\n")
+
+    # Start every worker and import Manim before timing, as a running service has
+    run(render_in_process, 1, concurrency)
+
+    results = {}
+    for name, render in (('in-process', render_in_process), ('subprocess', render_subprocess)):
+        seconds = run(render, rounds, concurrency)
+        results[name] = seconds
+        print(f"{name:>11}: {seconds:6.1f}s  {scenes / seconds * 60:6.1f} scenes/min")
+
+    print(f"\nSpeedup: x{results['subprocess'] / results['in-process']:.2f}")
+    pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
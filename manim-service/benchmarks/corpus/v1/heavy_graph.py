@@ -0,0 +1,28 @@
+from manim import *
+import numpy as np
+
+
+class GeneratedScene(Scene):
+    def construct(self):
+        axes = Axes(x_range=[-4, 4, 1], y_range=[-3, 3, 1], x_length=10, y_length=6,
+                    axis_config={"include_numbers": True})
+        curves = VGroup(
+            axes.plot(lambda x: np.sin(2 * x), color=BLUE),
+            axes.plot(lambda x: 0.25 * x ** 3 - x, color=RED, x_range=[-3, 3]),
+            axes.plot(lambda x: np.exp(-x ** 2) * 2, color=GREEN),
+            axes.plot(lambda x: np.cos(x) * np.sin(3 * x), color=YELLOW),
+        )
+        self.play(Create(axes))
+        self.play(LaggedStart(*[Create(curve) for curve in curves], lag_ratio=0.3), run_time=3)
+
+        # A tangent line and a shaded area redrawn by updaters on every frame
+        x = ValueTracker(-3)
+        curve = curves[1]
+        tangent = always_redraw(lambda: axes.get_secant_slope_group(
+            x.get_value(), curve, dx=0.01, secant_line_length=3, secant_line_color=ORANGE))
+        area = always_redraw(lambda: axes.get_area(
+            curve, x_range=[-3, x.get_value()], color=PURPLE, opacity=0.4))
+        dot = always_redraw(lambda: Dot(axes.i2gp(x.get_value(), curve), color=ORANGE))
+        self.add(area, tangent, dot)
+        self.play(x.animate.set_value(3), run_time=6, rate_func=linear)
+        self.wait(1)
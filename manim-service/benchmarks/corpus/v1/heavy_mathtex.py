@@ -0,0 +1,31 @@
+from manim import *
+
+
+class GeneratedScene(Scene):
+    def construct(self):
+        # Completing the square, one MathTex per step and a TransformMatchingTex between each
+        steps = [
+            r"x^2 + 6x + 5 = 0",
+            r"x^2 + 6x = -5",
+            r"x^2 + 6x + 9 = -5 + 9",
+            r"x^2 + 6x + 9 = 4",
+            r"(x + 3)^2 = 4",
+            r"x + 3 = \pm \sqrt{4}",
+            r"x + 3 = \pm 2",
+            r"x = -3 \pm 2",
+            r"x = -1 \quad \text{or} \quad x = -5",
+        ]
+        current = MathTex(steps[0], font_size=60)
+        self.play(Write(current))
+        for step in steps[1:]:
+            following = MathTex(step, font_size=60)
+            self.play(TransformMatchingTex(current, following), run_time=1)
+            current = following
+
+        # A dense block of formulas, each compiled separately
+        formulas = VGroup(*[
+            MathTex(rf"\sum_{{k=1}}^{{{n}}} k^2 = \frac{{{n}({n}+1)(2 \cdot {n}+1)}}{{6}}")
+            for n in range(2, 14)
+        ]).arrange_in_grid(rows=4, cols=3, buff=0.4).scale(0.6)
+        self.play(FadeOut(current), LaggedStart(*[Write(f) for f in formulas], lag_ratio=0.1))
+        self.wait(1)
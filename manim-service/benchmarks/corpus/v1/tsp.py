@@ -0,0 +1,64 @@
+from manim import *
+import numpy as np
+
+class GeneratedScene(Scene):
+    def construct(self):
+        # Title
+        title = Text("Traveling Salesman Problem", font_size=48)
+        title.to_edge(UP)
+        self.play(Write(title))
+        self.wait(1)
+
+        # Create cities
+        cities = [
+            {"name": "A", "pos": [-3, 1, 0]},
+            {"name": "B", "pos": [2, 2, 0]},
+            {"name": "C", "pos": [3, -1, 0]},
+            {"name": "D", "pos": [-1, -2, 0]},
+        ]
+
+        city_dots = VGroup()
+        city_labels = VGroup()
+
+        for city in cities:
+            dot = Dot(point=city["pos"], radius=0.15, color=BLUE)
+            label = Text(city["name"], font_size=30).next_to(dot, UP)
+            city_dots.add(dot)
+            city_labels.add(label)
+
+        self.play(
+            *[GrowFromCenter(dot) for dot in city_dots],
+            *[Write(label) for label in city_labels]
+        )
+        self.wait(1)
+
+        # Show distances
+        edges = VGroup()
+        for i in range(len(cities)):
+            for j in range(i + 1, len(cities)):
+                line = Line(cities[i]["pos"], cities[j]["pos"], color=GRAY, stroke_width=2)
+                edges.add(line)
+
+        self.play(Create(edges))
+        self.wait(1)
+
+        # Highlight optimal path
+        path_indices = [0, 1, 2, 3, 0]  # A -> B -> C -> D -> A
+        path_lines = VGroup()
+
+        for i in range(len(path_indices) - 1):
+            start = cities[path_indices[i]]["pos"]
+            end = cities[path_indices[i + 1]]["pos"]
+            path_line = Line(start, end, color=GREEN, stroke_width=6)
+            path_lines.add(path_line)
+
+        self.play(
+            edges.animate.set_opacity(0.3),
+            *[Create(line) for line in path_lines]
+        )
+
+        # Add "Optimal Path" text
+        result = Text("Optimal Path Found!", font_size=36, color=GREEN)
+        result.to_edge(DOWN)
+        self.play(Write(result))
+        self.wait(2)
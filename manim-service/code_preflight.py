@@ -0,0 +1,249 @@
+"""
+Static pre-flight checks for AI-generated Manim code
+Rejects code that cannot render in milliseconds, before a worker spends seconds on it
+"""
+import ast
+import hashlib
+import symtable
+import threading
+import traceback
+from collections import OrderedDict
+
+# Builtins removed from the namespace generated code runs in
+DANGEROUS_BUILTINS = ('eval', 'exec', 'compile', '__import__',
+                      'open', 'input', 'breakpoint', 'exit', 'quit',
+                      'help', 'copyright', 'credits', 'license')
+
+# Modules the namespace already provides, whose imports are dropped before
+# execution, and the names they may be imported as
+_PROVIDED_MODULES = {'manim': (None, 'manim'), 'numpy': (None, 'numpy', 'np')}
+
+SCENE_CLASS = 'GeneratedScene'
+
+# AST nodes with a scope of their own, and the symbol table name of those without a name
+_SCOPE_NODES = {ast.FunctionDef: None, ast.AsyncFunctionDef: None, ast.ClassDef: None,
+                ast.Lambda: 'lambda', ast.ListComp: 'listcomp', ast.SetComp: 'setcomp',
+                ast.DictComp: 'dictcomp', ast.GeneratorExp: 'genexpr'}
+
+# File name compiled code reports in tracebacks
+CODE_FILENAME = '<generated>'
+
+# Passing code objects kept per process, keyed on the code hash
+COMPILED_CACHE_SIZE = 256
+_compiled = OrderedDict()
+_compiled_lock = threading.Lock()
+
+
+class PreflightError(Exception):
+    """
+    Generated code that would fail before rendering anything
+
+    Args:
+        kind: One of 'syntax', 'forbidden_import', 'forbidden_name',
+              'missing_scene', 'missing_construct' or 'unknown_name'
+        message: Explanation for the client (and for the model's retry)
+        line: 1-based line in the submitted code, when known
+    """
+
+    def __init__(self, kind: str, message: str, line: int = None):
+        super().__init__(f"line {line}: {message}" if line else message)
+        self.kind = kind
+        self.message = message
+        self.line = line
+
+    def to_dict(self) -> dict:
+        return {"kind": self.kind, "line": self.line, "message": self.message}
+
+
+def _is_provided_import(node: ast.stmt) -> bool:
+    if isinstance(node, ast.ImportFrom):
+        return node.level == 0 and node.module == 'manim'
+    if isinstance(node, ast.Import):
+        return all(alias.name in _PROVIDED_MODULES
+                   and alias.asname in _PROVIDED_MODULES[alias.name]
+                   for alias in node.names)
+    return False
+
+
+def strip_provided_imports(code: str) -> str:
+    """
+    Blank out imports of manim and numpy, which are already in the namespace
+
+    Only whole module names match, so e.g. 'import manimlib' is kept and
+    rejected as an import. The import is replaced by 'pass' and any further
+    lines it spans are blanked, so line numbers in errors still match the
+    submitted code. Code that does not parse is returned as is.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return code
+
+    lines = code.split('\n')
+    for node in ast.walk(tree):
+        if _is_provided_import(node):
+            first = lines[node.lineno - 1]
+            lines[node.lineno - 1] = first[:len(first) - len(first.lstrip())] + 'pass'
+            for index in range(node.lineno, node.end_lineno):
+                lines[index] = ''
+    return '\n'.join(lines)
+
+
+def preflight(code: str, known_names=None):
+    """
+    Check generated code and compile it
+
+    Args:
+        code: Python code containing a GeneratedScene class
+        known_names: Names available to the code at run time (Manim objects,
+                     np, config and the safe builtins). Unknown names are only
+                     reported when this is given.
+
+    Returns:
+        The compiled code object, ready to exec in the scene namespace
+
+    Raises:
+        PreflightError: The code cannot render
+    """
+    cache_key = (hashlib.sha256(code.encode('utf-8')).hexdigest(), known_names is not None)
+    with _compiled_lock:
+        compiled = _compiled.get(cache_key)
+        if compiled is not None:
+            _compiled.move_to_end(cache_key)
+            return compiled
+
+    source = strip_provided_imports(code)
+    try:
+        tree = ast.parse(source, filename=CODE_FILENAME)
+    except SyntaxError as e:
+        raise PreflightError('syntax', e.msg, e.lineno)
+
+    module = symtable.symtable(source, CODE_FILENAME, 'exec')
+    _check_forbidden(tree, module)
+    _check_scene(tree)
+    if known_names is not None:
+        _check_names(tree, module, known_names)
+
+    compiled = compile(tree, CODE_FILENAME, 'exec')
+    with _compiled_lock:
+        _compiled[cache_key] = compiled
+        while len(_compiled) > COMPILED_CACHE_SIZE:
+            _compiled.popitem(last=False)
+    return compiled
+
+
+def generated_line(exc: BaseException):
+    """Line of the generated code closest to where exc was raised, or None"""
+    line = None
+    for frame in traceback.extract_tb(exc.__traceback__):
+        if frame.filename == CODE_FILENAME:
+            line = frame.lineno
+    return line
+
+
+def _first_global_read(tree: ast.Module, module: symtable.SymbolTable, names) -> tuple:
+    """
+    (line, name) of the first read of one of names that resolves to a global
+
+    Reads of a function's own parameter or variable of the same name are
+    skipped. Each scope in the tree is matched with its symbol table by name
+    and line; scopes without a table of their own (comprehensions inlined by
+    newer Pythons) use the enclosing one.
+    """
+    tables = {}
+    pending = [module]
+    while pending:
+        table = pending.pop()
+        tables[(table.get_name(), table.get_lineno())] = table
+        pending.extend(table.get_children())
+
+    reads = []
+
+    def visit(node, table):
+        if type(node) in _SCOPE_NODES:
+            name = getattr(node, 'name', None) or _SCOPE_NODES[type(node)]
+            table = tables.get((name, node.lineno), table)
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load) and node.id in names:
+            try:
+                symbol = table.lookup(node.id)
+            except KeyError:
+                symbol = None
+            if table is module or symbol is None or symbol.is_global():
+                reads.append((node.lineno, node.col_offset, node.id))
+        for child in ast.iter_child_nodes(node):
+            visit(child, table)
+
+    visit(tree, module)
+    line, _, name = min(reads) if reads else (None, None, sorted(names)[0])
+    return line, name
+
+
+def _check_forbidden(tree: ast.Module, module: symtable.SymbolTable):
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            # __import__ is not available, so any other import fails at run time
+            module = node.module if isinstance(node, ast.ImportFrom) else node.names[0].name
+            raise PreflightError('forbidden_import',
+                                 f"Imports are not allowed ('{module}'); Manim, np and "
+                                 f"the standard builtins are already available", node.lineno)
+
+    # Only the builtins themselves; the code may name its own variables 'input' or 'help'
+    forbidden = _unresolved_names(module).intersection(DANGEROUS_BUILTINS)
+    if forbidden:
+        line, name = _first_global_read(tree, module, forbidden)
+        raise PreflightError('forbidden_name', f"'{name}' is not allowed", line)
+
+
+def _check_scene(tree: ast.Module):
+    scene = next((node for node in tree.body
+                  if isinstance(node, ast.ClassDef) and node.name == SCENE_CLASS), None)
+    if scene is None:
+        raise PreflightError('missing_scene',
+                             f"Code must define a '{SCENE_CLASS}' class at the top level")
+
+    base_names = [base.id if isinstance(base, ast.Name) else getattr(base, 'attr', '')
+                  for base in scene.bases]
+    if not any(name.endswith('Scene') for name in base_names):
+        raise PreflightError('missing_scene',
+                             f"'{SCENE_CLASS}' must subclass Scene (or another Manim scene class)",
+                             scene.lineno)
+
+    if not any(isinstance(node, ast.FunctionDef) and node.name == 'construct'
+               for node in scene.body):
+        raise PreflightError('missing_construct',
+                             f"'{SCENE_CLASS}' must define a construct(self) method",
+                             scene.lineno)
+
+
+def _unresolved_names(module: symtable.SymbolTable) -> set:
+    """Global names the code reads but never binds, which must come from its namespace"""
+
+    defined = set()
+    referenced = set()
+    tables = [module]
+    while tables:
+        table = tables.pop()
+        for symbol in table.get_symbols():
+            name = symbol.get_name()
+            if table is module and (symbol.is_assigned() or symbol.is_imported()
+                                    or symbol.is_namespace()):
+                defined.add(name)
+            elif symbol.is_declared_global() and symbol.is_assigned():
+                defined.add(name)
+            if symbol.is_referenced() and (table is module or symbol.is_global()):
+                referenced.add(name)
+        tables.extend(table.get_children())
+
+    return referenced - defined
+
+
+def _check_names(tree: ast.Module, module: symtable.SymbolTable, known_names):
+    """Report the first global name that is neither defined by the code nor known"""
+    unknown = _unresolved_names(module) - frozenset(known_names)
+    if not unknown:
+        return
+
+    line, name = _first_global_read(tree, module, unknown)
+    raise PreflightError('unknown_name',
+                         f"Name '{name}' is not defined and is not a Manim object "
+                         f"in this version of Manim", line)
@@ -4,83 +4,175 @@ Executes AI-generated Manim code to create visualizations
 """
 from manim import *
 import json
+import random
 import sys
 import os
+import time
 import traceback
+from code_preflight import DANGEROUS_BUILTINS, preflight
+from worker_counters import observe
 
 
-def execute_generated_code(code: str, output_file: str):
+_BASE_NAMESPACE = None
+
+
+def _base_namespace() -> dict:
+    """
+    Build the restricted global namespace for generated code
+
+    The namespace is built once per process and reused, since walking
+    dir(manim) is a fixed cost that long-lived render workers only need to pay once.
+    """
+    global _BASE_NAMESPACE
+    if _BASE_NAMESPACE is not None:
+        return _BASE_NAMESPACE
+
+    # Start with standard builtins but remove dangerous functions
+    import builtins
+    safe_builtins = {
+        name: getattr(builtins, name)
+        for name in dir(builtins)
+    }
+
+    # Remove dangerous built-in functions
+    for name in DANGEROUS_BUILTINS:
+        safe_builtins.pop(name, None)
+
+    # Create safe namespace with Manim objects pre-populated
+    _BASE_NAMESPACE = {
+        '__builtins__': safe_builtins,
+        'np': np,  # NumPy for math operations
+        'config': config,
+        # Import all Manim objects into the namespace
+        **{name: getattr(sys.modules['manim'], name)
+           for name in dir(sys.modules['manim'])
+           if not name.startswith('_')},
+    }
+    return _BASE_NAMESPACE
+
+
+def known_names() -> frozenset:
+    """Every name generated code can use without defining it"""
+    namespace = _base_namespace()
+    return frozenset(namespace) | frozenset(namespace['__builtins__'])
+
+
+def load_scene_class(code: str):
+    """
+    Check generated code, execute it in the safe namespace and return GeneratedScene
+
+    Raises:
+        PreflightError: The code failed static checks and was not executed
+    """
+    start = time.time()
+
+    # Copy the prepared namespace so one scene cannot leak names into the next
+    safe_globals = dict(_base_namespace())
+    safe_globals['__builtins__'] = dict(safe_globals['__builtins__'])
+
+    # Check syntax, the scene class and every name used before executing
+    # anything; manim/numpy imports are dropped since the objects are already available
+    compiled = preflight(code, known_names=known_names())
+
+    # Execute the checked code in the safe namespace
+    exec(compiled, safe_globals)
+
+    # Get the GeneratedScene class
+    if 'GeneratedScene' not in safe_globals:
+        raise ValueError("Generated code must define a 'GeneratedScene' class")
+
+    observe('code_load', time.time() - start)
+    return safe_globals['GeneratedScene']
+
+
+def validate_generated_code(code: str) -> dict:
+    """
+    Run GeneratedScene.construct without rendering anything
+
+    Animations are skipped, so no frames are rasterized, and dry_run keeps the
+    file writer from creating directories or starting ffmpeg. Errors in the
+    scene surface exactly as they would in a real render.
+
+    Args:
+        code: Python code containing a GeneratedScene class
+
+    Returns:
+        dict: Estimated 'duration' of the video in seconds, the number of
+              'animations' and the 'timeline' of each animation's run time
+    """
+    GeneratedScene = load_scene_class(code)
+
+    config.dry_run = True
+    seed_random()
+    scene = GeneratedScene(skip_animations=True)
+
+    # The renderer advances its clock by each animation's run time even when skipped
+    timeline = []
+    renderer = scene.renderer
+    original_play = renderer.play
+
+    def play(*args, **kwargs):
+        start = renderer.time
+        original_play(*args, **kwargs)
+        timeline.append(round(renderer.time - start, 3))
+
+    renderer.play = play
+    scene.render()
+
+    return {
+        "duration": round(renderer.time, 3),
+        "animations": renderer.num_plays,
+        "timeline": timeline,
+    }
+
+
+def seed_random():
+    """
+    Seed the random number generators before a scene is constructed
+
+    Scenes that use random or np.random then hash and render the same way in
+    every worker, which partial renders of one scene rely on.
+    """
+    random.seed(0)
+    np.random.seed(0)
+
+
+def execute_generated_code(code: str, output_file: str, render_config: dict = None):
     """
     Safely execute AI-generated Manim code
 
     Args:
         code: Python code containing a GeneratedScene class
         output_file: Output filename for the rendered video
+        render_config: Optional pixel_width, pixel_height and frame_rate overriding
+                       the default 1280x720 at 30fps, and from_animation_number and
+                       upto_animation_number to render only some of the animations
+
+    Returns:
+        Path of the rendered video, or None if the scene played no animations
+
+    Raises:
+        PreflightError: The code failed static checks and was not executed
     """
     try:
         # Set up Manim configuration
         config.pixel_height = 720
         config.pixel_width = 1280
         config.frame_rate = 30
+        if render_config:
+            config.update(render_config)
         config.output_file = output_file
         config.media_dir = "./media"
 
-        # Create a restricted global namespace for code execution
-        # Start with standard builtins but remove dangerous functions
-        import builtins
-        safe_builtins = {
-            name: getattr(builtins, name)
-            for name in dir(builtins)
-        }
-
-        # Remove dangerous built-in functions
-        dangerous_builtins = ['eval', 'exec', 'compile', '__import__',
-                              'open', 'input', 'breakpoint', 'exit', 'quit',
-                              'help', 'copyright', 'credits', 'license']
-        for name in dangerous_builtins:
-            safe_builtins.pop(name, None)
-
-        # Create safe namespace with Manim objects pre-populated
-        safe_globals = {
-            '__builtins__': safe_builtins,
-            'np': np,  # NumPy for math operations
-            'config': config,
-            # Import all Manim objects into the namespace
-            **{name: getattr(sys.modules['manim'], name)
-               for name in dir(sys.modules['manim'])
-               if not name.startswith('_')},
-        }
-
-        # Remove import statements from code since objects are already available
-        # This prevents __import__ errors
-        code_lines = code.split('\n')
-        filtered_lines = []
-        for line in code_lines:
-            # Skip import lines
-            if line.strip().startswith('from manim import') or \
-               line.strip().startswith('import manim') or \
-               line.strip().startswith('import numpy as np') or \
-               line.strip() == 'import numpy':
-                continue
-            filtered_lines.append(line)
-
-        cleaned_code = '\n'.join(filtered_lines)
-
-        # Execute the cleaned code in the safe namespace
-        exec(cleaned_code, safe_globals)
-
-        # Get the GeneratedScene class
-        if 'GeneratedScene' not in safe_globals:
-            raise ValueError("Generated code must define a 'GeneratedScene' class")
-
-        GeneratedScene = safe_globals['GeneratedScene']
+        GeneratedScene = load_scene_class(code)
 
         # Create and render the scene
+        seed_random()
         scene = GeneratedScene()
         scene.render()
 
         print(f"✅ Successfully rendered scene to {output_file}")
-        return True
+        return scene.renderer.file_writer.movie_file_path
 
     except Exception as e:
         print(f"❌ Error executing generated code: {e}")
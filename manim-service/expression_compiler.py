@@ -0,0 +1,171 @@
+"""
+Safe compiler for the function expressions of graph problems
+Parses an expression such as "sin(x) + x^2" once into a NumPy-vectorized callable
+"""
+import ast
+import re
+from functools import lru_cache
+import numpy as np
+
+# Functions and constants an expression may use, and the modules whose prefix is
+# accepted in front of them ("np.sin(x)")
+FUNCTIONS = {
+    'sin': np.sin, 'cos': np.cos, 'tan': np.tan,
+    'asin': np.arcsin, 'acos': np.arccos, 'atan': np.arctan,
+    'arcsin': np.arcsin, 'arccos': np.arccos, 'arctan': np.arctan,
+    'sinh': np.sinh, 'cosh': np.cosh, 'tanh': np.tanh,
+    'exp': np.exp, 'log': np.log, 'ln': np.log, 'log10': np.log10, 'log2': np.log2,
+    'sqrt': np.sqrt, 'cbrt': np.cbrt, 'abs': np.abs, 'sign': np.sign,
+    'floor': np.floor, 'ceil': np.ceil,
+}
+CONSTANTS = {'pi': np.pi, 'e': np.e, 'tau': 2 * np.pi}
+MODULE_PREFIXES = ('np', 'numpy', 'math')
+
+_OPERATORS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.Mod, ast.UAdd, ast.USub)
+
+# Longer expressions are not plausible graph functions
+MAX_NODES = 200
+
+# "y = ..." and "f(x) = ..." are accepted and stripped
+_ASSIGNMENT_PREFIX = re.compile(r'^\s*(?:y|f\s*\(\s*x\s*\))\s*=(?!=)')
+
+
+class ExpressionError(ValueError):
+    """An expression that is not a whitelisted function of x, or cannot be evaluated"""
+
+
+class _Whitelist(ast.NodeTransformer):
+    """Rejects anything but arithmetic on x, numbers, CONSTANTS and FUNCTIONS"""
+
+    def __init__(self, variable: str):
+        self.variable = variable
+        self.nodes = 0
+
+    def visit(self, node):
+        self.nodes += 1
+        if self.nodes > MAX_NODES:
+            raise ExpressionError(f"Expression is longer than {MAX_NODES} terms")
+        return super().visit(node)
+
+    def generic_visit(self, node):
+        if not isinstance(node, (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Load) + _OPERATORS):
+            raise ExpressionError(f"Unsupported syntax: {type(node).__name__}")
+        return super().generic_visit(node)
+
+    def visit_Constant(self, node):
+        if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+            raise ExpressionError(f"Unsupported constant: {node.value!r}")
+        # Integer arithmetic is exact and unbounded (9**9**9 would never finish),
+        # so every number is a float
+        return ast.copy_location(ast.Constant(float(node.value)), node)
+
+    def visit_Name(self, node):
+        if node.id != self.variable and node.id not in CONSTANTS:
+            raise ExpressionError(f"Unknown name: {node.id}")
+        return node
+
+    def visit_Call(self, node):
+        func = node.func
+        # np.sin(x) and math.sin(x) mean sin(x)
+        if (isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name)
+                and func.value.id in MODULE_PREFIXES):
+            func = ast.copy_location(ast.Name(func.attr, ast.Load()), func)
+        if not isinstance(func, ast.Name) or func.id not in FUNCTIONS:
+            raise ExpressionError(f"Unsupported function: {ast.unparse(node.func)}")
+        if node.keywords or len(node.args) != 1:
+            raise ExpressionError(f"{func.id}() takes exactly one argument")
+        node.func = func
+        node.args = [self.visit(node.args[0])]
+        return node
+
+    def visit_Attribute(self, node):
+        if isinstance(node.value, ast.Name) and node.value.id in MODULE_PREFIXES:
+            if node.attr in CONSTANTS:
+                return ast.copy_location(ast.Name(node.attr, ast.Load()), node)
+        raise ExpressionError(f"Unsupported name: {ast.unparse(node)}")
+
+
+@lru_cache(maxsize=256)
+def compile_expression(expression: str, variable: str = 'x'):
+    """
+    Compile a function expression into a vectorized callable
+
+    "^" is read as a power, as in the problem text. Evaluation never raises for
+    points outside the domain: they come out as nan or inf.
+
+    Args:
+        expression: Arithmetic on the variable using FUNCTIONS and CONSTANTS
+        variable: Name of the independent variable
+
+    Returns:
+        Callable taking a float or array of floats and returning floats of the same shape
+
+    Raises:
+        ExpressionError: If the expression is not a whitelisted function of the variable
+    """
+    source = _ASSIGNMENT_PREFIX.sub('', expression, count=1).replace('^', '**').strip()
+    try:
+        tree = ast.parse(source, mode='eval')
+    except SyntaxError as e:
+        raise ExpressionError(f"Invalid expression: {e.msg}") from None
+    tree = ast.fix_missing_locations(_Whitelist(variable).visit(tree))
+    code = compile(tree, '<expression>', 'eval')
+    namespace = {'__builtins__': {}, **FUNCTIONS, **CONSTANTS}
+
+    def function(x):
+        x = np.asarray(x, dtype=float)
+        try:
+            with np.errstate(all='ignore'):
+                y = eval(code, namespace, {variable: x})
+        except ArithmeticError as e:
+            # Only parts without x run as plain floats, e.g. "x + 1/0"
+            raise ExpressionError(f"Cannot evaluate {expression!r}: {e}") from None
+        # Constant expressions still produce one value per sample
+        y = np.broadcast_to(np.asarray(y, dtype=float), x.shape)
+        return y.copy() if y.ndim else float(y)
+
+    return function
+
+
+def continuous_ranges(function, x_range, y_range, samples: int = 2001, max_jump: float = 0.5):
+    """
+    Split an x range into the pieces over which a function can be drawn as one curve
+
+    Samples the function once over the whole range and breaks it wherever the
+    function is undefined (log(x) for x <= 0), leaves the visible y range
+    (1/x near 0, tan(x) at its asymptotes) or jumps by more than max_jump of
+    the y range between neighbouring samples.
+
+    Args:
+        function: Vectorized callable, e.g. from compile_expression
+        x_range: (x_min, x_max) to sample
+        y_range: (y_min, y_max) that is visible
+        samples: Number of evenly spaced samples
+        max_jump: Largest change between neighbouring samples, as a fraction of the y range
+
+    Returns:
+        list: (x_start, x_end) pairs in increasing order
+    """
+    x_min, x_max = x_range[0], x_range[1]
+    y_min, y_max = y_range[0], y_range[1]
+    xs = np.linspace(x_min, x_max, samples)
+    ys = function(xs)
+
+    visible = np.isfinite(ys) & (ys >= y_min) & (ys <= y_max)
+    # A break after sample i separates i and i + 1
+    breaks = ~(visible[:-1] & visible[1:])
+    with np.errstate(invalid='ignore'):
+        breaks |= np.abs(np.diff(ys)) > max_jump * (y_max - y_min)
+
+    ranges = []
+    start = None
+    for i in range(samples - 1):
+        if not breaks[i]:
+            if start is None:
+                start = i
+        elif start is not None:
+            ranges.append((float(xs[start]), float(xs[i])))
+            start = None
+    if start is not None:
+        ranges.append((float(xs[start]), float(xs[-1])))
+    return ranges
@@ -0,0 +1,196 @@
+"""
+Helpers for running ffmpeg directly
+Used where a stream copy is enough and a full moviepy decode/encode is not needed
+"""
+import os
+import re
+import shutil
+import struct
+import subprocess
+from pathlib import Path
+
+FFMPEG_TIMEOUT = 120
+
+# Target length of HLS segments; segments are cut at the next keyframe after it
+HLS_SEGMENT_SECONDS = float(os.getenv('HLS_SEGMENT_SECONDS', '2'))
+HLS_PLAYLIST = 'index.m3u8'
+
+_DURATION_RE = re.compile(r'Duration: (\d+):(\d+):(\d+(?:\.\d+)?)')
+
+
+def find_ffmpeg() -> str:
+    """
+    Locate an ffmpeg binary
+
+    Prefers ffmpeg on PATH and falls back to the binary bundled with imageio-ffmpeg,
+    which moviepy already depends on.
+    """
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg:
+        return ffmpeg
+
+    import imageio_ffmpeg
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+
+def run_ffmpeg(args: list, timeout: int = FFMPEG_TIMEOUT) -> subprocess.CompletedProcess:
+    """
+    Run ffmpeg with the given arguments
+
+    Raises:
+        subprocess.CalledProcessError: ffmpeg exited with an error
+    """
+    return subprocess.run(
+        [find_ffmpeg(), '-hide_banner', '-nostdin', *args],
+        capture_output=True,
+        text=True,
+        timeout=timeout,
+        check=True
+    )
+
+
+def probe_duration(media_path: Path) -> float:
+    """
+    Duration of a media file in seconds, read from ffmpeg's input summary
+
+    Raises:
+        ValueError: The duration could not be determined
+    """
+    # ffmpeg exits with an error when given no output, but still prints the summary
+    result = subprocess.run(
+        [find_ffmpeg(), '-hide_banner', '-nostdin', '-i', str(media_path)],
+        capture_output=True,
+        text=True,
+        timeout=30
+    )
+    match = _DURATION_RE.search(result.stderr)
+    if not match:
+        raise ValueError(f"Could not read duration of {media_path}")
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def moov_at_front(video_path: Path) -> bool:
+    """
+    Whether an MP4's index (its moov box) comes before the media data
+
+    Players can only start an MP4 once they have the index, so one written
+    at the end has to be downloaded almost completely first.
+    """
+    with open(video_path, 'rb') as f:
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                return False
+            size, box_type = struct.unpack('>I4s', header)
+            if box_type == b'moov':
+                return True
+            if box_type == b'mdat':
+                return False
+            if size == 1:
+                # 64-bit box size follows the type
+                size = struct.unpack('>Q', f.read(8))[0] - 8
+            elif size < 8:
+                # Box runs to the end of the file
+                return False
+            f.seek(size - 8, os.SEEK_CUR)
+
+
+def _hls_options(output_dir: Path, segment_seconds: float) -> dict:
+    """
+    Options of ffmpeg's hls muxer for fragmented MP4 segments
+
+    The playlist is an EVENT playlist that ffmpeg rewrites after every segment,
+    and segments and playlist are written under temporary names and renamed, so
+    a player can start on the first segments while later ones are still being
+    written. #EXT-X-ENDLIST is appended once the last segment is done.
+    """
+    return {
+        'hls_time': f"{segment_seconds:g}",
+        'hls_playlist_type': 'event',
+        'hls_segment_type': 'fmp4',
+        'hls_fmp4_init_filename': 'init.mp4',
+        'hls_segment_filename': str(output_dir / 'seg_%03d.m4s'),
+        'hls_flags': 'independent_segments+temp_file',
+    }
+
+
+def mp4_outputs(output_path: Path, hls_dir: Path = None,
+                segment_seconds: float = HLS_SEGMENT_SECONDS) -> list:
+    """
+    ffmpeg output arguments writing a faststart MP4, and optionally HLS in the same pass
+
+    With hls_dir, the tee muxer writes the MP4 and the HLS segments from the
+    same packets, so each segment is on disk as soon as it has been written
+    rather than after the whole MP4. Every stream must be mapped with -map.
+
+    Args:
+        output_path: MP4 to write
+        hls_dir: Directory for the playlist, init.mp4 and seg_NNN.m4s, created here
+    """
+    if hls_dir is None:
+        return ['-movflags', '+faststart', str(output_path)]
+
+    hls_dir.mkdir(parents=True, exist_ok=True)
+    hls_options = ':'.join(f"{name}={value}"
+                           for name, value in _hls_options(hls_dir, segment_seconds).items())
+    return ['-f', 'tee',
+            f"[f=mp4:movflags=+faststart]{output_path}|"
+            f"[f=hls:{hls_options}]{hls_dir / HLS_PLAYLIST}"]
+
+
+def faststart(video_path: Path, hls_dir: Path = None) -> bool:
+    """
+    Move an MP4's index to the front with a stream copy, replacing the file
+
+    Args:
+        video_path: MP4 to rewrite
+        hls_dir: Also write the video as HLS into this directory, in the same pass
+
+    Returns:
+        bool: True if the file was rewritten, False if the index was already in
+              front and no HLS was asked for
+
+    Raises:
+        subprocess.CalledProcessError: ffmpeg exited with an error
+    """
+    if hls_dir is None and moov_at_front(video_path):
+        return False
+    tmp_path = video_path.with_name(f"{video_path.stem}.faststart{video_path.suffix}")
+    try:
+        run_ffmpeg(['-y', '-i', str(video_path), '-map', '0', '-c', 'copy',
+                    *mp4_outputs(tmp_path, hls_dir)])
+        os.replace(tmp_path, video_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    return True
+
+
+def package_hls(video_path: Path, output_dir: Path, segment_seconds: float = HLS_SEGMENT_SECONDS):
+    """
+    Split an MP4 into fragmented MP4 segments listed by an HLS playlist
+
+    The streams are copied, not encoded. Used for videos that are already
+    published, e.g. served from the video cache; renders write their HLS while
+    the final MP4 is written (see mp4_outputs).
+
+    Args:
+        video_path: MP4 to package
+        output_dir: Directory for the playlist, init.mp4 and seg_NNN.m4s
+
+    Raises:
+        subprocess.CalledProcessError: ffmpeg exited with an error
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    options = [arg for name, value in _hls_options(output_dir, segment_seconds).items()
+               for arg in (f"-{name}", value)]
+    run_ffmpeg(['-y', '-i', str(video_path), '-map', '0', '-c', 'copy',
+                '-f', 'hls', *options, str(output_dir / HLS_PLAYLIST)])
+
+
+def hls_complete(output_dir: Path) -> bool:
+    """Whether the HLS playlist in output_dir lists every segment"""
+    try:
+        return '#EXT-X-ENDLIST' in (output_dir / HLS_PLAYLIST).read_text()
+    except FileNotFoundError:
+        return False
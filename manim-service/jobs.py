@@ -0,0 +1,327 @@
+"""
+Asynchronous render jobs for the Manim service
+Jobs run on a small thread pool and their state is kept on disk, so any server
+process can answer status polls
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from render_pipeline import (JOBS_DIR, MEDIA_DIR, DEFAULT_TIER, PipelineError, hls_url,
+                             render_dynamic, render_template)
+from render_pool import POOL_SIZE
+
+# Batches only list their job IDs; item state lives in the job records
+BATCHES_DIR = MEDIA_DIR / "batches"
+BATCHES_DIR.mkdir(exist_ok=True)
+
+# Render threads mostly wait on the worker pool, so allow TTS and muxing of
+# finished renders to overlap with the next renders
+JOB_THREADS = int(os.getenv('JOB_THREADS', str(POOL_SIZE * 2)))
+
+# Job statuses, in pipeline order
+QUEUED = 'queued'
+RENDERING = 'rendering'
+TTS = 'tts'
+MUXING = 'muxing'
+DONE = 'done'
+FAILED = 'failed'
+FINISHED_STATUSES = (DONE, FAILED)
+
+# Progress events, appended to <job_id>.events as JSON lines. 'stage' marks a status
+# change, 'animation' a rendered Scene.play/wait, 'published' a playable tier, and
+# 'done'/'failed' always come last
+STAGE_EVENT = 'stage'
+PUBLISHED_EVENT = 'published'
+FINISHED_EVENTS = (DONE, FAILED)
+
+
+class JobStore:
+    """Submits render jobs to a thread pool and records their progress as JSON files"""
+
+    def __init__(self, jobs_dir=JOBS_DIR, batches_dir=BATCHES_DIR, max_workers: int = JOB_THREADS):
+        self.jobs_dir = jobs_dir
+        self.batches_dir = batches_dir
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='render-job')
+        # Jobs submitted by this process that have not finished yet
+        self._in_flight = 0
+        self._in_flight_lock = threading.Lock()
+        # Futures of those jobs, so queued ones can be failed on shutdown
+        self._futures = {}
+
+    def submit(self, kind: str, payload: dict) -> dict:
+        """
+        Queue a render job
+
+        Args:
+            kind: 'dynamic' (payload has 'code', 'narration' and optionally 'parallel') or
+                  'template' (payload has 'problem' data)
+            payload: Job input, optionally with 'tiers', the render tiers to
+                     publish in order (defaults to the standard tier only),
+                     'hls' to also package each tier as HLS and 'profile' to
+                     profile each tier's render
+
+        Returns:
+            dict: The new job record
+        """
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        job = {
+            "job_id": job_id,
+            "kind": kind,
+            "status": QUEUED,
+            "available_tier": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        self._write(job)
+        self.add_event(job_id, {"event": STAGE_EVENT, "stage": QUEUED})
+        with self._in_flight_lock:
+            self._in_flight += 1
+            future = self._executor.submit(self._run, job_id, kind, payload)
+            self._futures[job_id] = future
+        future.add_done_callback(lambda _: self._forget(job_id))
+        return job
+
+    def submit_batch(self, items: list) -> dict:
+        """
+        Queue several render jobs at once
+
+        Jobs are scheduled in order and rendered as render workers free up, so a
+        batch keeps every worker busy until it is drained.
+
+        Args:
+            items: (kind, payload) pairs, as taken by submit()
+
+        Returns:
+            dict: The new batch record
+        """
+        batch = {
+            "batch_id": str(uuid.uuid4()),
+            "job_ids": [self.submit(kind, payload)["job_id"] for kind, payload in items],
+            "created_at": time.time(),
+        }
+        _write_json(self.batches_dir, batch["batch_id"], batch)
+        return batch
+
+    def get_batch(self, batch_id: str):
+        """
+        Return the batch with every item's job record and a timing summary,
+        or None if there is no such batch
+
+        wall_seconds runs from submission until the last item finished (or now),
+        render_seconds sums the time workers spent rendering the items; their
+        ratio is how much the batch gained from rendering in parallel.
+        """
+        batch = _read_json(self.batches_dir / f"{batch_id}.json")
+        if batch is None:
+            return None
+
+        items = [self.get(job_id) or {"job_id": job_id, "status": FAILED, "error": "Job not found"}
+                 for job_id in batch["job_ids"]]
+        finished = [item for item in items if item["status"] in FINISHED_STATUSES]
+        done = len(finished) == len(items)
+
+        if done:
+            end = max((item.get("updated_at", 0) for item in finished), default=0)
+        else:
+            end = time.time()
+        wall_seconds = max(end - batch["created_at"], 0.0)
+        render_seconds = sum(item.get("render_seconds", 0.0) for item in items)
+
+        counts = {}
+        for item in items:
+            counts[item["status"]] = counts.get(item["status"], 0) + 1
+
+        return {
+            **batch,
+            "done": done,
+            "total": len(items),
+            "counts": counts,
+            "wall_seconds": round(wall_seconds, 3),
+            "render_seconds": round(render_seconds, 3),
+            "parallel_speedup": round(render_seconds / wall_seconds, 2) if wall_seconds else None,
+            "items": items,
+        }
+
+    def shutdown(self):
+        """
+        Stop taking jobs: fail the ones still queued, and wait for those rendering
+
+        Queued jobs fail with a "Service restarting" error so clients know to
+        submit them again rather than poll a job that will never start.
+        """
+        with self._in_flight_lock:
+            futures = dict(self._futures)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        cancelled = [job_id for job_id, future in futures.items() if future.cancelled()]
+        for job_id in cancelled:
+            error = {"error": "Service restarting", "details": "The job was queued when the "
+                     "service shut down and never started, submit it again"}
+            self.update(job_id, status=FAILED, **error)
+            self.add_event(job_id, {"event": FAILED, **error})
+        if cancelled:
+            print(f"[API] Failed {len(cancelled)} queued jobs on shutdown")
+        self._executor.shutdown(wait=True)
+
+    def _forget(self, job_id: str):
+        with self._in_flight_lock:
+            future = self._futures.pop(job_id, None)
+            # Cancelled jobs never ran _run, which counts finished jobs itself
+            if future is not None and future.cancelled():
+                self._in_flight -= 1
+
+    def in_flight(self) -> int:
+        """Number of jobs this process has queued or is rendering"""
+        with self._in_flight_lock:
+            return self._in_flight
+
+    def get(self, job_id: str):
+        """Return the job record, or None if there is no such job"""
+        return _read_json(self._path(job_id))
+
+    def add_event(self, job_id: str, event: dict):
+        """Append a progress event to the job's event log"""
+        event = dict(event, time=round(time.time(), 3))
+        with open(self._events_path(job_id), 'a') as f:
+            f.write(json.dumps(event) + '\n')
+
+    def read_events(self, job_id: str, offset: int = 0) -> list:
+        """
+        Events logged for the job after byte offset
+
+        An offset that is not just past an event (e.g. a made-up Last-Event-ID)
+        reads the log from the start, and lines that do not decode are skipped.
+
+        Returns:
+            list: (offset just past the event, event) pairs, so a reader can resume
+        """
+        try:
+            with open(self._events_path(job_id), 'rb') as f:
+                if offset > 0:
+                    f.seek(offset - 1)
+                    if f.read(1) != b'\n':
+                        offset = 0
+                f.seek(max(offset, 0))
+                offset = f.tell()
+                data = f.read()
+        except FileNotFoundError:
+            return []
+
+        events = []
+        for line in data.splitlines(keepends=True):
+            # A line without its newline is still being written
+            if not line.endswith(b'\n'):
+                break
+            offset += len(line)
+            try:
+                events.append((offset, json.loads(line)))
+            except ValueError:
+                print(f"[API] Skipping an unreadable event of job {job_id}")
+        return events
+
+    def update(self, job_id: str, **fields) -> dict:
+        """Merge fields into a job record"""
+        job = self.get(job_id) or {"job_id": job_id}
+        job.update(fields)
+        job["updated_at"] = time.time()
+        self._write(job)
+        return job
+
+    def _run(self, job_id: str, kind: str, payload: dict):
+        try:
+            self._render_tiers(job_id, kind, payload)
+        finally:
+            with self._in_flight_lock:
+                self._in_flight -= 1
+
+    def _render_tiers(self, job_id: str, kind: str, payload: dict):
+        tiers = payload.get('tiers') or [DEFAULT_TIER]
+        render_seconds = 0.0
+        for i, tier in enumerate(tiers):
+            def on_stage(stage, tier=tier):
+                self.update(job_id, status=stage)
+                event = {"event": STAGE_EVENT, "stage": stage, "tier": tier}
+                if stage == MUXING and payload.get('hls'):
+                    # Segments are playable as soon as the mux writes them
+                    event['hls_url'] = hls_url(job_id, tier)
+                self.add_event(job_id, event)
+
+            def on_progress(event, tier=tier):
+                event = {k: v for k, v in event.items() if k != 'type'}
+                self.add_event(job_id, dict(event, tier=tier))
+
+            try:
+                if kind == 'dynamic':
+                    result = render_dynamic(job_id, payload['code'], payload.get('narration', ''),
+                                            on_stage=on_stage, tier=tier, on_progress=on_progress,
+                                            parallel=payload.get('parallel', False),
+                                            hls=payload.get('hls', False),
+                                            profile=payload.get('profile', False))
+                else:
+                    result = render_template(job_id, payload['problem'], on_stage=on_stage,
+                                             tier=tier, on_progress=on_progress,
+                                             hls=payload.get('hls', False),
+                                             profile=payload.get('profile', False))
+            except Exception as e:
+                error = e.to_dict() if isinstance(e, PipelineError) else {
+                    "error": "Internal server error", "details": str(e)}
+                if i == 0:
+                    self.update(job_id, status=FAILED, **error)
+                    self.add_event(job_id, {"event": FAILED, **error})
+                else:
+                    # Keep serving the lower tier that was already published
+                    self.update(job_id, status=DONE, upgrade_error=error)
+                    self.add_event(job_id, {"event": DONE, "tier": tiers[i - 1],
+                                            "upgrade_error": error})
+                return
+
+            # Earlier tiers are playable while the job renders the next one
+            final = i == len(tiers) - 1
+            render_seconds += result.get('render_seconds', 0.0)
+            self.update(job_id, status=DONE if final else RENDERING, result=result,
+                        available_tier=tier, render_seconds=round(render_seconds, 3))
+            self.add_event(job_id, {"event": DONE if final else PUBLISHED_EVENT, "tier": tier,
+                                    "result": result})
+
+    def _path(self, job_id: str):
+        return self.jobs_dir / f"{job_id}.json"
+
+    def _events_path(self, job_id: str):
+        return self.jobs_dir / f"{job_id}.events"
+
+    def _write(self, job: dict):
+        _write_json(self.jobs_dir, job["job_id"], job)
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _write_json(directory, record_id: str, record: dict):
+    # Write to a temporary file and rename it, so pollers never read half a record
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(record, f)
+    os.replace(tmp_path, directory / f"{record_id}.json")
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_job_store() -> JobStore:
+    """Return the process-wide job store, creating it on first use"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = JobStore()
+        return _store
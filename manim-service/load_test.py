@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Closed-loop load test of a running Manim service
+Start the service with TTS_PROVIDER=stub so narrated requests never reach DashScope, then:
+Usage: python load_test.py [--url URL] [--concurrency 1,2,4,8] [--duration 60] [--mix generate=3,generate-dynamic=2,video=5]
+"""
+import argparse
+import json
+import math
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+from benchmark import CORPUS_DIR, load_corpus
+
+DEFAULT_URL = "http://localhost:5001"
+DEFAULT_MIX = "generate=3,generate-dynamic=2,video=5"
+REQUEST_TIMEOUT = 300
+
+# Spoken over dynamic scenes, so every one of them goes through TTS and muxing.
+# Unique runs append the request number, so the TTS cache does not answer it
+NARRATION = ("Let us work through this problem step by step. First we set up the "
+             "picture, then we follow each change until we reach the answer.")
+
+
+def parse_mix(mix: str) -> dict:
+    """'generate=3,video=5' -> {'generate': 3, 'video': 5}"""
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        if name not in ('generate', 'generate-dynamic', 'video'):
+            raise ValueError(f"Unknown request type '{name}' in the mix")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def post_json(url: str, body: dict) -> tuple:
+    request = urllib.request.Request(url, data=json.dumps(body).encode(),
+                                     headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+        return response.status, json.load(response)
+
+
+def get_bytes(url: str) -> tuple:
+    with urllib.request.urlopen(url, timeout=REQUEST_TIMEOUT) as response:
+        return response.status, len(response.read())
+
+
+def percentile(values: list, p: float) -> float:
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+
+class LoadTest:
+    """
+    Replays a weighted mix of requests from a fixed number of clients
+
+    Each client sends its next request as soon as the previous one is answered,
+    so the offered load follows the service's own throughput (closed loop).
+    Renders and narrations are made unique with a request counter unless cache
+    hits are allowed, so they measure rendering and TTS rather than the video
+    and TTS caches.
+    """
+
+    def __init__(self, url: str, weights: dict, unique: bool = True, seed: int = 0):
+        self.url = url.rstrip('/')
+        self.weights = weights
+        self.unique = unique
+        self.seed = seed
+        corpus = load_corpus(CORPUS_DIR)
+        self.problems = [s['problem'] for s in corpus['scenes'] if s['kind'] == 'template']
+        self.codes = [s['code'] for s in corpus['scenes'] if s['kind'] == 'dynamic']
+        self.video_ids = []
+        self._lock = threading.Lock()
+        self._counter = 0
+
+    def _next_number(self) -> int:
+        with self._lock:
+            self._counter += 1
+            return self._counter
+
+    def _kind_to_send(self, kind: str, rng: random.Random) -> tuple:
+        """
+        (kind, video ID) of the next request; a video download becomes a render
+        until a render has produced something to download
+        """
+        if kind != 'video':
+            return kind, None
+        with self._lock:
+            video_id = rng.choice(self.video_ids) if self.video_ids else None
+        return ('generate', None) if video_id is None else ('video', video_id)
+
+    def _request(self, kind: str, rng: random.Random, video_id: str = None) -> bool:
+        """Send one request, returning whether it succeeded"""
+        number = self._next_number()
+        if kind == 'video':
+            status, size = get_bytes(f"{self.url}/video/{video_id}")
+            return status == 200 and size > 0
+
+        if kind == 'generate':
+            body = dict(rng.choice(self.problems))
+            if self.unique:
+                body['title'] = f"Load test {self.seed}-{number}"
+            status, result = post_json(f"{self.url}/generate", body)
+        else:
+            code = rng.choice(self.codes)
+            narration = NARRATION
+            if self.unique:
+                code += f"\n# load test {self.seed}-{number}\n"
+                narration += f" This is request {self.seed}-{number}."
+            status, result = post_json(f"{self.url}/generate-dynamic",
+                                       {"code": code, "narration": narration})
+
+        if status == 200 and result.get('success'):
+            with self._lock:
+                self.video_ids.append(result['video_id'])
+            return True
+        return False
+
+    def run_level(self, concurrency: int, duration: float) -> dict:
+        """Run concurrency clients for duration seconds and summarize their requests"""
+        samples = []
+        samples_lock = threading.Lock()
+        deadline = time.monotonic() + duration
+        kinds, weights = zip(*self.weights.items())
+
+        def client(index):
+            rng = random.Random(f"{self.seed}-{concurrency}-{index}")
+            while time.monotonic() < deadline:
+                # Recorded as the request actually sent
+                kind, video_id = self._kind_to_send(rng.choices(kinds, weights)[0], rng)
+                start = time.monotonic()
+                try:
+                    ok = self._request(kind, rng, video_id)
+                except (urllib.error.URLError, OSError, ValueError) as e:
+                    ok = False
+                    if not isinstance(e, urllib.error.HTTPError):
+                        print(f"  {kind}: {e}")
+                with samples_lock:
+                    samples.append((kind, time.monotonic() - start, ok))
+
+        start = time.monotonic()
+        threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - start
+
+        return summarize(samples, concurrency, elapsed)
+
+
+def summarize(samples: list, concurrency: int, elapsed: float) -> dict:
+    def stats(selected):
+        latencies = [latency for _, latency, _ in selected]
+        errors = sum(1 for _, _, ok in selected if not ok)
+        return {
+            'requests': len(selected),
+            'error_rate': errors / len(selected) if selected else 0.0,
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+        }
+
+    renders = [s for s in samples if s[0] != 'video' and s[2]]
+    return {
+        'concurrency': concurrency,
+        'seconds': elapsed,
+        # Finished renders (which include TTS and muxing), not counting video downloads
+        'jobs_per_minute': len(renders) / elapsed * 60 if elapsed else 0.0,
+        'all': stats(samples),
+        'by_request': {kind: stats([s for s in samples if s[0] == kind])
+                       for kind in sorted({s[0] for s in samples})},
+    }
+
+
+def print_level(level: dict):
+    def seconds(value):
+        return '     -' if value is None else f"{value:6.2f}"
+
+    overall = level['all']
+    print(f"{level['concurrency']:>11} {overall['requests']:>8} {overall['error_rate']:>6.1%} "
+          f"{seconds(overall['p50'])} {seconds(overall['p95'])} {seconds(overall['p99'])} "
+          f"{level['jobs_per_minute']:>8.1f}")
+    for kind, stats in level['by_request'].items():
+        print(f"{kind:>20} {stats['requests']:>8} {stats['error_rate']:>6.1%} "
+              f"{seconds(stats['p50'])} {seconds(stats['p95'])} {seconds(stats['p99'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default=DEFAULT_URL, help=f"service URL (default: {DEFAULT_URL})")
+    parser.add_argument('--concurrency', default='1,2,4,8',
+                        help="comma-separated client counts, one level each (default: 1,2,4,8)")
+    parser.add_argument('--duration', type=float, default=60, help="seconds per level (default: 60)")
+    parser.add_argument('--warmup', type=float, default=10,
+                        help="seconds of unrecorded load before the first level (default: 10)")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f"request weights (default: {DEFAULT_MIX})")
+    parser.add_argument('--allow-cache-hits', action='store_true',
+                        help="repeat identical scenes, so most renders are video cache hits")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the request sequence")
+    parser.add_argument('--output', type=Path, help="also write the results as JSON")
+    args = parser.parse_args()
+
+    try:
+        with urllib.request.urlopen(f"{args.url.rstrip('/')}/health", timeout=10) as response:
+            response.read()
+    except (urllib.error.URLError, OSError) as e:
+        print(f"Cannot reach the service at {args.url}: {e}")
+        print("Start it with: TTS_PROVIDER=stub ./start.sh")
+        return 1
+
+    test = LoadTest(args.url, parse_mix(args.mix), unique=not args.allow_cache_hits, seed=args.seed)
+    levels = [int(level) for level in args.concurrency.split(',')]
+
+    if args.warmup > 0:
+        print(f"Warming up for {args.warmup:.0f}s...")
+        test.run_level(max(levels), args.warmup)
+
+    print(f"\n{'concurrency':>11} {'requests':>8} {'errors':>6} {'p50':>6} {'p95':>6} {'p99':>6} "
+          f"{'jobs/min':>8}")
+    results = []
+    for concurrency in levels:
+        level = test.run_level(concurrency, args.duration)
+        results.append(level)
+        print_level(level)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'url': args.url, 'mix': test.weights, 'unique': test.unique,
+                       'levels': results}, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
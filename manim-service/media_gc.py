@@ -0,0 +1,354 @@
+"""
+Background garbage collector for the media and temp directories
+Keeps generated files within a byte budget and TTL without touching renders in flight
+"""
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from render_pipeline import MEDIA_DIR, TEMP_DIR, RENDERS_DIR, HLS_DIR, in_flight_ids
+from jobs import JOBS_DIR, BATCHES_DIR
+from svg_cache import SVG_CACHE_DIR
+from segment_store import SEGMENT_CACHE_DIR, SEGMENT_CACHE_MAX_BYTES
+from tts_cache import TTS_CACHE_DIR
+from video_cache import VIDEO_CACHE_DIR
+
+# Configuration
+MEDIA_MAX_BYTES = int(os.getenv('MEDIA_MAX_BYTES', str(5 * 1024 ** 3)))
+MEDIA_TTL = int(os.getenv('MEDIA_TTL', str(7 * 24 * 3600)))
+GC_INTERVAL = int(os.getenv('GC_INTERVAL', '300'))
+
+# Leftovers younger than this may belong to a render in another server process
+STALE_GRACE = int(os.getenv('GC_STALE_GRACE', '3600'))
+
+# Manim's default output trees, used by renders outside the per-job directories
+# (e.g. the scene_generator.py command line) and for scenes saved as images
+MANIM_SCRATCH_DIRS = ('videos', 'images')
+
+# Manim's compiled TeX and Text caches, kept until they expire
+MANIM_CACHE_DIRS = ('Tex', 'texts')
+
+# Caches with byte limits of their own, left out of MEDIA_MAX_BYTES
+CACHE_DIRS = (VIDEO_CACHE_DIR, TTS_CACHE_DIR, SVG_CACHE_DIR, SEGMENT_CACHE_DIR)
+
+
+def _tree_size(path: Path) -> int:
+    """Bytes used under path, counting hardlinked files once"""
+    total = 0
+    seen = set()
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                stat = os.stat(os.path.join(root, name))
+            except FileNotFoundError:
+                continue
+            if (stat.st_dev, stat.st_ino) not in seen:
+                seen.add((stat.st_dev, stat.st_ino))
+                total += stat.st_size
+    return total
+
+
+def _budgeted_size(path: Path, exclude: set) -> int:
+    """
+    Bytes under path that count against the media budget
+
+    Directories in exclude are skipped, and so are files with other hardlinks
+    (e.g. published videos shared with the video cache): their bytes stay on
+    disk until the last link goes, and the cache holding it accounts for them.
+    """
+    total = 0
+    for root, dirs, files in os.walk(path):
+        dirs[:] = [d for d in dirs if Path(root, d).resolve() not in exclude]
+        for name in files:
+            try:
+                stat = os.stat(os.path.join(root, name))
+            except FileNotFoundError:
+                continue
+            if stat.st_nlink == 1:
+                total += stat.st_size
+    return total
+
+
+def _tree_newest_mtime(path: Path) -> float:
+    newest = path.stat().st_mtime
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                newest = max(newest, os.stat(os.path.join(root, name)).st_mtime)
+            except FileNotFoundError:
+                pass
+    return newest
+
+
+class MediaCollector:
+    """
+    Periodically reclaims disk space under media/ and temp/
+
+    Each pass removes, in order:
+      1. stale partial files: abandoned per-job render directories, Manim scratch
+         output, temp files and half-written cache entries
+      2. expired files: job records and TeX/Text caches older than MEDIA_TTL, and
+         published videos that have not been served for MEDIA_TTL
+      3. the least recently used shared segments, until the segment store fits
+         in SEGMENT_CACHE_MAX_BYTES
+      4. the least recently served published videos, until the media directory
+         fits in MEDIA_MAX_BYTES; the caches under it have limits of their own
+         and are not counted, nor are videos that are hardlinks into the video
+         cache, which are not evicted here since removing them frees nothing
+
+    Renders in flight in this process are never touched, and partial files
+    younger than STALE_GRACE are left alone in case another process owns them.
+    """
+
+    def __init__(self, media_dir: Path = MEDIA_DIR, temp_dir: Path = TEMP_DIR,
+                 max_bytes: int = MEDIA_MAX_BYTES, ttl: int = MEDIA_TTL,
+                 grace: int = STALE_GRACE, interval: int = GC_INTERVAL,
+                 cache_dirs=CACHE_DIRS):
+        self.media_dir = media_dir
+        self.cache_dirs = {Path(d).resolve() for d in cache_dirs}
+        self.temp_dir = temp_dir
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.grace = grace
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pass = {}
+        self._stats = {
+            'passes': 0,
+            'reclaimed_bytes': 0,
+            'reclaimed_files': 0,
+            'reclaimed_bytes_by_category': {},
+            'last_pass_at': None,
+            'last_pass_seconds': None,
+            'media_bytes': None,
+        }
+
+    def start(self):
+        """Run collection passes every interval seconds on a daemon thread"""
+        if self._thread is not None:
+            return
+
+        def loop():
+            while not self._stop.wait(self.interval):
+                try:
+                    self.collect()
+                except Exception as e:
+                    print(f"[GC] Collection pass failed: {e}")
+
+        self._thread = threading.Thread(target=loop, name='media-gc', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def collect(self) -> dict:
+        """
+        Run one collection pass now
+
+        Returns:
+            dict: Bytes and files reclaimed in this pass, by category
+        """
+        with self._lock:
+            start = time.time()
+            self._pass = {}
+            in_flight = in_flight_ids()
+
+            self._collect_stale_partials(start, in_flight)
+            self._collect_expired(start, in_flight)
+            self._collect_segments(start)
+            media_bytes = self._collect_over_budget(in_flight)
+
+            summary = {
+                'reclaimed_bytes': sum(b for b, _ in self._pass.values()),
+                'reclaimed_files': sum(f for _, f in self._pass.values()),
+                'by_category': {c: {'bytes': b, 'files': f} for c, (b, f) in self._pass.items()},
+                'media_bytes': media_bytes,
+            }
+
+            self._stats['passes'] += 1
+            self._stats['reclaimed_bytes'] += summary['reclaimed_bytes']
+            self._stats['reclaimed_files'] += summary['reclaimed_files']
+            by_category = self._stats['reclaimed_bytes_by_category']
+            for category, (freed, _) in self._pass.items():
+                by_category[category] = by_category.get(category, 0) + freed
+            self._stats['last_pass_at'] = start
+            self._stats['last_pass_seconds'] = time.time() - start
+            self._stats['media_bytes'] = media_bytes
+
+            if summary['reclaimed_files']:
+                print(f"[GC] Reclaimed {summary['reclaimed_bytes']} bytes in "
+                      f"{summary['reclaimed_files']} files")
+            return summary
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['reclaimed_bytes_by_category'] = dict(stats['reclaimed_bytes_by_category'])
+        stats.update(max_bytes=self.max_bytes, ttl=self.ttl, interval=self.interval)
+        return stats
+
+    # Collection phases
+
+    def _collect_stale_partials(self, now: float, in_flight: set):
+        # Per-job render directories whose render died or was abandoned
+        if RENDERS_DIR.exists():
+            for render_dir in RENDERS_DIR.iterdir():
+                if render_dir.name in in_flight:
+                    continue
+                if now - _tree_newest_mtime(render_dir) > self.grace:
+                    self._remove('stale_renders', render_dir)
+
+        # HLS packages whose video is gone
+        if HLS_DIR.exists():
+            for package_dir in HLS_DIR.iterdir():
+                if package_dir.name in in_flight or (self.media_dir / f"{package_dir.name}.mp4").exists():
+                    continue
+                if now - _tree_newest_mtime(package_dir) > self.grace:
+                    self._remove('stale_renders', package_dir)
+
+        # Manim's default output trees and leftover code files
+        for name in MANIM_SCRATCH_DIRS:
+            self._remove_older_than('manim_scratch', self.media_dir / name, now - self.grace)
+        self._remove_older_than('temp_files', self.temp_dir, now - self.grace)
+
+        # Half-written cache entries and job records (written to temp names, then renamed)
+        for tmp_file in self.media_dir.rglob('*.tmp'):
+            if tmp_file.is_file() and now - tmp_file.stat().st_mtime > self.grace:
+                self._remove('temp_files', tmp_file)
+
+    def _collect_expired(self, now: float, in_flight: set):
+        self._remove_older_than('job_records', JOBS_DIR, now - self.ttl)
+        self._remove_older_than('job_records', BATCHES_DIR, now - self.ttl)
+        for name in MANIM_CACHE_DIRS:
+            self._remove_older_than('manim_caches', self.media_dir / name, now - self.ttl)
+        # Shared SVGs are touched on every hit, so these are the ones no render used
+        self._remove_older_than('manim_caches', SVG_CACHE_DIR, now - self.ttl)
+
+        # Published videos are aged by when they were last served, not created
+        for video, last_used in self._published_videos(in_flight):
+            if now - last_used > self.ttl:
+                self._remove_video('expired_videos', video)
+
+    def _collect_segments(self, now: float):
+        # Segments are touched on every hit, so these are the ones no render used
+        self._remove_older_than('segments', SEGMENT_CACHE_DIR, now - self.ttl)
+        if not SEGMENT_CACHE_DIR.exists():
+            return
+
+        segments = []
+        for path in SEGMENT_CACHE_DIR.rglob('*'):
+            try:
+                if path.is_file() and path.suffix != '.tmp':
+                    stat = path.stat()
+                    segments.append((stat.st_mtime, stat.st_size, path))
+            except FileNotFoundError:
+                pass
+        # Size each segment once, whether or not a job directory still links it
+        store_bytes = sum(size for _, size, _ in segments)
+        for _, size, path in sorted(segments):
+            if store_bytes <= SEGMENT_CACHE_MAX_BYTES:
+                break
+            self._remove('evicted_segments', path)
+            store_bytes -= size
+
+    def _collect_over_budget(self, in_flight: set) -> int:
+        media_bytes = _budgeted_size(self.media_dir, self.cache_dirs)
+        if media_bytes <= self.max_bytes:
+            return media_bytes
+
+        videos = sorted(((video, last_used) for video, last_used in self._published_videos(in_flight)
+                         if _link_count(video) == 1), key=lambda item: item[1])
+        for video, _ in videos:
+            if media_bytes <= self.max_bytes:
+                break
+            media_bytes -= self._remove_video('evicted_videos', video)
+        return media_bytes
+
+    # Helpers
+
+    def _published_videos(self, in_flight: set):
+        """Yield (path, last served or created time) for published videos not in flight"""
+        for video in self.media_dir.glob('*.mp4'):
+            if video.stem in in_flight:
+                continue
+            try:
+                stat = video.stat()
+            except FileNotFoundError:
+                continue
+            yield video, max(stat.st_atime, stat.st_mtime)
+
+    def _remove_video(self, category: str, video: Path) -> int:
+        """Delete a published video together with its HLS packages"""
+        freed = self._remove(category, video)
+        package_dir = HLS_DIR / video.stem
+        if package_dir.exists():
+            freed += self._remove(category, package_dir)
+        return freed
+
+    def _remove_older_than(self, category: str, directory: Path, cutoff: float):
+        if not directory.exists():
+            return
+        for root, dirs, files in os.walk(directory, topdown=False):
+            for name in files:
+                path = Path(root) / name
+                try:
+                    if path.stat().st_mtime < cutoff:
+                        self._remove(category, path)
+                except FileNotFoundError:
+                    pass
+            # Drop directories left empty, but keep the top-level one
+            if Path(root) != directory:
+                try:
+                    os.rmdir(root)
+                except OSError:
+                    pass
+
+    def _remove(self, category: str, path: Path) -> int:
+        """Delete a file or directory and record the bytes actually freed"""
+        try:
+            if path.is_dir():
+                freed, files = _tree_size(path), sum(len(f) for _, _, f in os.walk(path))
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                stat = path.stat()
+                # Hardlinks shared with the video cache free nothing until the last link goes
+                freed, files = (stat.st_size if stat.st_nlink == 1 else 0), 1
+                path.unlink()
+        except FileNotFoundError:
+            return 0
+
+        total_freed, total_files = self._pass.get(category, (0, 0))
+        self._pass[category] = (total_freed + freed, total_files + files)
+        return freed
+
+
+def _link_count(path: Path) -> int:
+    try:
+        return path.stat().st_nlink
+    except FileNotFoundError:
+        return 0
+
+
+def mark_served(video_path: Path):
+    """Record that a video was just served, which keeps it from being evicted"""
+    try:
+        stat = video_path.stat()
+        os.utime(video_path, (time.time(), stat.st_mtime))
+    except OSError:
+        pass
+
+
+_collector = None
+_collector_lock = threading.Lock()
+
+
+def get_media_collector() -> MediaCollector:
+    """Return the process-wide media collector, creating it on first use"""
+    global _collector
+    with _collector_lock:
+        if _collector is None:
+            _collector = MediaCollector()
+        return _collector
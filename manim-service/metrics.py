@@ -0,0 +1,153 @@
+"""
+Service metrics in the Prometheus text format
+Stage latency histograms, failure counters and gauges, served by GET /metrics
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds in seconds: milliseconds for publishing and serving, up to the
+# render timeout and beyond for renders, TTS and re-encoding muxes
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+_metrics = []
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _format_value(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """A named metric with one series per combination of label values"""
+
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._series = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} takes the labels {', '.join(self.labels)}")
+        return tuple((name, labels[name]) for name in self.labels)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = sorted(self._series.items(), key=lambda item: str(item[0]))
+            lines += [line for key, value in series for line in self._samples(key, value)]
+        return lines
+
+    def _samples(self, key: tuple, value) -> list:
+        return [f"{self.name}{_format_labels(key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    """A count that only goes up, e.g. failures by cause"""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """A value read when the metrics are scraped, from a function returning a number"""
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, read):
+        super().__init__(name, documentation)
+        self._read = read
+
+    def render(self) -> list:
+        try:
+            value = self._read()
+        except Exception as e:
+            print(f"[METRICS] Could not read {self.name}: {e}")
+            value = None
+        with self._lock:
+            self._series = {} if value is None else {(): value}
+        return super().render()
+
+
+class Histogram(_Metric):
+    """Distribution of durations in seconds, counted into cumulative buckets"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (),
+                 buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, seconds: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0}
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series['counts'][i] += 1
+            series['sum'] += seconds
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the seconds spent in the with block, also when it raises"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self, key: tuple, series: dict) -> list:
+        samples = [f"{self.name}_bucket{_format_labels(key + (('le', _format_value(bound)),))} {count}"
+                   for bound, count in zip(self.buckets, series['counts'])]
+        samples.append(f"{self.name}_sum{_format_labels(key)} {_format_value(series['sum'])}")
+        samples.append(f"{self.name}_count{_format_labels(key)} {series['counts'][-1]}")
+        return samples
+
+
+def render() -> str:
+    """Every metric of this process in the Prometheus text exposition format"""
+    return '\n'.join(line for metric in list(_metrics) for line in metric.render()) + '\n'
+
+
+# Seconds spent in each pipeline stage: code_load (checking and executing generated
+# code in the worker), worker_spawn and worker_import (starting a worker and its
+# Manim import), validate, render, mux, publish and serve
+STAGE_SECONDS = Histogram('manim_stage_seconds', 'Seconds spent in each pipeline stage',
+                          labels=('stage',))
+
+# Seconds spent synthesizing narration that was not in the TTS cache
+TTS_SECONDS = Histogram('manim_tts_seconds', 'Seconds spent synthesizing narration by provider',
+                        labels=('provider',))
+
+# timeout, worker_crash, preflight, exec_error, tts_fallback (Qwen failed, gTTS used),
+# tts_failed, mux_fallback (stream copy failed, moviepy used), mux_failed and hls_failed
+FAILURES = Counter('manim_failures_total', 'Failures by cause', labels=('cause',))
+
+
+def record_timings(timings: list):
+    """Add the (stage, seconds) observations taken in a render worker to STAGE_SECONDS"""
+    for stage, seconds in timings or ():
+        STAGE_SECONDS.observe(seconds, stage=stage)
@@ -0,0 +1,169 @@
+"""
+Profiling capture for individual renders
+Runs a render worker job under cProfile and times the phases of Manim's frame pipeline
+"""
+import cProfile
+import functools
+import json
+import os
+import pstats
+import threading
+import time
+from pathlib import Path
+
+# Fraction of cache misses profiled without asking, e.g. 0.01 for one in a hundred
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+
+# Functions with the most cumulative time listed in the breakdown
+TOP_FUNCTIONS = 25
+
+# Seconds and calls of each phase while a capture is running, None otherwise.
+# Phases run in the rendering thread except 'encode', which runs in Manim's
+# frame writer thread and so overlaps the others
+_phases = None
+_phases_lock = threading.Lock()
+_frames = 0
+_stack = threading.local()
+
+
+def _add(phase: str, seconds: float):
+    with _phases_lock:
+        if _phases is not None:
+            totals = _phases.setdefault(phase, {'seconds': 0.0, 'calls': 0})
+            totals['seconds'] += seconds
+            totals['calls'] += 1
+
+
+def _timed(phase: str, func):
+    """
+    Wrap func to add its time to a phase while a capture is running
+
+    Time spent in a nested timed call counts towards the inner phase only, e.g.
+    a MathTex compiled by an updater is 'tex', not 'mobject_updates'.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _phases is None:
+            return func(*args, **kwargs)
+        stack = _stack.__dict__.setdefault('children', [])
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            _add(phase, elapsed - children)
+    return wrapper
+
+
+def install():
+    """
+    Time the phases of Manim's frame pipeline
+
+    Must be called in a render worker after Manim is imported, and before
+    svg_cache.install so that SVGs served from the cache do not count as
+    compiled. Costs one check per call while no capture is running.
+    """
+    from manim.mobject.text import text_mobject
+    from manim.renderer.cairo_renderer import CairoRenderer
+    from manim.scene.scene import Scene
+    from manim.scene.scene_file_writer import SceneFileWriter
+    from manim.utils import tex_file_writing
+
+    # LaTeX and dvisvgm, called through the module so the patch is seen
+    tex_file_writing.compile_tex = _timed('tex', tex_file_writing.compile_tex)
+    tex_file_writing.convert_to_svg = _timed('tex', tex_file_writing.convert_to_svg)
+    # Pango
+    for text_class in (text_mobject.Text, text_mobject.MarkupText):
+        text_class._text2svg = _timed('text', text_class._text2svg)
+    # Animation interpolation and updaters, then Cairo drawing, for every frame
+    Scene.update_to_time = _timed('mobject_updates', Scene.update_to_time)
+    CairoRenderer.update_frame = _timed('rasterize', CairoRenderer.update_frame)
+    # Video encoding of frames, and the concatenation of partial movie files
+    original_encode = SceneFileWriter.encode_and_write_frame
+
+    def encode_and_write_frame(writer, frame, num_frames):
+        global _frames
+        if _phases is not None:
+            with _phases_lock:
+                _frames += num_frames
+        return original_encode(writer, frame, num_frames)
+
+    SceneFileWriter.encode_and_write_frame = _timed('encode', encode_and_write_frame)
+    SceneFileWriter.combine_to_movie = _timed('combine', SceneFileWriter.combine_to_movie)
+
+
+class ProfileCapture:
+    """
+    Profile the job run inside the with block
+
+    Writes <output_dir>/<name>.prof (pstats format, for snakeviz or
+    python -m pstats) and <name>.json, the breakdown of where the time went,
+    which is also kept as the breakdown attribute.
+    """
+
+    def __init__(self, output_dir, name: str):
+        self.output_dir = Path(output_dir)
+        self.name = name
+        self.breakdown = None
+        self._profiler = cProfile.Profile()
+
+    def __enter__(self):
+        global _phases, _frames
+        with _phases_lock:
+            _phases, _frames = {}, 0
+        self._start = time.perf_counter()
+        self._profiler.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        global _phases
+        self._profiler.disable()
+        wall_seconds = time.perf_counter() - self._start
+        with _phases_lock:
+            phases, _phases = _phases, None
+
+        try:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            self._profiler.dump_stats(str(self.output_dir / f"{self.name}.prof"))
+            self.breakdown = _breakdown(pstats.Stats(self._profiler), phases, _frames, wall_seconds)
+            tmp_path = self.output_dir / f"{self.name}.json.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self.breakdown, f)
+            os.replace(tmp_path, self.output_dir / f"{self.name}.json")
+        except Exception as e:
+            print(f"[PROFILE] Could not save the profile of {self.name}: {e}")
+        return False
+
+
+def _breakdown(stats: pstats.Stats, phases: dict, frames: int, wall_seconds: float) -> dict:
+    timed = {phase: {'seconds': round(totals['seconds'], 4), 'calls': totals['calls']}
+             for phase, totals in sorted(phases.items())}
+    # Everything else in the rendering thread: construct(), mobject creation, imports
+    in_thread = sum(totals['seconds'] for phase, totals in phases.items() if phase != 'encode')
+    timed['other'] = {'seconds': round(max(wall_seconds - in_thread, 0.0), 4)}
+
+    per_frame_ms = {}
+    if frames:
+        for phase in ('mobject_updates', 'rasterize', 'encode'):
+            if phase in phases:
+                per_frame_ms[phase] = round(phases[phase]['seconds'] / frames * 1000, 3)
+
+    functions = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+    top = [{
+        'function': pstats.func_std_string(func),
+        'calls': calls,
+        'own_seconds': round(own, 4),
+        'cumulative_seconds': round(cumulative, 4),
+    } for func, (_, calls, own, cumulative, _) in functions[:TOP_FUNCTIONS]]
+
+    return {
+        'wall_seconds': round(wall_seconds, 4),
+        'frames': frames,
+        'phases': timed,
+        'per_frame_ms': per_frame_ms,
+        'top_functions': top,
+    }
@@ -0,0 +1,615 @@
+"""
+Render pipeline for the Manim service
+Renders a scene on the worker pool, adds optional TTS narration and publishes the video
+"""
+import functools
+import os
+import random
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from code_preflight import PreflightError, preflight
+from profiling import PROFILE_SAMPLE_RATE
+from metrics import FAILURES, STAGE_SECONDS, record_timings
+from ffmpeg_tools import HLS_PLAYLIST, faststart, hls_complete, package_hls
+from scene_spec import SpecError, parse_spec
+from tts_generator import generate_tts, combine_video_audio
+from render_pool import get_render_pool, RenderTimeout, WorkerCrashed
+from video_cache import cache_key, get_video_cache
+from worker_counters import record_counts
+import segment_store
+
+# Configuration
+MEDIA_DIR = Path("./media")
+MEDIA_DIR.mkdir(exist_ok=True)
+
+TEMP_DIR = Path("./temp")
+TEMP_DIR.mkdir(exist_ok=True)
+
+# Job records, and the profiles of profiled renders next to them
+JOBS_DIR = MEDIA_DIR / "jobs"
+JOBS_DIR.mkdir(exist_ok=True)
+
+# Each render writes into its own directory, removed once the video is published
+RENDERS_DIR = MEDIA_DIR / "renders"
+RENDERS_DIR.mkdir(exist_ok=True)
+
+# HLS packages of published videos, one directory per video and tier, written by
+# the same ffmpeg pass that writes the published MP4
+HLS_DIR = MEDIA_DIR / "hls"
+
+RENDER_TIMEOUT = int(os.getenv('RENDER_TIMEOUT', '60'))
+VALIDATE_TIMEOUT = int(os.getenv('VALIDATE_TIMEOUT', '30'))
+
+# TTS is mostly waiting on the network, so it runs on threads alongside the renders
+TTS_THREADS = int(os.getenv('TTS_THREADS', '8'))
+_tts_executor = ThreadPoolExecutor(max_workers=TTS_THREADS, thread_name_prefix='tts')
+
+# Resolution and frame rate of each render tier. Previews render in a fraction of
+# the time and are replaced in place by the standard render when progressive
+RENDER_TIERS = {
+    "preview": {"pixel_width": 854, "pixel_height": 480, "frame_rate": 15},
+    "standard": {"pixel_width": 1280, "pixel_height": 720, "frame_rate": 30},
+}
+DEFAULT_TIER = "standard"
+
+# Parallel rendering of one scene (opt-in per request): its animations are split
+# into contiguous slices rendered on separate workers, which publish their segments
+# to the segment store, and a final pass concatenates them. Scenes shorter than
+# PARALLEL_MIN_SECONDS render serially, since the extra passes would cost more
+PARALLEL_MAX_SLICES = int(os.getenv('PARALLEL_MAX_SLICES', '4'))
+PARALLEL_MIN_SECONDS = float(os.getenv('PARALLEL_MIN_SECONDS', '6'))
+_slice_executor = ThreadPoolExecutor(max_workers=PARALLEL_MAX_SLICES * 4,
+                                     thread_name_prefix='render-slice')
+
+
+# IDs of visualizations currently being rendered, which the media collector must not touch
+_in_flight = set()
+_in_flight_lock = threading.Lock()
+
+
+def in_flight_ids() -> set:
+    """IDs of the visualizations this process is rendering right now"""
+    with _in_flight_lock:
+        return set(_in_flight)
+
+
+def _tracked(render):
+    """Register the visualization as in flight for the duration of the render"""
+    @functools.wraps(render)
+    def wrapper(viz_id, *args, **kwargs):
+        with _in_flight_lock:
+            _in_flight.add(viz_id)
+        try:
+            return render(viz_id, *args, **kwargs)
+        finally:
+            with _in_flight_lock:
+                _in_flight.discard(viz_id)
+    return wrapper
+
+
+class PipelineError(Exception):
+    """
+    A render that could not produce a video
+
+    Args:
+        error: Short error message for the client
+        details: Longer explanation, e.g. the scene traceback
+        status: HTTP status to answer with
+        extra: Additional fields to include in the error response
+    """
+
+    def __init__(self, error: str, details: str = None, status: int = 500, **extra):
+        super().__init__(error)
+        self.error = error
+        self.details = details
+        self.status = status
+        self.extra = extra
+
+    def to_dict(self) -> dict:
+        payload = {"error": self.error}
+        if self.details is not None:
+            payload["details"] = self.details
+        payload.update(self.extra)
+        return payload
+
+
+def _noop_stage(stage: str):
+    pass
+
+
+def _preflight_error(error: dict) -> PipelineError:
+    details = f"Line {error['line']}: {error['message']}" if error['line'] else error['message']
+    return PipelineError("Generated code failed pre-flight checks", details=details,
+                         status=422, **error)
+
+
+def check_code(code: str):
+    """
+    Statically check generated code before it is queued for rendering
+
+    Names are checked against those reported by the render workers, once one
+    has started; until then the worker checks them itself before executing.
+
+    Raises:
+        PipelineError: The code cannot render (status 422)
+    """
+    try:
+        preflight(code, known_names=get_render_pool().known_names)
+    except PreflightError as e:
+        FAILURES.inc(cause='preflight')
+        raise _preflight_error(e.to_dict())
+
+
+def check_spec(problem_data) -> dict:
+    """
+    Validate /generate problem data before it is queued for rendering
+
+    Returns:
+        dict: The normalized spec, which is what gets rendered and cached
+
+    Raises:
+        PipelineError: The problem data is malformed (status 422)
+    """
+    try:
+        return parse_spec(problem_data)
+    except SpecError as e:
+        raise PipelineError("Invalid problem spec", details=str(e), status=422, **e.to_dict())
+
+
+def _run_on_pool(job: dict, timeout: int, failure: str = "Failed to generate visualization",
+                 failure_status: int = 500, on_progress=None, deadline: float = None) -> dict:
+    """
+    Run a job on the render pool, turning worker failures into PipelineErrors
+
+    Args:
+        timeout: Seconds the job may take
+        failure: Error message when the scene code raised
+        failure_status: HTTP status when the scene code raised
+        on_progress: Called with each progress event the worker sends
+        deadline: time.monotonic() by which the job must finish instead, for a
+                  job that is one of several passes sharing the timeout
+
+    Returns:
+        dict: The worker's result for a job that succeeded
+    """
+    try:
+        limit = timeout if deadline is None else deadline - time.monotonic()
+        if limit <= 0:
+            raise RenderTimeout(f"No time left of {timeout}s")
+        result = get_render_pool().render(job, timeout=limit, on_event=on_progress)
+        record_counts(result.get('counters'))
+        record_timings(result.get('timings'))
+    except RenderTimeout:
+        FAILURES.inc(cause='timeout')
+        raise PipelineError(f"Visualization generation timed out (>{timeout}s)")
+    except WorkerCrashed as e:
+        FAILURES.inc(cause='worker_crash')
+        raise PipelineError("Failed to generate visualization", details=str(e))
+
+    STAGE_SECONDS.observe(result['render_seconds'],
+                          stage='validate' if job['kind'] == 'validate' else 'render')
+    if not result['ok']:
+        if 'preflight' in result:
+            FAILURES.inc(cause='preflight')
+            raise _preflight_error(result['preflight'])
+        FAILURES.inc(cause='exec_error')
+        extra = {'line': result['line']} if result.get('line') else {}
+        raise PipelineError(failure, details=result['details'], status=failure_status, **extra)
+
+    return result
+
+
+def _render(job: dict, timeout: int, on_progress=None, deadline: float = None):
+    """
+    Render a job on the pool
+
+    Returns:
+        tuple: The video file the worker reported writing, and the seconds the render took
+    """
+    result = _run_on_pool(job, timeout, on_progress=on_progress, deadline=deadline)
+
+    if not result['video_path'] or not Path(result['video_path']).exists():
+        raise PipelineError("Video file not found",
+                            details="The scene finished without writing a video, "
+                                    "make sure it plays at least one animation",
+                            expected=result['video_path'])
+
+    return Path(result['video_path']), result['render_seconds']
+
+
+def plan_slices(timeline: list, slices: int) -> list:
+    """
+    Split a scene's animations into contiguous slices of similar run time
+
+    Args:
+        timeline: Run time of each animation, in order
+        slices: Largest number of slices to make
+
+    Returns:
+        list: (first, last) animation indices of each slice, inclusive
+    """
+    total = sum(timeline)
+    if total <= 0 or slices < 2:
+        return [(0, len(timeline) - 1)] if timeline else []
+
+    planned = []
+    first, elapsed = 0, 0.0
+    for index, run_time in enumerate(timeline[:-1]):
+        elapsed += run_time
+        # Cut here when the next slice boundary is nearer than after the next animation
+        boundary = total * (len(planned) + 1) / slices
+        if len(planned) < slices - 1 and elapsed + timeline[index + 1] / 2 >= boundary:
+            planned.append((first, index))
+            first = index + 1
+    if first < len(timeline):
+        planned.append((first, len(timeline) - 1))
+    return planned
+
+
+def _render_parallel(job: dict, timeout: int, on_progress=None):
+    """
+    Render a dynamic job's animations in slices on several workers, then join them
+
+    The scene is constructed once without rendering to time its animations.
+    Each slice renders its animations with Manim's from/upto_animation_number
+    and publishes the segments to the shared segment store, so the final pass
+    finds every segment cached and only concatenates them, losslessly and in
+    the same order as a serial render. Any segment a slice did not produce is
+    rendered by the final pass itself. All passes together get timeout seconds,
+    as a serial render does.
+
+    Returns:
+        tuple: Same as _render, with the wall time of all passes
+    """
+    start = time.time()
+    deadline = time.monotonic() + timeout
+    slices = []
+    pool_size = get_render_pool().size
+    if not segment_store.SEGMENT_CACHE_DISABLED and pool_size > 1:
+        validation = _run_on_pool({'kind': 'validate', 'code': job['code']}, timeout,
+                                  deadline=deadline)
+        timeline = validation['validation']['timeline']
+        if sum(timeline) >= PARALLEL_MIN_SECONDS:
+            slices = plan_slices(timeline, min(PARALLEL_MAX_SLICES, pool_size))
+
+    if len(slices) > 1:
+        print(f"[API] Rendering {len(slices)} slices in parallel: {slices}")
+
+        def forward_rendered(event):
+            # Slices also report the animations they skip, which render elsewhere
+            if on_progress is not None and event.get('frames'):
+                on_progress(event)
+
+        def render_slice(first, last):
+            slice_dir = Path(job['output_dir']) / f"slice_{first}"
+            try:
+                _run_on_pool({
+                    **job,
+                    'output_dir': str(slice_dir),
+                    'render_config': {**job.get('render_config', {}),
+                                      'from_animation_number': first,
+                                      'upto_animation_number': last},
+                }, timeout, on_progress=forward_rendered, deadline=deadline)
+            finally:
+                shutil.rmtree(slice_dir, ignore_errors=True)
+
+        futures = [_slice_executor.submit(render_slice, first, last) for first, last in slices]
+        for future in futures:
+            future.result()
+        on_progress = None
+
+    video_path, _ = _render(job, timeout, on_progress, deadline)
+    return video_path, time.time() - start
+
+
+def _publish(video_path: Path, public_file: Path, hls_output: Path = None):
+    """
+    Move a finished video to its public name; a rename, not a copy, on the same filesystem
+
+    Manim writes the MP4 index after the media data, so it is moved to the
+    front first and players can start before the whole file has downloaded.
+    With hls_output, that pass also writes the video's HLS segments.
+    """
+    with STAGE_SECONDS.time(stage='publish'):
+        try:
+            faststart(video_path, hls_output)
+        except Exception as e:
+            print(f"[API] Could not move the MP4 index of {video_path} to the front: {e}")
+            if hls_output is not None:
+                # Publish the MP4 without HLS rather than not at all
+                _drop_hls(hls_output)
+                try:
+                    faststart(video_path)
+                except Exception as e:
+                    print(f"[API] Could not move the MP4 index of {video_path} to the front: {e}")
+        try:
+            os.replace(video_path, public_file)
+        except OSError:
+            shutil.copy(video_path, public_file)
+
+
+def profile_dir(viz_id: str) -> Path:
+    """Directory holding <tier>.prof and <tier>.json for each profiled render of a video"""
+    return JOBS_DIR / f"{viz_id}.profile"
+
+
+def _should_profile(profile: bool) -> bool:
+    # Renders nobody asked to profile are sampled at PROFILE_SAMPLE_RATE. Only
+    # called on a cache miss, so sampling never forces a render
+    return profile or random.random() < PROFILE_SAMPLE_RATE
+
+
+def _profile_job(viz_id: str, tier: str, profile: bool) -> dict:
+    return {'profile': {'dir': str(profile_dir(viz_id)), 'name': tier}} if profile else {}
+
+
+def drain():
+    """Wait for background TTS and render slices to finish, then stop them"""
+    for executor in (_tts_executor, _slice_executor):
+        executor.shutdown(wait=True)
+
+
+def hls_dir(viz_id: str, tier: str) -> Path:
+    """Directory holding the HLS playlist and segments of a video at a tier"""
+    return HLS_DIR / viz_id / tier
+
+
+def hls_url(viz_id: str, tier: str) -> str:
+    """URL of the HLS playlist of a video at a tier, which lists segments as they are written"""
+    return f"/video/{viz_id}/hls/{tier}/{HLS_PLAYLIST}"
+
+
+def _drop_hls(output_dir: Path):
+    # The MP4 is still served; the playlist URL answers 404
+    FAILURES.inc(cause='hls_failed')
+    shutil.rmtree(output_dir, ignore_errors=True)
+
+
+def _package_hls(public_file: Path, output_dir: Path):
+    """Package a video published without HLS, e.g. one served from the video cache"""
+    try:
+        package_hls(public_file, output_dir)
+    except Exception as e:
+        details = getattr(e, 'stderr', None) or str(e)
+        print(f"[API] HLS packaging of {public_file} failed: {details.strip()[-500:]}")
+        _drop_hls(output_dir)
+
+
+def _reset_hls(viz_id: str, tier: str) -> Path:
+    """Clear out the HLS directory of an earlier render, for the final pass to write into"""
+    output_dir = hls_dir(viz_id, tier)
+    shutil.rmtree(output_dir, ignore_errors=True)
+    return output_dir
+
+
+def _video_response(viz_id: str, public_file: Path, hls: bool = False, profile: bool = False,
+                    **fields) -> dict:
+    if hls:
+        output_dir = hls_dir(viz_id, fields['tier'])
+        if not hls_complete(output_dir):
+            shutil.rmtree(output_dir, ignore_errors=True)
+            _package_hls(public_file, output_dir)
+        if hls_complete(output_dir):
+            fields['hls_url'] = hls_url(viz_id, fields['tier'])
+    if profile:
+        fields['profile_url'] = f"/jobs/{viz_id}/profile"
+    return {
+        "success": True,
+        "video_id": viz_id,
+        "video_url": f"/video/{viz_id}",
+        "file_path": str(public_file),
+        **fields
+    }
+
+
+def validate_dynamic(code: str, timeout: int = VALIDATE_TIMEOUT) -> dict:
+    """
+    Run AI-generated Manim code without rasterizing frames or encoding video
+
+    Catches the runtime errors a render would hit (bad MathTex, wrong keyword
+    arguments, mobject API misuse) in a fraction of the render time.
+
+    Args:
+        code: Python code containing a GeneratedScene class
+        timeout: Seconds construct() may take
+
+    Returns:
+        dict: 'valid', the estimated 'duration' in seconds and the number of 'animations'
+
+    Raises:
+        PipelineError: The code failed (status 422, with the 'line' when known)
+    """
+    check_code(code)
+    result = _run_on_pool({'kind': 'validate', 'code': code}, timeout,
+                          failure="Generated code failed validation", failure_status=422)
+    return {"valid": True, **result['validation'],
+            "validate_seconds": round(result['render_seconds'], 3)}
+
+
+@_tracked
+def render_dynamic(viz_id: str, code: str, narration: str = '', on_stage=_noop_stage,
+                   timeout: int = RENDER_TIMEOUT, tier: str = DEFAULT_TIER,
+                   on_progress=None, parallel: bool = False, hls: bool = False,
+                   profile: bool = False) -> dict:
+    """
+    Render AI-generated Manim code, with optional TTS narration
+
+    Args:
+        viz_id: Unique ID of the visualization, used for the published file name
+        code: Python code containing a GeneratedScene class
+        narration: Optional text for voice narration
+        on_stage: Called with 'rendering', 'tts' (if the render finished before the
+                  narration) and 'muxing' (when narrated or packaged as HLS) as the
+                  pipeline advances
+        timeout: Seconds the render may take
+        tier: Key of RENDER_TIERS to render at; a video already published under
+              viz_id (e.g. a preview) is replaced in place
+        on_progress: Called with an event dict after each animation is rendered
+        parallel: Render slices of the scene on several workers at once, for long
+                  scenes (see _render_parallel); profiled renders are always serial
+        hls: Also write the video as HLS, segment by segment while the final MP4
+             is muxed, adding 'hls_url' to the response
+        profile: Render under the profiler, bypassing the video cache, and add
+                 'profile_url' to the response (see profiling.ProfileCapture)
+
+    Returns:
+        dict: Response describing the published video
+
+    Raises:
+        PipelineError: The scene could not be rendered
+    """
+    output_file = f"scene_{viz_id}"
+    public_file = MEDIA_DIR / f"{viz_id}.mp4"
+    render_config = RENDER_TIERS[tier]
+
+    # Fail in milliseconds on code that cannot render, before TTS or a worker is used
+    check_code(code)
+
+    # Serve a previously rendered copy of the same scene without rendering or TTS,
+    # unless the render itself is what is being asked for
+    key = cache_key('dynamic', code, render_config, narration)
+    cached = None if profile else get_video_cache().fetch(key, public_file)
+    if cached is not None:
+        print(f"[API] Video cache hit for {viz_id}")
+        return _video_response(viz_id, public_file, hls, tier=tier,
+                               has_audio=cached['has_audio'], render_seconds=0.0)
+    profile = _should_profile(profile)
+
+    render_dir = RENDERS_DIR / viz_id
+    render_dir.mkdir(parents=True, exist_ok=True)
+
+    # Synthesize the narration while the scene renders, the two are independent
+    audio_path = render_dir / "narration.audio"
+    tts_future = None
+    if narration:
+        print(f"[API] Generating TTS for narration...")
+        tts_future = _tts_executor.submit(generate_tts, narration, audio_path)
+
+    on_stage('rendering')
+    try:
+        video_path, render_seconds = (_render_parallel if parallel and not profile else _render)({
+            'kind': 'dynamic',
+            'code': code,
+            'output_file': output_file,
+            'output_dir': str(render_dir),
+            'render_config': render_config,
+            **_profile_job(viz_id, tier, profile),
+        }, timeout, on_progress)
+    except PipelineError:
+        if tts_future is not None:
+            # Nothing to narrate, drop the job directory once TTS finishes
+            tts_future.add_done_callback(lambda _: shutil.rmtree(render_dir, ignore_errors=True))
+        else:
+            shutil.rmtree(render_dir, ignore_errors=True)
+        raise
+
+    # Combine video with the narration once both are ready
+    final_video_path = video_path
+    hls_output = _reset_hls(viz_id, tier) if hls else None
+    if tts_future is not None:
+        if not tts_future.done():
+            on_stage('tts')
+
+        if tts_future.result():
+            # Combine video with audio, writing the HLS segments in the same pass
+            on_stage('muxing')
+            combined_path = render_dir / "with_audio.mp4"
+            with STAGE_SECONDS.time(stage='mux'):
+                muxed = combine_video_audio(video_path, audio_path, combined_path,
+                                            hls_dir=hls_output)
+            if muxed:
+                final_video_path = combined_path
+                print(f"[API] Successfully added voice narration to video")
+            else:
+                FAILURES.inc(cause='mux_failed')
+                print(f"[API] Failed to combine video and audio, using silent video")
+        else:
+            FAILURES.inc(cause='tts_failed')
+            print(f"[API] Failed to generate TTS, using silent video")
+
+    # Publish the final video, writing its HLS unless the mux already did,
+    # and drop the partial movie files and audio
+    has_audio = final_video_path != video_path
+    if hls_output is not None and hls_complete(hls_output):
+        hls_output = None
+    elif hls_output is not None and not has_audio:
+        on_stage('muxing')
+    _publish(final_video_path, public_file, hls_output)
+    shutil.rmtree(render_dir, ignore_errors=True)
+
+    # A silent fallback for a narrated scene is not worth keeping, TTS may work next time
+    if has_audio or not narration:
+        get_video_cache().store(key, public_file, {"has_audio": has_audio})
+
+    return _video_response(viz_id, public_file, hls, profile, tier=tier, has_audio=has_audio,
+                           render_seconds=round(render_seconds, 3))
+
+
+@_tracked
+def render_template(viz_id: str, problem_data: dict, on_stage=_noop_stage,
+                    timeout: int = RENDER_TIMEOUT, tier: str = DEFAULT_TIER,
+                    on_progress=None, hls: bool = False, profile: bool = False) -> dict:
+    """
+    Render one of the MathProblemScene templates from problem data
+
+    Args:
+        viz_id: Unique ID of the visualization, used for the published file name
+        problem_data: Problem data or spec understood by scene_spec.parse_spec
+        on_stage: Called with 'rendering' when the render starts, and 'muxing' when
+                  the video is written as HLS
+        timeout: Seconds the render may take
+        tier: Key of RENDER_TIERS to render at
+        on_progress: Called with an event dict after each animation is rendered
+        hls: Also write the video as HLS while it is published, adding 'hls_url'
+             to the response
+        profile: Render under the profiler, bypassing the video cache, and add
+                 'profile_url' to the response
+
+    Returns:
+        dict: Response describing the published video
+
+    Raises:
+        PipelineError: The spec is malformed or the scene could not be rendered
+    """
+    spec = check_spec(problem_data)
+    output_file = f"scene_{viz_id}"
+    public_file = MEDIA_DIR / f"{viz_id}.mp4"
+
+    render_config = RENDER_TIERS[tier]
+
+    # Keyed on the normalized spec, so spelling out a default still hits the cache
+    key = cache_key('template', spec, render_config)
+    if not profile and get_video_cache().fetch(key, public_file) is not None:
+        print(f"[API] Video cache hit for {viz_id}")
+        return _video_response(viz_id, public_file, hls, tier=tier, render_seconds=0.0)
+    profile = _should_profile(profile)
+
+    render_dir = RENDERS_DIR / viz_id
+
+    on_stage('rendering')
+    try:
+        video_path, render_seconds = _render({
+            'kind': 'template',
+            'problem_data': spec,
+            'output_file': output_file,
+            'output_dir': str(render_dir),
+            'render_config': render_config,
+            **_profile_job(viz_id, tier, profile),
+        }, timeout, on_progress)
+
+        # Publish with consistent naming
+        hls_output = None
+        if hls:
+            on_stage('muxing')
+            hls_output = _reset_hls(viz_id, tier)
+        _publish(video_path, public_file, hls_output)
+    finally:
+        shutil.rmtree(render_dir, ignore_errors=True)
+
+    get_video_cache().store(key, public_file)
+
+    return _video_response(viz_id, public_file, hls, profile, tier=tier,
+                           render_seconds=round(render_seconds, 3))
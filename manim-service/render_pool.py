@@ -0,0 +1,232 @@
+"""
+Pool of warm Manim render workers
+Each worker is a separate process that imports Manim once and renders many jobs,
+so a crashing scene only takes down its own worker, never the API
+"""
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+
+from metrics import STAGE_SECONDS
+from render_worker import worker_main
+
+SERVICE_DIR = Path(__file__).parent.resolve()
+VENV_PYTHON = SERVICE_DIR / 'venv' / 'bin' / 'python'
+
+# Configuration
+POOL_SIZE = int(os.getenv('RENDER_WORKERS', str(max(1, (os.cpu_count() or 2) // 2))))
+MAX_JOBS_PER_WORKER = int(os.getenv('RENDER_WORKER_MAX_JOBS', '50'))
+MAX_WORKER_RSS_MB = float(os.getenv('RENDER_WORKER_MAX_RSS_MB', '2048'))
+WORKER_START_TIMEOUT = 120
+
+
+class RenderTimeout(Exception):
+    """Raised when a render takes longer than its timeout"""
+
+
+class WorkerCrashed(Exception):
+    """Raised when a worker process dies in the middle of a job"""
+
+
+class _Worker:
+    """A single render worker process and the parent end of its pipe"""
+
+    def __init__(self, ctx):
+        start = time.time()
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.jobs_done = 0
+        self.max_rss_mb = 0.0
+
+        if not self.conn.poll(WORKER_START_TIMEOUT):
+            self.kill()
+            raise WorkerCrashed(f"Render worker did not start within {WORKER_START_TIMEOUT}s")
+        try:
+            ready = self.conn.recv()
+        except EOFError:
+            self.process.join(1)
+            raise WorkerCrashed(
+                f"Render worker exited during startup (exit code {self.process.exitcode})")
+        self.known_names = ready.get('known_names')
+        STAGE_SECONDS.observe(time.time() - start, stage='worker_spawn')
+        STAGE_SECONDS.observe(ready['import_seconds'], stage='worker_import')
+        print(f"[POOL] Worker {ready['pid']} ready (imports took {ready['import_seconds']:.2f}s)")
+
+    def is_alive(self) -> bool:
+        return self.process.is_alive()
+
+    def stop(self):
+        """Ask the worker to exit after its current job, then make sure it is gone"""
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(5)
+        if self.process.is_alive():
+            self.kill()
+        self.conn.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join(5)
+        self.conn.close()
+
+
+class RenderPool:
+    """
+    Fixed number of worker slots, each holding a warm worker process
+
+    Workers are started on first use (or by start()), and are replaced after
+    MAX_JOBS_PER_WORKER jobs, once their peak RSS passes MAX_WORKER_RSS_MB,
+    or when they crash or time out.
+    """
+
+    def __init__(self, size: int = POOL_SIZE):
+        self.size = size
+        self._ctx = multiprocessing.get_context('spawn')
+        # Render with the service's virtual environment, as the subprocess path did
+        if VENV_PYTHON.exists():
+            self._ctx.set_executable(str(VENV_PYTHON))
+
+        # LIFO so the most recently used (warmest) worker is handed out first
+        self._slots = queue.LifoQueue()
+        for _ in range(size):
+            self._slots.put(None)
+
+        # Names generated code may use, reported by the first worker to start
+        self.known_names = None
+
+    def start(self):
+        """Start every worker in the background so the first requests are warm"""
+        def warm():
+            # Take every idle slot first: the queue is LIFO, so a worker put back
+            # would be handed out again instead of the next empty slot
+            slots = []
+            while True:
+                try:
+                    slots.append(self._slots.get_nowait())
+                except queue.Empty:
+                    break
+            for worker in slots:
+                if worker is not None:
+                    self._slots.put(worker)
+
+            # Hand each worker out as soon as it is ready, not once all of them are
+            for _ in range(slots.count(None)):
+                worker = None
+                try:
+                    worker = self._spawn()
+                except Exception as e:
+                    print(f"[POOL] Failed to start render worker: {e}")
+                self._slots.put(worker)
+
+        threading.Thread(target=warm, name='render-pool-warmup', daemon=True).start()
+
+    def render(self, job: dict, timeout: float = None, on_event=None) -> dict:
+        """
+        Render a job on the next free worker
+
+        Args:
+            job: Job dictionary understood by render_worker.run_job
+            timeout: Seconds to wait for the render before killing the worker
+            on_event: Called with each progress event the worker sends while rendering
+
+        Returns:
+            dict: Result with 'ok', and 'error'/'details' when the scene failed
+
+        Raises:
+            RenderTimeout: The render did not finish within timeout
+            WorkerCrashed: The worker process died while rendering
+        """
+        worker = self._slots.get()
+        try:
+            if worker is not None and not worker.is_alive():
+                self._retire(worker, kill=True)
+                worker = None
+            if worker is None:
+                worker = self._spawn()
+
+            try:
+                worker.conn.send(job)
+            except (BrokenPipeError, OSError):
+                self._retire(worker, kill=True)
+                worker = None
+                raise WorkerCrashed("Render worker pipe closed before the job was sent")
+
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while True:
+                remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+                if not worker.conn.poll(remaining):
+                    print(f"[POOL] Render timed out after {timeout}s, "
+                          f"killing worker {worker.process.pid}")
+                    self._retire(worker, kill=True)
+                    worker = None
+                    raise RenderTimeout(f"Render did not finish within {timeout}s")
+
+                try:
+                    reply = worker.conn.recv()
+                except EOFError:
+                    worker.process.join(1)
+                    exitcode = worker.process.exitcode
+                    self._retire(worker, kill=True)
+                    worker = None
+                    raise WorkerCrashed(f"Render worker exited unexpectedly (exit code {exitcode})")
+
+                if reply.get('type') != 'progress':
+                    break
+                if on_event is not None:
+                    try:
+                        on_event(reply)
+                    except Exception as e:
+                        print(f"[POOL] Progress callback failed: {e}")
+
+            worker.jobs_done += 1
+            worker.max_rss_mb = reply.get('max_rss_mb', 0.0)
+            if worker.jobs_done >= MAX_JOBS_PER_WORKER or worker.max_rss_mb >= MAX_WORKER_RSS_MB:
+                print(f"[POOL] Recycling worker {worker.process.pid} after {worker.jobs_done} jobs "
+                      f"({worker.max_rss_mb:.0f} MB peak RSS)")
+                self._retire(worker)
+                worker = None
+
+            return reply
+        finally:
+            self._slots.put(worker)
+
+    def shutdown(self):
+        """Stop every worker, waiting for jobs that are still rendering to finish"""
+        for _ in range(self.size):
+            worker = self._slots.get()
+            if worker is not None:
+                self._retire(worker)
+        for _ in range(self.size):
+            self._slots.put(None)
+
+    def _spawn(self) -> _Worker:
+        worker = _Worker(self._ctx)
+        if self.known_names is None:
+            self.known_names = worker.known_names
+        return worker
+
+    def _retire(self, worker: _Worker, kill: bool = False):
+        if kill:
+            worker.kill()
+        else:
+            worker.stop()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_render_pool() -> RenderPool:
+    """Return the process-wide render pool, creating it on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = RenderPool()
+        return _pool
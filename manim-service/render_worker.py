@@ -0,0 +1,193 @@
+"""
+Long-lived render worker for the Manim service
+Imports Manim once, then renders jobs received from the API over a pipe
+"""
+import contextlib
+import os
+import resource
+import signal
+import sys
+import time
+import traceback
+from pathlib import Path
+
+SERVICE_DIR = Path(__file__).parent.resolve()
+
+# Called with a progress event after every animation of the job being rendered
+_on_progress = None
+
+
+def max_rss_mb() -> float:
+    """Peak resident set size of this process in megabytes"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux
+    if sys.platform == 'darwin':
+        return rss / (1024 * 1024)
+    return rss / 1024
+
+
+def install_progress_hook():
+    """
+    Report every finished Scene.play (and Scene.wait, which plays a Wait animation)
+
+    Events carry the animation index, the frames it rendered (0 when it was
+    skipped or served from Manim's partial movie cache or the shared segment
+    store), its run time and the seconds since the job started.
+    """
+    from manim import config
+    from manim.renderer.cairo_renderer import CairoRenderer
+
+    original_play = CairoRenderer.play
+
+    def play(renderer, scene, *args, **kwargs):
+        original_play(renderer, scene, *args, **kwargs)
+        if _on_progress is not None:
+            # Set by play itself when the segment was already cached
+            skipped = renderer.skip_animations
+            run_time = float(scene.duration)
+            _on_progress({
+                'event': 'animation',
+                'index': renderer.num_plays - 1,
+                'frames': 0 if skipped else round(run_time * config.frame_rate),
+                'run_time': round(run_time, 3),
+                'scene_time': round(renderer.time, 3),
+            })
+
+    CairoRenderer.play = play
+
+
+def run_job(job: dict):
+    """
+    Render a single job inside this worker
+
+    Args:
+        job: Dictionary with a 'kind' of 'dynamic' (AI-generated code) or
+             'template' (problem data for MathProblemScene), plus 'output_file',
+             the per-job 'output_dir' the video is written to and an optional
+             'render_config' with the resolution and frame rate
+
+    Returns:
+        Absolute path of the rendered video, or None if no video was written
+    """
+    from manim import config, tempconfig
+
+    # Scene code is free to touch the global Manim config, so every job runs
+    # against a fresh copy that is restored afterwards
+    with tempconfig({}):
+        # Write straight into the job's own directory instead of the shared media tree
+        config.video_dir = job['output_dir']
+
+        if job['kind'] == 'dynamic':
+            from dynamic_scene_generator import execute_generated_code
+            video_path = execute_generated_code(job['code'], job['output_file'],
+                                                job.get('render_config'))
+        elif job['kind'] == 'template':
+            from scene_generator import generate_scene
+            video_path = generate_scene(job['problem_data'], job['output_file'],
+                                        render_config=job.get('render_config'))
+        else:
+            raise ValueError(f"Unknown render job kind: {job['kind']}")
+
+    return str(Path(video_path).resolve()) if video_path else None
+
+
+def run_validation(job: dict) -> dict:
+    """
+    Execute a 'validate' job's code without rendering frames
+
+    Returns:
+        dict: The scene's estimated duration and animation count
+    """
+    from manim import tempconfig
+    from dynamic_scene_generator import validate_generated_code
+
+    with tempconfig({}):
+        return validate_generated_code(job['code'])
+
+
+def worker_main(conn):
+    """
+    Worker process entry point
+
+    Sends a 'ready' message once Manim is imported, then answers every job
+    with a result dictionary until it receives None or the pipe closes. A job
+    with a 'profile' dict ('dir' and 'name') is run under profiling.ProfileCapture.
+    """
+    # A server shutdown signals the whole process group; RenderPool.shutdown ends
+    # workers once in-flight renders finish, so only SIGINT keeps its default
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    os.chdir(SERVICE_DIR)
+    if str(SERVICE_DIR) not in sys.path:
+        sys.path.insert(0, str(SERVICE_DIR))
+    from code_preflight import PreflightError, generated_line
+    import profiling
+    import segment_store
+    import svg_cache
+    import worker_counters
+
+    # Pay the import cost of manim, numpy, cairo and pango once per worker
+    start = time.time()
+    from manim import config
+    import dynamic_scene_generator
+    import scene_generator  # noqa: F401
+    dynamic_scene_generator._base_namespace()
+    config.progress_bar = "none"
+    install_progress_hook()
+    profiling.install()
+    svg_cache.install()
+    segment_store.install()
+
+    # The API uses the names to pre-flight generated code without importing Manim itself
+    conn.send({
+        'type': 'ready',
+        'pid': os.getpid(),
+        'import_seconds': time.time() - start,
+        'known_names': dynamic_scene_generator.known_names(),
+    })
+
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+
+        start = time.time()
+
+        def send_progress(event, start=start):
+            conn.send({'type': 'progress', 'elapsed': round(time.time() - start, 3), **event})
+
+        global _on_progress
+        _on_progress = send_progress
+        # A failed render is profiled too, up to the point it failed
+        capture = (profiling.ProfileCapture(job['profile']['dir'], job['profile']['name'])
+                   if job.get('profile') else contextlib.nullcontext())
+        try:
+            with capture:
+                if job['kind'] == 'validate':
+                    reply = {'ok': True, 'validation': run_validation(job)}
+                else:
+                    reply = {'ok': True, 'video_path': run_job(job)}
+        except (Exception, SystemExit) as e:
+            reply = {
+                'ok': False,
+                'error': str(e) or e.__class__.__name__,
+                'details': traceback.format_exc(),
+                'line': generated_line(e),
+            }
+            if isinstance(e, PreflightError):
+                reply['preflight'] = e.to_dict()
+
+        _on_progress = None
+
+        reply['type'] = 'result'
+        reply['render_seconds'] = time.time() - start
+        reply['max_rss_mb'] = max_rss_mb()
+        reply['counters'] = worker_counters.take_counts()
+        reply['timings'] = worker_counters.take_timings()
+        if job.get('profile'):
+            reply['profile'] = capture.breakdown
+        conn.send(reply)
+
+    conn.close()
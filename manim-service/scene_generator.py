@@ -3,96 +3,155 @@ Manim Scene Generator for QED
 Generates mathematical visualizations based on problem descriptions
 """
 from manim import *
+from expression_compiler import compile_expression, continuous_ranges
+from scene_spec import parse_spec
+import functools
 import json
 import sys
 import os
 
 
+# Template objects are built once per render worker and copied into each scene
+TEMPLATE_CACHE_SIZE = 16
+
+
+def _tick_step(span: float) -> float:
+    """Smallest of 1, 2, 5, 10, 20, 50... that puts at most 20 ticks on an axis"""
+    step = 1
+    while span / step > 20:
+        for factor in (2, 2.5, 2):
+            step *= factor
+            if span / step <= 20:
+                break
+    return step
+
+
+@functools.lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def _axes_template(x_range: tuple, y_range: tuple, numbered: bool) -> Axes:
+    x_step, y_step = _tick_step(x_range[1] - x_range[0]), _tick_step(y_range[1] - y_range[0])
+    x_axis_config, y_axis_config = {}, {}
+    if numbered:
+        # Every other tick is numbered, and each number is its own MathTex
+        x_axis_config["numbers_to_include"] = np.arange(x_range[0], x_range[1] + x_step,
+                                                        2 * x_step)
+        y_axis_config["numbers_to_include"] = np.arange(y_range[0], y_range[1] + y_step,
+                                                        2 * y_step)
+    return Axes(
+        x_range=[x_range[0], x_range[1], x_step],
+        y_range=[y_range[0], y_range[1], y_step],
+        x_length=7,
+        y_length=7,
+        axis_config={"include_tip": True},
+        x_axis_config=x_axis_config,
+        y_axis_config=y_axis_config,
+    )
+
+
+@functools.lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def _number_line_template(start: float, end: float) -> NumberLine:
+    return NumberLine(
+        x_range=[start, end, 1],
+        length=10,
+        include_numbers=True,
+        label_direction=DOWN,
+    )
+
+
+def _color(name: str):
+    return globals()[name.upper()]
+
+
 class MathProblemScene(Scene):
-    """Base class for mathematical problem visualizations"""
+    """
+    Base class for mathematical problem visualizations
+
+    problem_data is validated and normalized by scene_spec.parse_spec, which
+    raises SpecError before anything is built.
+    """
 
     def __init__(self, problem_data=None, **kwargs):
+        self.spec = parse_spec(problem_data or {})
         super().__init__(**kwargs)
         self.problem_data = problem_data or {}
 
     def construct(self):
-        # Extract problem details
-        problem_type = self.problem_data.get('type', 'generic')
-        content = self.problem_data.get('content', '')
-
         # Route to appropriate visualization method
-        if problem_type == 'equation':
-            self.visualize_equation()
-        elif problem_type == 'graph':
-            self.visualize_graph()
-        elif problem_type == 'geometry':
-            self.visualize_geometry()
-        elif problem_type == 'number_line':
-            self.visualize_number_line()
-        elif problem_type == 'function':
-            self.visualize_function()
-        else:
-            self.visualize_generic()
+        getattr(self, f"visualize_{self.spec['type']}")()
+
+    def axes(self, x_range, y_range, numbered=False) -> Axes:
+        """A copy of the cached axes for these ranges"""
+        return _axes_template(tuple(x_range), tuple(y_range), numbered).copy()
+
+    def plot(self, axes: Axes, expression: str, color):
+        """
+        Plot an expression on axes, one curve per piece between discontinuities
+
+        Returns:
+            tuple: (VGroup of the pieces, x where the last piece ends), or
+                   (None, None) when no part of the graph is on the axes
+        """
+        func = compile_expression(expression)
+        ranges = continuous_ranges(func, axes.x_range, axes.y_range)
+        if not ranges:
+            return None, None
+        pieces = [axes.plot(func, x_range=piece, use_vectorized=True, color=color)
+                  for piece in ranges]
+        return VGroup(*pieces), ranges[-1][1]
 
     def visualize_equation(self):
         """Visualize an equation"""
-        equation_text = self.problem_data.get('equation', 'x + y = z')
-        steps = self.problem_data.get('steps', [])
+        spec = self.spec
 
         # Title
-        title = Text("Solving the Equation", font_size=36)
+        title = Text(spec['title'] or "Solving the Equation", font_size=36)
         title.to_edge(UP)
         self.play(Write(title))
         self.wait(0.5)
 
         # Display equation
-        equation = MathTex(equation_text, font_size=48)
+        equation = MathTex(spec['equation'], font_size=48)
         self.play(Write(equation))
         self.wait(1)
 
-        # Animate steps if provided
-        if steps:
-            for i, step in enumerate(steps):
-                new_equation = MathTex(step, font_size=48)
-                self.play(Transform(equation, new_equation))
-                self.wait(1)
+        # Animate steps, with their notes under the equation
+        note = None
+        for step in spec['steps']:
+            new_equation = MathTex(step['tex'], font_size=48)
+            animations = [Transform(equation, new_equation)]
+            if note is not None:
+                animations.append(FadeOut(note))
+                note = None
+            if step['note']:
+                note = Text(step['note'], font_size=24).next_to(new_equation, DOWN, buff=0.5)
+                animations.append(FadeIn(note))
+            self.play(*animations)
+            self.wait(1)
 
         self.wait(1)
 
     def visualize_graph(self):
-        """Visualize a graph or plot"""
-        # Create axes
-        axes = Axes(
-            x_range=[-10, 10, 1],
-            y_range=[-10, 10, 1],
-            x_length=7,
-            y_length=7,
-            axis_config={"include_tip": True, "numbers_to_include": np.arange(-10, 11, 2)},
-        )
-
-        # Get function from problem data
-        func_expr = self.problem_data.get('function', 'x**2')
-
-        # Create graph
-        try:
-            graph = axes.plot(lambda x: eval(func_expr.replace('x', str(x))), color=BLUE)
-            graph_label = axes.get_graph_label(graph, label=f'y = {func_expr}')
-
-            # Animate
-            self.play(Create(axes))
-            self.wait(0.5)
+        """Visualize one or more graphs on shared axes"""
+        spec = self.spec
+        axes = self.axes(spec['x_range'], spec['y_range'], numbered=True)
+
+        self.play(Create(axes))
+        self.wait(0.5)
+
+        for i, graph_spec in enumerate(spec['functions']):
+            graph, label_x = self.plot(axes, graph_spec['function'], _color(graph_spec['color']))
+            if graph is None:
+                continue
+            # Alternate label sides so labels of neighbouring graphs do not overlap
+            graph_label = axes.get_graph_label(graph[-1], label=graph_spec['label'], x_val=label_x,
+                                               direction=UR if i % 2 == 0 else DR)
             self.play(Create(graph), Write(graph_label))
-            self.wait(2)
-        except:
-            # Fallback to simple parabola
-            graph = axes.plot(lambda x: x**2, color=BLUE)
-            graph_label = axes.get_graph_label(graph, label='y = x^2')
-            self.play(Create(axes), Create(graph), Write(graph_label))
-            self.wait(2)
+            self.wait(1)
+
+        self.wait(1)
 
     def visualize_geometry(self):
         """Visualize geometric shapes and concepts"""
-        shapes_data = self.problem_data.get('shapes', [])
+        shapes_data = self.spec['shapes']
 
         if not shapes_data:
             # Default: show basic geometric shapes
@@ -102,44 +161,45 @@ class MathProblemScene(Scene):
 
             self.play(Create(circle), Create(square), Create(triangle))
             self.wait(2)
-        else:
-            # Create shapes from data
-            for shape_data in shapes_data:
-                shape_type = shape_data.get('type', 'circle')
-                if shape_type == 'circle':
-                    shape = Circle(radius=shape_data.get('radius', 1))
-                elif shape_type == 'square':
-                    shape = Square(side_length=shape_data.get('side', 2))
-                elif shape_type == 'triangle':
-                    shape = Triangle()
-
-                self.play(Create(shape))
-                self.wait(0.5)
+            return
+
+        # Create shapes from data
+        for shape_data in shapes_data:
+            color = _color(shape_data['color'])
+            shape_type = shape_data['type']
+            if shape_type == 'circle':
+                shape = Circle(radius=shape_data['radius'], color=color)
+            elif shape_type == 'square':
+                shape = Square(side_length=shape_data['side'], color=color)
+            elif shape_type == 'rectangle':
+                shape = Rectangle(width=shape_data['width'], height=shape_data['height'],
+                                  color=color)
+            else:
+                shape = Triangle(color=color).scale_to_fit_width(shape_data['side'])
+            if shape_data['position'] is not None:
+                shape.move_to([*shape_data['position'], 0])
+
+            animations = [Create(shape)]
+            if shape_data['label']:
+                label = Text(shape_data['label'], font_size=24).next_to(shape, DOWN)
+                animations.append(Write(label))
+            self.play(*animations)
+            self.wait(0.5)
 
     def visualize_number_line(self):
         """Visualize concepts on a number line"""
-        start = self.problem_data.get('start', -5)
-        end = self.problem_data.get('end', 5)
-        points = self.problem_data.get('points', [])
+        spec = self.spec
 
         # Create number line
-        number_line = NumberLine(
-            x_range=[start, end, 1],
-            length=10,
-            include_numbers=True,
-            label_direction=DOWN,
-        )
+        number_line = _number_line_template(spec['start'], spec['end']).copy()
 
         self.play(Create(number_line))
         self.wait(0.5)
 
         # Add points
-        for point_data in points:
-            value = point_data.get('value', 0)
-            label = point_data.get('label', str(value))
-
-            dot = Dot(number_line.n2p(value), color=RED)
-            text = Text(label, font_size=24).next_to(dot, UP)
+        for point_data in spec['points']:
+            dot = Dot(number_line.n2p(point_data['value']), color=_color(point_data['color']))
+            text = Text(point_data['label'], font_size=24).next_to(dot, UP)
 
             self.play(Create(dot), Write(text))
             self.wait(0.5)
@@ -147,34 +207,41 @@ class MathProblemScene(Scene):
         self.wait(1)
 
     def visualize_function(self):
-        """Visualize function transformations"""
-        axes = Axes(
-            x_range=[-5, 5, 1],
-            y_range=[-5, 5, 1],
-            x_length=7,
-            y_length=7,
-        )
-
+        """Visualize a function and its transformations"""
+        spec = self.spec
+        axes = self.axes(spec['x_range'], spec['y_range'])
         labels = axes.get_axis_labels(x_label="x", y_label="y")
 
         # Base function
-        func1 = axes.plot(lambda x: x**2, color=BLUE)
-        func1_label = MathTex("f(x) = x^2", color=BLUE).to_edge(UP)
+        func, _ = self.plot(axes, spec['function'], BLUE)
+        func_label = MathTex(f"f(x) = {spec['function']}", color=BLUE).to_edge(UP)
 
         self.play(Create(axes), Write(labels))
-        self.play(Create(func1), Write(func1_label))
+        if func is not None:
+            self.play(Create(func), Write(func_label))
         self.wait(2)
 
+        # Morph into each transformation in turn
+        for expression in spec['transformations']:
+            new_func, _ = self.plot(axes, expression, YELLOW)
+            new_label = MathTex(f"g(x) = {expression}", color=YELLOW).to_edge(UP)
+            if func is None or new_func is None:
+                continue
+            self.play(ReplacementTransform(func, new_func),
+                      ReplacementTransform(func_label, new_label))
+            func, func_label = new_func, new_label
+            self.wait(1.5)
+
     def visualize_generic(self):
         """Generic visualization with text"""
-        content = self.problem_data.get('content', 'Problem Visualization')
+        spec = self.spec
 
         # Title
-        title = Text("Problem Breakdown", font_size=40)
+        title = Text(spec['title'] or "Problem Breakdown", font_size=40)
         title.to_edge(UP)
 
         # Content
-        content_text = Text(content[:200], font_size=24).scale(0.8)
+        content_text = Text(spec['content'] or 'Problem Visualization', font_size=24).scale(0.8)
         content_text.next_to(title, DOWN, buff=0.5)
 
         self.play(Write(title))
@@ -183,21 +250,31 @@ class MathProblemScene(Scene):
         self.wait(2)
 
 
-def generate_scene(problem_data, output_file):
+def generate_scene(problem_data, output_file, media_dir="./media", render_config=None):
     """
     Generate a Manim scene from problem data
 
     Args:
         problem_data: Dictionary containing problem information
         output_file: Output filename (without extension)
+        media_dir: Manim media directory the video is written under
+        render_config: Optional pixel_width, pixel_height and frame_rate overriding
+                       the default 1280x720 at 30fps
+
+    Returns:
+        Path of the rendered video
     """
     config.pixel_height = 720
     config.pixel_width = 1280
     config.frame_rate = 30
+    if render_config:
+        config.update(render_config)
     config.output_file = output_file
+    config.media_dir = media_dir
 
     scene = MathProblemScene(problem_data=problem_data)
     scene.render()
+    return scene.renderer.file_writer.movie_file_path
 
 
 if __name__ == "__main__":
@@ -212,9 +289,6 @@ if __name__ == "__main__":
     # Generate unique output filename
     output_file = problem_data.get('output_file', 'scene')
 
-    # Set output directory
-    config.media_dir = "./media"
-
     # Generate the scene
     generate_scene(problem_data, output_file)
 
@@ -0,0 +1,275 @@
+"""
+Declarative scene specs for the /generate templates
+Validates problem data and normalizes it, with every default filled in, before it is rendered
+"""
+from expression_compiler import ExpressionError, compile_expression
+
+SPEC_TYPES = ('equation', 'graph', 'geometry', 'number_line', 'function', 'generic')
+SHAPE_TYPES = ('circle', 'square', 'rectangle', 'triangle')
+COLORS = ('blue', 'red', 'green', 'yellow', 'orange', 'purple', 'pink', 'teal', 'white', 'gray')
+
+# Limits that keep a spec renderable in seconds
+MAX_TEXT = 200
+MAX_ITEMS = 12
+MAX_STEPS = 20
+MAX_SPAN = 1000
+
+# Colors given to graphs and shapes that do not set one, in order
+_DEFAULT_COLORS = ('blue', 'red', 'green', 'yellow', 'purple', 'orange')
+
+
+class SpecError(ValueError):
+    """
+    Problem data that does not describe a renderable scene
+
+    Args:
+        path: Location of the offending value, e.g. "shapes[2].radius"
+        message: What is wrong with it
+    """
+
+    def __init__(self, path: str, message: str):
+        super().__init__(f"{path}: {message}" if path else message)
+        self.path = path
+        self.message = message
+
+    def to_dict(self) -> dict:
+        return {"kind": "invalid_spec", "path": self.path, "message": self.message}
+
+
+def parse_spec(data) -> dict:
+    """
+    Validate problem data and return its normalized spec
+
+    Accepts both the original problem data ("function": "x**2", "steps" as
+    strings) and normalized specs, so parsing a spec again returns it unchanged.
+
+    Args:
+        data: Problem data, e.g. {"type": "graph", "function": "x**2"}
+
+    Returns:
+        dict: Spec with only known keys and every default filled in
+
+    Raises:
+        SpecError: The data is malformed or out of limits
+    """
+    if not isinstance(data, dict):
+        raise SpecError('', "Problem data must be an object")
+    spec_type = data.get('type', 'generic')
+    if spec_type not in SPEC_TYPES:
+        raise SpecError('type', f"Unknown type '{spec_type}', expected one of "
+                                f"{', '.join(SPEC_TYPES)}")
+
+    spec = {
+        'type': spec_type,
+        'title': _text(data, 'title', None),
+        # Free-form problem text, only shown by the generic template and cut to fit
+        'content': _text(data, 'content', '', limit=None)[:MAX_TEXT],
+    }
+    spec.update(_PARSERS[spec_type](data))
+    return spec
+
+
+# Per-type parsers
+
+def _parse_equation(data: dict) -> dict:
+    steps = []
+    for i, step in enumerate(_items(data, 'steps', MAX_STEPS)):
+        path = f'steps[{i}]'
+        if isinstance(step, str):
+            step = {'tex': step}
+        if not isinstance(step, dict):
+            raise SpecError(path, "Expected a TeX string or an object with 'tex'")
+        steps.append({
+            'tex': _text(step, 'tex', path=path, required=True),
+            'note': _text(step, 'note', None, path=path),
+        })
+    return {'equation': _text(data, 'equation', 'x + y = z'), 'steps': steps}
+
+
+def _parse_graph(data: dict) -> dict:
+    # A single "function" is the original form of a graph spec
+    if 'functions' in data:
+        functions = [(f'functions[{i}]', graph)
+                     for i, graph in enumerate(_items(data, 'functions', MAX_ITEMS))]
+    else:
+        functions = [('', {'function': data.get('function', 'x**2')})]
+
+    graphs = []
+    for i, (path, graph) in enumerate(functions):
+        if isinstance(graph, str):
+            graph = {'function': graph}
+        if not isinstance(graph, dict):
+            raise SpecError(path, "Expected an expression or an object with 'function'")
+        function = _expression(graph.get('function'), _join(path, 'function'))
+        graphs.append({
+            'function': function,
+            'color': _color(graph, path, _DEFAULT_COLORS[i % len(_DEFAULT_COLORS)]),
+            'label': _text(graph, 'label', f'y = {function}', path=path),
+        })
+    if not graphs:
+        raise SpecError('functions', "At least one function is required")
+
+    return {
+        'functions': graphs,
+        'x_range': _range(data, 'x_range', [-10, 10]),
+        'y_range': _range(data, 'y_range', [-10, 10]),
+    }
+
+
+def _parse_geometry(data: dict) -> dict:
+    shapes = []
+    for i, shape in enumerate(_items(data, 'shapes', MAX_ITEMS)):
+        path = f'shapes[{i}]'
+        if not isinstance(shape, dict):
+            raise SpecError(path, "Expected an object with 'type'")
+        shape_type = shape.get('type', 'circle')
+        if shape_type not in SHAPE_TYPES:
+            raise SpecError(f'{path}.type', f"Unknown shape '{shape_type}', expected one of "
+                                            f"{', '.join(SHAPE_TYPES)}")
+        normalized = {'type': shape_type}
+        if shape_type == 'circle':
+            normalized['radius'] = _number(shape, 'radius', 1, path, minimum=0.1, maximum=4)
+        elif shape_type in ('square', 'triangle'):
+            normalized['side'] = _number(shape, 'side', 2, path, minimum=0.1, maximum=8)
+        else:
+            normalized['width'] = _number(shape, 'width', 3, path, minimum=0.1, maximum=12)
+            normalized['height'] = _number(shape, 'height', 2, path, minimum=0.1, maximum=7)
+        normalized.update(
+            color=_color(shape, path, 'white'),
+            position=_point(shape, 'position', path),
+            label=_text(shape, 'label', None, path=path),
+        )
+        shapes.append(normalized)
+    return {'shapes': shapes}
+
+
+def _parse_number_line(data: dict) -> dict:
+    start = _number(data, 'start', -5)
+    end = _number(data, 'end', 5)
+    if end <= start or end - start > 40:
+        raise SpecError('end', "Expected start < end with at most 40 units between them")
+
+    points = []
+    for i, point in enumerate(_items(data, 'points', MAX_ITEMS)):
+        path = f'points[{i}]'
+        if not isinstance(point, dict):
+            raise SpecError(path, "Expected an object with 'value'")
+        value = _number(point, 'value', 0, path, minimum=start, maximum=end)
+        points.append({
+            'value': value,
+            'label': _text(point, 'label', _format_number(value), path=path),
+            'color': _color(point, path, 'red'),
+        })
+    return {'start': start, 'end': end, 'points': points}
+
+
+def _parse_function(data: dict) -> dict:
+    transformations = [_expression(expression, f'transformations[{i}]')
+                       for i, expression in enumerate(_items(data, 'transformations', MAX_STEPS))]
+    return {
+        'function': _expression(data.get('function', 'x^2'), 'function'),
+        'transformations': transformations,
+        'x_range': _range(data, 'x_range', [-5, 5]),
+        'y_range': _range(data, 'y_range', [-5, 5]),
+    }
+
+
+def _parse_generic(data: dict) -> dict:
+    return {}
+
+
+_PARSERS = {
+    'equation': _parse_equation,
+    'graph': _parse_graph,
+    'geometry': _parse_geometry,
+    'number_line': _parse_number_line,
+    'function': _parse_function,
+    'generic': _parse_generic,
+}
+
+
+# Field helpers
+
+def _join(path: str, key: str) -> str:
+    return f'{path}.{key}' if path else key
+
+
+def _text(data: dict, key: str, default='', path: str = '', required: bool = False,
+          limit=MAX_TEXT):
+    value = data.get(key)
+    if value is None:
+        if required:
+            raise SpecError(_join(path, key), "Required")
+        return default
+    if not isinstance(value, str):
+        raise SpecError(_join(path, key), "Expected a string")
+    if limit is not None and len(value) > limit:
+        raise SpecError(_join(path, key), f"Longer than {limit} characters")
+    return value
+
+
+def _number(data: dict, key: str, default, path: str = '', minimum=None, maximum=None):
+    value = data.get(key, default)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise SpecError(_join(path, key), "Expected a number")
+    if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+        raise SpecError(_join(path, key), f"Expected a number from {minimum} to {maximum}")
+    return value
+
+
+def _items(data: dict, key: str, limit: int) -> list:
+    value = data.get(key)
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        raise SpecError(key, "Expected a list")
+    if len(value) > limit:
+        raise SpecError(key, f"At most {limit} items are supported")
+    return value
+
+
+def _expression(value, location: str) -> str:
+    if not isinstance(value, str) or not value.strip():
+        raise SpecError(location, "Expected an expression in x")
+    if len(value) > MAX_TEXT:
+        raise SpecError(location, f"Longer than {MAX_TEXT} characters")
+    try:
+        # Compiled to reject unsupported syntax; the compile cache is per process,
+        # so this only saves work when the same expression is validated again
+        compile_expression(value)
+    except ExpressionError as e:
+        raise SpecError(location, str(e)) from None
+    return value
+
+
+def _color(data: dict, path: str, default: str) -> str:
+    color = data.get('color', default)
+    if not isinstance(color, str) or color.lower() not in COLORS:
+        raise SpecError(_join(path, 'color'), f"Expected one of {', '.join(COLORS)}")
+    return color.lower()
+
+
+def _range(data: dict, key: str, default: list) -> list:
+    value = data.get(key, default)
+    if (not isinstance(value, list) or len(value) != 2
+            or any(isinstance(v, bool) or not isinstance(v, (int, float)) for v in value)):
+        raise SpecError(key, "Expected [min, max]")
+    if not value[0] < value[1] or value[1] - value[0] > MAX_SPAN:
+        raise SpecError(key, f"Expected min < max with a span of at most {MAX_SPAN}")
+    return list(value)
+
+
+def _point(data: dict, key: str, path: str):
+    value = data.get(key)
+    if value is None:
+        return None
+    if (not isinstance(value, list) or len(value) != 2
+            or any(isinstance(v, bool) or not isinstance(v, (int, float)) for v in value)):
+        raise SpecError(_join(path, key), "Expected [x, y]")
+    if abs(value[0]) > 7 or abs(value[1]) > 4:
+        raise SpecError(_join(path, key), "Expected a point on screen, |x| <= 7 and |y| <= 4")
+    return list(value)
+
+
+def _format_number(value) -> str:
+    return str(int(value)) if float(value).is_integer() else str(value)
@@ -0,0 +1,119 @@
+"""
+Shared store of Manim partial movie segments for all render workers
+Segments are keyed by Manim's hash of each play call and the render config, so a
+retried or near-duplicate scene only renders the animations that changed
+"""
+import os
+import shutil
+from pathlib import Path
+from worker_counters import count, totals
+
+# Configuration
+SEGMENT_CACHE_DIR = Path(os.getenv('SEGMENT_CACHE_DIR', './media/cache/segments'))
+SEGMENT_CACHE_MAX_BYTES = int(os.getenv('SEGMENT_CACHE_MAX_BYTES', str(1024 ** 3)))
+SEGMENT_CACHE_DISABLED = os.getenv('SEGMENT_CACHE_DISABLED', '').lower() in ('1', 'true', 'yes')
+
+
+def _count(counter: str, amount=1):
+    count(f'segment_cache.{counter}', amount)
+
+
+def stats() -> dict:
+    """Hit rate as reported by the workers, plus the size of the store"""
+    counts = totals('segment_cache')
+    hits, misses = counts.get('hits', 0), counts.get('misses', 0)
+    entries = [p for p in SEGMENT_CACHE_DIR.rglob('*') if p.is_file() and p.suffix != '.tmp']
+    return {
+        'enabled': not SEGMENT_CACHE_DISABLED,
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / (hits + misses) if hits + misses else 0.0,
+        'published': counts.get('published', 0),
+        'entries': len(entries),
+        'bytes': sum(p.stat().st_size for p in entries if p.exists()),
+        'max_bytes': SEGMENT_CACHE_MAX_BYTES,
+    }
+
+
+def segment_path(animation_hash: str) -> Path:
+    """
+    Where the segment of a play call is stored for the current Manim config
+
+    Manim's hash covers the scene state and animations but a segment is only
+    reusable at the same resolution, frame rate and container format.
+    """
+    from manim import config
+
+    render_config = f"{config.pixel_width}x{config.pixel_height}@{config.frame_rate:g}"
+    if config.transparent:
+        render_config += '-transparent'
+    return SEGMENT_CACHE_DIR / render_config / f"{animation_hash}{config.movie_file_extension}"
+
+
+def _link_or_copy(source: Path, dest: Path):
+    try:
+        os.link(source, dest)
+    except OSError:
+        # Different filesystem, or the file system has no hardlinks
+        shutil.copyfile(source, dest)
+
+
+def install():
+    """
+    Share Manim's partial movie files between renders
+
+    Must be called in a render worker after Manim is imported. A play call
+    whose segment is missing from the job's own partial movie directory is
+    looked up in the store before it is rendered, and every segment a job
+    renders is published to the store once its stream is closed.
+    """
+    if SEGMENT_CACHE_DISABLED:
+        return
+
+    from manim.scene import scene_file_writer
+    from manim.scene.scene_file_writer import SceneFileWriter
+
+    original_is_already_cached = SceneFileWriter.is_already_cached
+    original_end_animation = SceneFileWriter.end_animation
+
+    def is_already_cached(writer, hash_invocation):
+        if original_is_already_cached(writer, hash_invocation):
+            return True
+        # Same conditions under which Manim writes partial movie files at all
+        if (not hasattr(writer, 'partial_movie_directory')
+                or not scene_file_writer.write_to_movie()
+                or hash_invocation.startswith('uncached_')):
+            return False
+
+        shared = segment_path(hash_invocation)
+        local = Path(writer.partial_movie_directory) / shared.name
+        try:
+            _link_or_copy(shared, local)
+        except FileNotFoundError:
+            _count('misses')
+            return False
+        # Touched on every hit, so the media collector evicts the least recently used
+        os.utime(shared)
+        _count('hits')
+        return True
+
+    def end_animation(writer, allow_write=False):
+        original_end_animation(writer, allow_write)
+        if not (allow_write and scene_file_writer.write_to_movie()):
+            return
+        local = Path(writer.partial_movie_file_path)
+        if local.stem.startswith('uncached_') or not local.exists():
+            return
+
+        shared = segment_path(local.stem)
+        if shared.exists():
+            return
+        shared.parent.mkdir(parents=True, exist_ok=True)
+        # Link under a temporary name and rename, so readers never see a partial segment
+        tmp_path = shared.with_name(f"{shared.name}.{os.getpid()}.tmp")
+        _link_or_copy(local, tmp_path)
+        os.replace(tmp_path, shared)
+        _count('published')
+
+    SceneFileWriter.is_already_cached = is_already_cached
+    SceneFileWriter.end_animation = end_animation
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Production entry point for the Manim service
+Serves the Flask app with gunicorn's threaded workers and drains renders on shutdown
+Usage: python serve.py (python api.py --dev runs the Flask debug server instead)
+"""
+import os
+
+from gunicorn.app.base import BaseApplication
+
+# Configuration
+HOST = os.getenv('HOST', '0.0.0.0')
+PORT = int(os.getenv('PORT', '5001'))
+
+# Server processes. Each has its own render pool of RENDER_WORKERS processes,
+# so more server processes mostly add memory; renders scale with RENDER_WORKERS.
+# Above 1, state kept in memory is per process: /metrics and its gauges describe
+# only the process that answered, the media collector protects a sibling's
+# renders in flight only by GC_STALE_GRACE, and /hls answers 404 instead of 202
+# for a render still running in another process
+SERVER_WORKERS = int(os.getenv('SERVER_WORKERS', '1'))
+
+# Request threads per server process. Blocking renders and job event streams
+# hold a thread for as long as they run, so this is well above RENDER_WORKERS
+SERVER_THREADS = int(os.getenv('SERVER_THREADS', '32'))
+
+# Seconds an idle keep-alive connection stays open
+SERVER_KEEPALIVE = int(os.getenv('SERVER_KEEPALIVE', '5'))
+
+# Seconds a stopping server process has to finish its requests and jobs before
+# it is killed; long enough for a job to render every tier and its narration
+DRAIN_TIMEOUT = int(os.getenv('DRAIN_TIMEOUT', '300'))
+
+# Set when a server process is interrupted rather than asked to stop
+_interrupted = False
+
+
+def post_worker_init(worker):
+    """Warm up the render pool and start the media collector in each server process"""
+    from media_gc import get_media_collector
+    from render_pool import get_render_pool
+
+    get_render_pool().start()
+    get_media_collector().start()
+
+
+def worker_int(worker):
+    """Ctrl-C or SIGQUIT: stop right away, abandoning what is rendering"""
+    global _interrupted
+    _interrupted = True
+    print(f"[API] Server process {worker.pid} interrupted, not draining")
+
+
+def worker_exit(server, worker):
+    """
+    Drain a server process once it has stopped taking requests
+
+    Runs after gunicorn has let the open requests finish (blocking renders
+    included). Queued jobs are failed so clients can resubmit them elsewhere,
+    jobs already rendering are finished, then background TTS, the render
+    workers and the media collector are stopped.
+    """
+    from jobs import get_job_store
+    from media_gc import get_media_collector
+    from render_pipeline import drain
+    from render_pool import get_render_pool
+
+    if _interrupted:
+        return
+    print(f"[API] Draining server process {worker.pid}...")
+    get_job_store().shutdown()
+    drain()
+    get_render_pool().shutdown()
+    get_media_collector().stop()
+    print(f"[API] Server process {worker.pid} drained")
+
+
+class ManimServer(BaseApplication):
+    """Runs api.app under gunicorn with the settings above"""
+
+    def __init__(self, options: dict = None):
+        self.options = {
+            'bind': f"{HOST}:{PORT}",
+            'workers': SERVER_WORKERS,
+            'worker_class': 'gthread',
+            'threads': SERVER_THREADS,
+            'keepalive': SERVER_KEEPALIVE,
+            'graceful_timeout': DRAIN_TIMEOUT,
+            # Request line and header limits; bodies are capped by MAX_REQUEST_BYTES in api.py
+            'limit_request_line': 8190,
+            'limit_request_fields': 100,
+            'limit_request_field_size': 8190,
+            'accesslog': '-',
+            'post_worker_init': post_worker_init,
+            'worker_int': worker_int,
+            'worker_exit': worker_exit,
+            **(options or {}),
+        }
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from api import app
+        return app
+
+
+def main():
+    print(f"[API] Serving on {HOST}:{PORT} with {SERVER_WORKERS} process(es) of "
+          f"{SERVER_THREADS} threads")
+    ManimServer().run()
+
+
+if __name__ == "__main__":
+    main()
@@ -7,4 +7,12 @@ cd "$(dirname "$0")"
 export PATH="/Library/TeX/texbin:$PATH"
 
 source venv/bin/activate
-python api.py
+
+# Precompile common TeX/Text strings into the shared SVG cache (fast once warm)
+python svg_cache.py || echo "SVG cache warm-up failed, continuing"
+
+# Production server (serve.py); ./start.sh --dev runs the Flask debug server with reloading
+if [ "$1" = "--dev" ]; then
+    exec python api.py --dev
+fi
+exec python serve.py
@@ -0,0 +1,252 @@
+"""
+Shared cache of compiled TeX and Text SVGs for all render workers
+SVGs are keyed on the exact TeX source or Pango settings, so a worker only runs
+latex/dvisvgm or Pango for strings no worker has compiled before
+"""
+import fcntl
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from worker_counters import count, take_counts, totals
+
+# Configuration
+SVG_CACHE_DIR = Path(os.getenv('SVG_CACHE_DIR', './media/cache/svg'))
+SVG_CACHE_DISABLED = os.getenv('SVG_CACHE_DISABLED', '').lower() in ('1', 'true', 'yes')
+
+# Compiles run in private directories here, which the media collector cleans up
+SCRATCH_DIR = Path('./temp')
+
+# Workers compiling the same key wait on one of these lock files instead of
+# compiling it twice
+LOCK_STRIPES = 256
+
+KINDS = ('tex', 'text')
+
+
+def _count(counter: str, amount=1):
+    count(f'svg_cache.{counter}', amount)
+
+
+def stats() -> dict:
+    """Hit rates per kind, as reported by the workers, plus the size of the cache"""
+    counts = totals('svg_cache')
+
+    stats = {'enabled': not SVG_CACHE_DISABLED}
+    for kind in KINDS:
+        hits, misses = counts.get(f'{kind}_hits', 0), counts.get(f'{kind}_misses', 0)
+        entries = list((SVG_CACHE_DIR / kind).glob('*.svg'))
+        stats[kind] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': hits / (hits + misses) if hits + misses else 0.0,
+            'compile_seconds': round(counts.get(f'{kind}_compile_seconds', 0.0), 3),
+            'entries': len(entries),
+            'bytes': sum(p.stat().st_size for p in entries if p.exists()),
+        }
+    return stats
+
+
+def svg_key(kind: str, *parts) -> str:
+    """Hash everything that determines the compiled SVG"""
+    hasher = hashlib.sha256(kind.encode('utf-8'))
+    for part in parts:
+        hasher.update(b'\0' + str(part).encode('utf-8'))
+    return hasher.hexdigest()
+
+
+@contextmanager
+def _key_lock(key: str):
+    lock_dir = SVG_CACHE_DIR / 'locks'
+    lock_dir.mkdir(parents=True, exist_ok=True)
+    stripe = int(key[:8], 16) % LOCK_STRIPES
+    with open(lock_dir / f"{stripe}.lock", 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def fetch_or_compile(kind: str, key: str, compile_svg) -> Path:
+    """
+    Return the cached SVG for key, compiling and publishing it on a miss
+
+    Args:
+        kind: 'tex' or 'text'
+        key: svg_key() of the source
+        compile_svg: Called with a private scratch directory, returns the SVG it wrote there
+
+    Returns:
+        Path: The SVG in the shared cache, which is never modified once published
+    """
+    cached = SVG_CACHE_DIR / kind / f"{key}.svg"
+    if _touch(cached):
+        _count(f'{kind}_hits')
+        return cached
+
+    with _key_lock(key):
+        # Another worker may have compiled it while this one waited for the lock
+        if _touch(cached):
+            _count(f'{kind}_hits')
+            return cached
+
+        _count(f'{kind}_misses')
+        start = time.time()
+        SCRATCH_DIR.mkdir(exist_ok=True)
+        scratch = Path(tempfile.mkdtemp(prefix=f'svg-{kind}-', dir=SCRATCH_DIR)).resolve()
+        try:
+            svg_path = compile_svg(scratch)
+            cached.parent.mkdir(parents=True, exist_ok=True)
+            # Copy next to the cache entry and rename, so readers never see a partial SVG
+            tmp_path = cached.with_name(f"{key}.{os.getpid()}.tmp")
+            shutil.copyfile(svg_path, tmp_path)
+            os.replace(tmp_path, cached)
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+        _count(f'{kind}_compile_seconds', time.time() - start)
+    return cached
+
+
+def _touch(path: Path) -> bool:
+    """Mark a cached SVG as used, which keeps the media collector from expiring it"""
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def install():
+    """
+    Route Manim's TeX and Text SVG generation through the shared cache
+
+    Must be called in a render worker after Manim is imported.
+    """
+    if SVG_CACHE_DISABLED:
+        return
+
+    from manim import config
+    from manim.mobject.text import tex_mobject, text_mobject
+    from manim.utils import tex_file_writing
+
+    original_tex_to_svg_file = tex_file_writing.tex_to_svg_file
+
+    def tex_to_svg_file(expression, environment=None, tex_template=None):
+        template = tex_template if tex_template is not None else config["tex_template"]
+        if environment is not None:
+            source = template.get_texcode_for_expression_in_env(expression, environment)
+        else:
+            source = template.get_texcode_for_expression(expression)
+
+        def compile_svg(scratch):
+            # Manim deletes every non-SVG file in tex_dir after a compile, so each
+            # compile gets a directory no other worker is using
+            previous = config.tex_dir
+            config.tex_dir = str(scratch)
+            try:
+                return original_tex_to_svg_file(expression, environment, template)
+            finally:
+                config.tex_dir = previous
+
+        key = svg_key('tex', source, template.tex_compiler, template.output_format)
+        return fetch_or_compile('tex', key, compile_svg)
+
+    # tex_mobject imported the function by name, so patch both references
+    tex_file_writing.tex_to_svg_file = tex_to_svg_file
+    tex_mobject.tex_to_svg_file = tex_to_svg_file
+
+    for text_class in (text_mobject.Text, text_mobject.MarkupText):
+        _install_text(text_class, config)
+
+
+def _install_text(text_class, config):
+    original_text2svg = text_class._text2svg
+
+    def _text2svg(self, color):
+        def compile_svg(scratch):
+            previous = config.text_dir
+            config.text_dir = str(scratch)
+            try:
+                return original_text2svg(self, color)
+            finally:
+                config.text_dir = previous
+
+        key = svg_key('text', text_class.__name__, self._text2hash(color))
+        cached = fetch_or_compile('text', key, compile_svg)
+
+        # Text and MarkupText rewrite the returned file in place (stripping its
+        # last path command), which must never happen to the shared copy another
+        # worker may be reading
+        private_dir = SCRATCH_DIR / f"svg-text-{os.getpid()}"
+        private_dir.mkdir(parents=True, exist_ok=True)
+        private = private_dir / cached.name
+        if not private.exists():
+            shutil.copyfile(cached, private)
+        return str(private.resolve())
+
+    text_class._text2svg = _text2svg
+
+
+# Strings the scene templates and the code generation prompt produce most often
+WARM_TEX = [
+    "f(x) = x^2", "x", "y", "=", "+", "-", "?",
+    "2 + 3 = ?", "2 + 3 = 5", "2x + 3 = 7", "2x = 4", "x = 2",
+]
+WARM_TEXT = [
+    ("Solving the Equation", 36),
+    ("Problem Breakdown", 40),
+    ("Step 1", 24),
+    ("Step 2", 24),
+    ("Step 3", 24),
+]
+
+
+def warm(extra_tex=(), extra_text=()):
+    """
+    Compile the common strings into the shared cache
+
+    Builds the axes and number lines of the templates (whose tick labels are
+    one MathTex per number), WARM_TEX and WARM_TEXT, plus any extra strings.
+    """
+    from manim import config, Axes, MathTex, NumberLine, Text
+    import numpy as np
+
+    config.media_dir = "./media"
+    install()
+
+    start = time.time()
+    Axes(x_range=[-10, 10, 1], y_range=[-10, 10, 1],
+         axis_config={"include_tip": True, "numbers_to_include": np.arange(-10, 11, 2)})
+    Axes(x_range=[0, 5], y_range=[0, 10]).add_coordinates()
+    NumberLine(x_range=[-10, 10, 1], include_numbers=True)
+    for tex in [*WARM_TEX, *extra_tex]:
+        MathTex(tex)
+    for text, font_size in [*WARM_TEXT, *((text, 24) for text in extra_text)]:
+        Text(text, font_size=font_size)
+
+    counts = {name.split('.', 1)[1]: amount for name, amount in take_counts().items()
+              if name.startswith('svg_cache.')}
+    print(f"[SVG] Warmed in {time.time() - start:.1f}s: "
+          f"{counts.get('tex_misses', 0)} TeX and {counts.get('text_misses', 0)} Text "
+          f"strings compiled, {counts.get('tex_hits', 0) + counts.get('text_hits', 0)} "
+          f"already cached")
+
+
+if __name__ == "__main__":
+    # Usage: python svg_cache.py [strings_file]
+    # Each line of strings_file is a MathTex string, or Text when prefixed with "text:"
+    extra_tex, extra_text = [], []
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as f:
+            for line in f:
+                line = line.rstrip('\n')
+                if line.startswith('text:'):
+                    extra_text.append(line[len('text:'):].strip())
+                elif line.strip():
+                    extra_tex.append(line)
+    warm(extra_tex, extra_text)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Test the batch render endpoint against a running service
+"""
+import requests
+import sys
+import time
+
+MANIM_SERVICE_URL = "http://localhost:5001"
+
+SCENE_TEMPLATE = """from manim import *
+
+class GeneratedScene(Scene):
+    def construct(self):
+        shape = {shape}(color=BLUE)
+        self.play(Create(shape))
+        self.play(shape.animate.shift(RIGHT * 2))
+        self.wait(1)
+"""
+
+
+def test_batch():
+    """Queue several scenes in one request and poll until all of them finish"""
+    items = [{"code": SCENE_TEMPLATE.format(shape=shape)}
+             for shape in ("Circle", "Square", "Triangle", "RegularPolygon")]
+    items.append({"problem": {"type": "graph", "function": "x**2"}})
+
+    print(f"\n1. Submitting a batch of {len(items)} scenes...")
+    response = requests.post(f"{MANIM_SERVICE_URL}/generate-batch", json={"items": items})
+    if response.status_code != 202:
+        print(f"   ❌ Failed with status {response.status_code}: {response.text[:300]}")
+        return False
+    status_url = response.json()["status_url"]
+    print(f"   ✅ Queued as {status_url}")
+
+    print("\n2. Polling for results...")
+    deadline = time.time() + 300
+    while time.time() < deadline:
+        batch = requests.get(f"{MANIM_SERVICE_URL}{status_url}").json()
+        if batch["done"]:
+            break
+        time.sleep(1)
+    else:
+        print("   ❌ Batch did not finish within 300s")
+        return False
+
+    for index, item in enumerate(batch["items"]):
+        if item["status"] == "done":
+            print(f"   ✅ Item {index}: {item['result']['video_url']}")
+        else:
+            print(f"   ❌ Item {index}: {item.get('error')}")
+
+    print(f"\n   Wall time:   {batch['wall_seconds']:.1f}s")
+    print(f"   Render time: {batch['render_seconds']:.1f}s (x{batch['parallel_speedup']})")
+    return batch["counts"].get("done", 0) == len(items)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if test_batch() else 1)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Test the static pre-flight checks for generated code (no server or Manim needed)
+"""
+import builtins
+from code_preflight import DANGEROUS_BUILTINS, PreflightError, preflight
+
+# A small stand-in for the names render workers report
+KNOWN_NAMES = ({'Scene', 'Circle', 'Square', 'Create', 'Write', 'MathTex', 'BLUE', 'np', 'config'}
+               | set(dir(builtins))) - set(DANGEROUS_BUILTINS)
+
+GOOD_CODE = """from manim import *
+import numpy as np
+
+RADIUS = 1.5
+
+def make_circle():
+    return Circle(radius=RADIUS, color=BLUE)
+
+class GeneratedScene(Scene):
+    def construct(self):
+        circle = make_circle()
+        squares = [Square().shift(i * np.array([1, 0, 0])) for i in range(3)]
+        self.play(Create(circle), *[Create(s) for s in squares])
+"""
+
+
+def expect_error(code, kind, line=None):
+    try:
+        preflight(code, known_names=KNOWN_NAMES)
+    except PreflightError as e:
+        assert e.kind == kind, f"expected {kind}, got {e.kind}: {e}"
+        assert line is None or e.line == line, f"expected line {line}, got {e.line}"
+        return e
+    raise AssertionError(f"expected a {kind} error")
+
+
+def test_valid_code():
+    """Valid code compiles, and the compiled object is reused"""
+    compiled = preflight(GOOD_CODE, known_names=KNOWN_NAMES)
+    assert preflight(GOOD_CODE, known_names=KNOWN_NAMES) is compiled
+    print("✅ valid code")
+
+
+def test_errors():
+    """Each kind of broken code is reported with the line it is on"""
+    expect_error("class GeneratedScene(Scene):\n    def construct(self)\n        pass\n",
+                 'syntax', 2)
+    expect_error("class Other(Scene):\n    def construct(self):\n        pass\n", 'missing_scene')
+    expect_error("class GeneratedScene:\n    def construct(self):\n        pass\n",
+                 'missing_scene', 1)
+    expect_error("class GeneratedScene(Scene):\n    def setup(self):\n        pass\n",
+                 'missing_construct', 1)
+    expect_error("import os\nclass GeneratedScene(Scene):\n    def construct(self):\n        pass\n",
+                 'forbidden_import', 1)
+    expect_error("class GeneratedScene(Scene):\n    def construct(self):\n"
+                 "        open('/etc/passwd')\n", 'forbidden_name', 3)
+    # Import lines are blanked, not removed, so lines still match the submitted code
+    error = expect_error("from manim import *\n\nclass GeneratedScene(Scene):\n"
+                         "    def construct(self):\n        self.play(ShowCreation(Circle()))\n",
+                         'unknown_name', 5)
+    assert 'ShowCreation' in error.message
+    # Only manim and numpy themselves are provided
+    expect_error("import manimlib\nclass GeneratedScene(Scene):\n"
+                 "    def construct(self):\n        pass\n", 'forbidden_import', 1)
+    expect_error("from manim_slides import Slide\nclass GeneratedScene(Scene):\n"
+                 "    def construct(self):\n        pass\n", 'forbidden_import', 1)
+    print("✅ pre-flight errors")
+
+
+def test_own_names_shadow_builtins():
+    """The code may bind names that happen to be removed builtins, but not read the builtins"""
+    preflight("help = 'Hint'\n\ndef label(input):\n    return input.upper()\n\n"
+              "class GeneratedScene(Scene):\n    def construct(self):\n"
+              "        self.play(Write(MathTex(label(help))))\n", known_names=KNOWN_NAMES)
+    expect_error("def label(input):\n    return input\n\nclass GeneratedScene(Scene):\n"
+                 "    def construct(self):\n        name = input()\n", 'forbidden_name', 6)
+    print("✅ own names shadow builtins")
+
+
+def test_provided_imports_keep_lines():
+    """Provided imports are dropped wherever they are, and later lines keep their numbers"""
+    error = expect_error("from manim import (\n    Circle,\n    Create,\n)\n"
+                         "class GeneratedScene(Scene):\n    def construct(self):\n"
+                         "        import numpy as np\n        self.play(ShowCreation(Circle()))\n",
+                         'unknown_name', 8)
+    assert 'ShowCreation' in error.message
+    print("✅ provided imports keep lines")
+
+
+def test_names_unchecked_without_known_names():
+    """Without known names only the structural checks run"""
+    preflight("class GeneratedScene(Scene):\n    def construct(self):\n"
+              "        self.play(ShowCreation(Circle()))\n")
+    print("✅ names unchecked without known names")
+
+
+if __name__ == "__main__":
+    test_valid_code()
+    test_errors()
+    test_own_names_shadow_builtins()
+    test_provided_imports_keep_lines()
+    test_names_unchecked_without_known_names()
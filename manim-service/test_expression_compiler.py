@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Test the graph expression compiler (no server or Manim needed)
+"""
+import numpy as np
+from expression_compiler import ExpressionError, compile_expression, continuous_ranges
+
+
+def expect_error(expression):
+    try:
+        compile_expression(expression)
+    except ExpressionError:
+        return
+    raise AssertionError(f"expected {expression!r} to be rejected")
+
+
+def test_vectorized():
+    """Expressions evaluate over whole arrays and match the NumPy equivalent"""
+    xs = np.linspace(-3, 3, 101)
+    cases = {
+        'x**2': xs ** 2,
+        'x^3 - 2*x': xs ** 3 - 2 * xs,
+        'exp(-x^2)': np.exp(-xs ** 2),
+        'np.sin(x) + cos(2*x)': np.sin(xs) + np.cos(2 * xs),
+        'y = abs(x) * pi': np.abs(xs) * np.pi,
+        'f(x) = 3': np.full_like(xs, 3.0),
+    }
+    for expression, expected in cases.items():
+        assert np.allclose(compile_expression(expression)(xs), expected), expression
+    assert compile_expression('x**2')(3) == 9.0
+    # Parsed once per expression
+    assert compile_expression('x**2') is compile_expression('x**2')
+    print("✅ vectorized evaluation")
+
+
+def test_rejected():
+    """Anything but arithmetic on x and whitelisted functions is rejected"""
+    for expression in ("__import__('os').system('true')", "x.__class__", "open('f')",
+                       "[x for x in ()]", "lambda: 1", "y", "sin(x, 2)", "'a' * 3",
+                       "os.sin(x)", "x +", "x if x else 1"):
+        expect_error(expression)
+    print("✅ rejected expressions")
+
+
+def test_domain_errors():
+    """Points outside the domain come out as nan or inf instead of raising"""
+    ys = compile_expression('log(x) + 1/x')(np.array([-1.0, 0.0, 1.0]))
+    assert np.isnan(ys[0]) and not np.isfinite(ys[1]) and ys[2] == 1.0
+    # Numbers are floats, so a huge power overflows instead of running forever
+    try:
+        compile_expression('x + 9**9**9')(1.0)
+    except ExpressionError:
+        pass
+    else:
+        raise AssertionError("expected an overflow")
+    print("✅ domain errors")
+
+
+def test_continuous_ranges():
+    """Graphs are split at poles, jumps and the edges of the domain"""
+    bounds = ((-10, 10), (-10, 10))
+    assert len(continuous_ranges(compile_expression('x'), *bounds)) == 1
+
+    left, right = continuous_ranges(compile_expression('1/x'), *bounds)
+    assert left[1] < 0 < right[0]
+
+    (start, end), = continuous_ranges(compile_expression('log(x)'), *bounds)
+    assert 0 < start < 0.1 and end == 10
+
+    # Parabola leaves the visible range at |x| = sqrt(10)
+    (start, end), = continuous_ranges(compile_expression('x^2'), *bounds)
+    assert abs(start + np.sqrt(10)) < 0.02 and abs(end - np.sqrt(10)) < 0.02
+
+    assert len(continuous_ranges(compile_expression('tan(x)'), *bounds)) >= 6
+    assert continuous_ranges(compile_expression('x + 100'), *bounds) == []
+    print("✅ continuous ranges")
+
+
+if __name__ == "__main__":
+    test_vectorized()
+    test_rejected()
+    test_domain_errors()
+    test_continuous_ranges()
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Test resuming a job's event log from a Last-Event-ID (no server or Manim needed)
+"""
+import tempfile
+from pathlib import Path
+
+from jobs import JobStore
+
+
+def test_resume_offsets():
+    """Offsets past an event resume there, any other offset starts over"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = JobStore(jobs_dir=Path(tmp), batches_dir=Path(tmp), max_workers=1)
+        for stage in ('queued', 'rendering', 'muxing'):
+            store.add_event('job', {"event": "stage", "stage": stage})
+
+        events = store.read_events('job')
+        assert [event['stage'] for _, event in events] == ['queued', 'rendering', 'muxing']
+        first_id = events[0][0]
+        assert [event['stage'] for _, event in store.read_events('job', first_id)] == \
+            ['rendering', 'muxing']
+        assert store.read_events('job', events[-1][0]) == []
+
+        # Mid-line, negative and past the end all read the whole log again
+        for offset in (first_id - 3, first_id + 1, -5, events[-1][0] + 100):
+            assert store.read_events('job', offset) == events, offset
+
+        # A line that does not decode is skipped, later events still arrive
+        with open(Path(tmp) / 'job.events', 'a') as f:
+            f.write('{"event": "animat\n')
+        store.add_event('job', {"event": "done"})
+        resumed = store.read_events('job', events[-1][0])
+        assert [event['event'] for _, event in resumed] == ['done']
+    print("✅ resume offsets")
+
+
+if __name__ == "__main__":
+    test_resume_offsets()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Test the media collector's byte budget (no server or Manim needed)
+"""
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from media_gc import MediaCollector
+
+
+def test_caches_over_budget():
+    """Caches do not count against the budget, and videos shared with a cache are kept"""
+    with tempfile.TemporaryDirectory() as tmp:
+        media = Path(tmp) / "media"
+        video_cache = media / "cache" / "videos"
+        tts_cache = media / "cache" / "tts"
+        video_cache.mkdir(parents=True)
+        tts_cache.mkdir(parents=True)
+        collector = MediaCollector(media_dir=media, temp_dir=Path(tmp) / "temp", max_bytes=250,
+                                   cache_dirs=(video_cache, tts_cache))
+
+        # The caches alone are well over the budget
+        (tts_cache / "narration.mp3").write_bytes(b"a" * 1000)
+        (video_cache / "cached.mp4").write_bytes(b"v" * 1000)
+        os.link(video_cache / "cached.mp4", media / "shared.mp4")
+        for i, name in enumerate(("old", "new")):
+            video = media / f"{name}.mp4"
+            video.write_bytes(b"x" * 100)
+            os.utime(video, (time.time() - 100 + i, time.time() - 100 + i))
+
+        summary = collector.collect()
+        assert summary['media_bytes'] == 200, summary
+        assert 'evicted_videos' not in summary['by_category'], summary
+
+        # Over the budget: only unshared videos are evicted, least recently served first
+        (media / "newest.mp4").write_bytes(b"x" * 100)
+        summary = collector.collect()
+        assert summary['media_bytes'] == 200, summary
+        assert summary['by_category']['evicted_videos'] == {'bytes': 100, 'files': 1}, summary
+        assert not (media / "old.mp4").exists()
+        assert (media / "new.mp4").exists() and (media / "newest.mp4").exists()
+        assert (media / "shared.mp4").exists()
+        assert (video_cache / "cached.mp4").exists() and (tts_cache / "narration.mp3").exists()
+    print("✅ caches over budget")
+
+
+if __name__ == "__main__":
+    test_caches_over_budget()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Test the Prometheus text format of the service metrics (no server or Manim needed)
+"""
+from metrics import Counter, Gauge, Histogram, render
+
+
+def test_histogram():
+    """Buckets are cumulative and end with +Inf, alongside _sum and _count"""
+    histogram = Histogram('test_stage_seconds', 'Test stages', labels=('stage',),
+                          buckets=(0.1, 1))
+    histogram.observe(0.05, stage='mux')
+    histogram.observe(0.5, stage='mux')
+    histogram.observe(5, stage='mux')
+
+    lines = render().splitlines()
+    assert '# TYPE test_stage_seconds histogram' in lines
+    assert 'test_stage_seconds_bucket{stage="mux",le="0.1"} 1' in lines
+    assert 'test_stage_seconds_bucket{stage="mux",le="1"} 2' in lines
+    assert 'test_stage_seconds_bucket{stage="mux",le="+Inf"} 3' in lines
+    assert 'test_stage_seconds_sum{stage="mux"} 5.55' in lines
+    assert 'test_stage_seconds_count{stage="mux"} 3' in lines
+    print("✅ histogram")
+
+
+def test_counter_and_gauge():
+    """Counters add up per label value, gauges are read when rendered"""
+    counter = Counter('test_failures_total', 'Test failures', labels=('cause',))
+    counter.inc(cause='timeout')
+    counter.inc(cause='timeout')
+    counter.inc(cause='say "hi"\n')
+    readings = iter([3, None])
+    Gauge('test_in_flight', 'Test gauge', lambda: next(readings))
+
+    lines = render().splitlines()
+    assert 'test_failures_total{cause="timeout"} 2' in lines
+    assert 'test_failures_total{cause="say \\"hi\\"\\n"} 1' in lines
+    assert 'test_in_flight 3' in lines
+    # A gauge without a value is listed without samples
+    assert not [line for line in render().splitlines() if line.startswith('test_in_flight ')]
+    print("✅ counter and gauge")
+
+
+def test_labels_checked():
+    """Observations must name exactly the metric's labels"""
+    histogram = Histogram('test_checked_seconds', 'Test labels', labels=('stage',))
+    try:
+        histogram.observe(1, provider='qwen')
+    except ValueError:
+        print("✅ labels checked")
+        return
+    raise AssertionError("expected unknown labels to be rejected")
+
+
+if __name__ == "__main__":
+    test_histogram()
+    test_counter_and_gauge()
+    test_labels_checked()
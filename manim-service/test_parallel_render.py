@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Test how a scene is split and timed for parallel rendering (no server or Manim needed)
+"""
+import time
+
+from render_pipeline import PipelineError, _run_on_pool, plan_slices
+
+
+def test_slices_cover_timeline():
+    """Slices are contiguous, in order, and cover every animation exactly once"""
+    for timeline, slices in (([1] * 10, 4), ([5, 1, 1, 1], 3), ([0.5, 3, 0.5, 2, 2], 2),
+                             ([1] * 3, 8), ([2, 2], 4)):
+        planned = plan_slices(timeline, slices)
+        assert 1 <= len(planned) <= slices, planned
+        indices = [i for first, last in planned for i in range(first, last + 1)]
+        assert indices == list(range(len(timeline))), planned
+    print("✅ slices cover the timeline")
+
+
+def test_slices_balance_run_time():
+    """Slices get similar run times, and one long animation gets a slice of its own"""
+    assert plan_slices([1] * 8, 4) == [(0, 1), (2, 3), (4, 5), (6, 7)]
+    assert plan_slices([1, 1, 1, 10], 4) == [(0, 2), (3, 3)]
+    print("✅ balanced slices")
+
+
+def test_degenerate_timelines():
+    """Nothing to split renders as a single slice"""
+    assert plan_slices([], 4) == []
+    assert plan_slices([1, 2, 3], 1) == [(0, 2)]
+    assert plan_slices([0, 0], 2) == [(0, 1)]
+    print("✅ degenerate timelines")
+
+
+def test_passes_share_the_timeout():
+    """A pass started after the shared deadline times out without reaching a worker"""
+    try:
+        _run_on_pool({'kind': 'validate', 'code': ''}, 60, deadline=time.monotonic() - 1)
+    except PipelineError as e:
+        assert e.error == "Visualization generation timed out (>60s)", e.error
+    else:
+        raise AssertionError("expected a timeout")
+    print("✅ passes share the timeout")
+
+
+if __name__ == "__main__":
+    test_slices_cover_timeline()
+    test_slices_balance_run_time()
+    test_degenerate_timelines()
+    test_passes_share_the_timeout()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Test the render profile capture and its phase breakdown (no server or Manim needed)
+"""
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import profiling
+
+
+def test_phase_breakdown():
+    """Nested phases count their own time only, and the capture is saved to disk"""
+    tex = profiling._timed('tex', lambda: time.sleep(0.05))
+
+    def update():
+        time.sleep(0.05)
+        tex()
+
+    update = profiling._timed('mobject_updates', update)
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        # Phases are not timed outside a capture
+        update()
+        with profiling.ProfileCapture(output_dir, 'standard') as capture:
+            update()
+            update()
+
+        phases = capture.breakdown['phases']
+        assert phases['tex']['calls'] == 2 and phases['mobject_updates']['calls'] == 2
+        assert 0.09 <= phases['mobject_updates']['seconds'] < 0.15, phases
+        assert 0.09 <= phases['tex']['seconds'] < 0.15, phases
+        assert phases['other']['seconds'] < 0.05, phases
+        assert capture.breakdown['top_functions']
+
+        assert (Path(output_dir) / 'standard.prof').stat().st_size > 0
+        with open(Path(output_dir) / 'standard.json') as f:
+            assert json.load(f) == capture.breakdown
+    print("✅ phase breakdown")
+
+
+def test_failed_job_profiled():
+    """A job that raises is profiled up to the failure"""
+    with tempfile.TemporaryDirectory() as output_dir:
+        capture = profiling.ProfileCapture(output_dir, 'preview')
+        try:
+            with capture:
+                raise ValueError("scene failed")
+        except ValueError:
+            pass
+        assert capture.breakdown['frames'] == 0
+        assert (Path(output_dir) / 'preview.json').exists()
+    print("✅ failed job profiled")
+
+
+if __name__ == "__main__":
+    test_phase_breakdown()
+    test_failed_job_profiled()
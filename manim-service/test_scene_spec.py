@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Test validation of /generate scene specs (no server or Manim needed)
+"""
+from scene_spec import SpecError, parse_spec
+
+
+def expect_error(data, path):
+    try:
+        parse_spec(data)
+    except SpecError as e:
+        assert e.path == path, f"expected an error at {path!r}, got {e.path!r}: {e}"
+        return
+    raise AssertionError(f"expected {data} to be rejected")
+
+
+def test_original_problem_data():
+    """Problem data in the original format is accepted and normalized"""
+    spec = parse_spec({"type": "graph", "function": "x**2", "output_file": "scene"})
+    assert spec["functions"] == [{"function": "x**2", "color": "blue", "label": "y = x**2"}]
+    assert "output_file" not in spec
+
+    spec = parse_spec({"type": "equation", "equation": "x = 1", "steps": ["x - 1 = 0"]})
+    assert spec["steps"] == [{"tex": "x - 1 = 0", "note": None}]
+
+    assert parse_spec({"content": "Anything"})["type"] == "generic"
+    print("✅ original problem data")
+
+
+def test_idempotent():
+    """A normalized spec parses to itself"""
+    for data in ({"type": "geometry", "shapes": [{"type": "rectangle", "color": "Red"}]},
+                 {"type": "number_line", "points": [{"value": 2.5}]},
+                 {"type": "function", "transformations": ["(x-1)^2", "(x-1)^2 + 2"]},
+                 {"type": "graph", "functions": ["sin(x)", {"function": "cos(x)"}],
+                  "x_range": [-6, 6], "y_range": [-2, 2]}):
+        spec = parse_spec(data)
+        assert parse_spec(spec) == spec, spec
+    print("✅ idempotent")
+
+
+def test_rejected():
+    """Malformed specs are rejected with the path of the offending value"""
+    expect_error([], '')
+    expect_error({"type": "chart"}, 'type')
+    expect_error({"type": "graph", "function": "__import__('os')"}, 'function')
+    expect_error({"type": "graph", "functions": []}, 'functions')
+    expect_error({"type": "graph", "functions": ["x", {"function": "x", "color": "mauve"}]},
+                 'functions[1].color')
+    expect_error({"type": "graph", "x_range": [5, -5]}, 'x_range')
+    expect_error({"type": "equation", "steps": [{"note": "no tex"}]}, 'steps[0].tex')
+    expect_error({"type": "equation", "steps": ["x"] * 50}, 'steps')
+    expect_error({"type": "geometry", "shapes": [{"type": "hexagon"}]}, 'shapes[0].type')
+    expect_error({"type": "geometry", "shapes": [{"radius": -1}]}, 'shapes[0].radius')
+    expect_error({"type": "geometry", "shapes": [{"position": [20, 0]}]}, 'shapes[0].position')
+    expect_error({"type": "number_line", "start": 3, "end": 1}, 'end')
+    expect_error({"type": "number_line", "points": [{"value": 9}]}, 'points[0].value')
+    expect_error({"type": "function", "transformations": ["x +"]}, 'transformations[0]')
+    print("✅ rejected specs")
+
+
+if __name__ == "__main__":
+    test_original_problem_data()
+    test_idempotent()
+    test_rejected()
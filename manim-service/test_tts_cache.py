@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Test the on-disk TTS audio cache (no server or TTS provider needed)
+"""
+import os
+import tempfile
+import time
+from pathlib import Path
+from tts_cache import TTSCache, tts_cache_key
+
+
+def test_cache_key():
+    """Text, voice, rate and provider each change the key"""
+    key = tts_cache_key("Hello there", "longxiaochun", 0, 'qwen')
+    assert key == tts_cache_key("Hello there", "longxiaochun", 0, 'qwen')
+    assert key != tts_cache_key("Hello there", "longxiaochun", 0, 'gtts')
+    assert key != tts_cache_key("Hello there", "longxiaochun", 0, 'stub')
+    assert key != tts_cache_key("Hello there", "longwan", 0, 'qwen')
+    assert key != tts_cache_key("Hello there", "longxiaochun", 10, 'qwen')
+    assert key != tts_cache_key("Hello again", "longxiaochun", 0, 'qwen')
+    print("✅ cache keys")
+
+
+def test_store_fetch_evict():
+    """Stored audio is served on a hit, and the least recently used is evicted over the limit"""
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        cache = TTSCache(tmp / "cache", max_bytes=250)
+
+        assert cache.fetch("a", tmp / "miss.audio") is False
+        assert not (tmp / "miss.audio").exists()
+
+        for i, name in enumerate(("a", "b", "c")):
+            audio = tmp / f"{name}.mp3"
+            audio.write_bytes(name.encode() * 100)
+            cache.store(name, audio)
+            # Make sure access times differ so LRU order is well defined
+            os.utime(cache.cache_dir / f"{name}.audio", (time.time() - 100 + i, time.time()))
+
+        # Only two 100 byte entries fit in 250 bytes, the least recently used one goes
+        assert cache.fetch("a", tmp / "out_a.audio") is False
+        assert cache.fetch("c", tmp / "out_c.audio") is True
+        assert (tmp / "out_c.audio").read_bytes() == b"c" * 100
+
+        # A hit makes an entry the most recently used, so the next store evicts the other
+        time.sleep(0.01)
+        assert cache.fetch("b", tmp / "out_b.audio") is True
+        (tmp / "d.mp3").write_bytes(b"d" * 100)
+        cache.store("d", tmp / "d.mp3")
+        assert cache.fetch("c", tmp / "out_c2.audio") is False
+        assert cache.fetch("b", tmp / "out_b2.audio") is True
+
+        stats = cache.stats()
+        assert stats["hits"] == 3 and stats["misses"] == 3 and stats["evictions"] == 2, stats
+        assert stats["entries"] == 2 and stats["bytes"] == 200 and stats["hit_ratio"] == 0.5, stats
+        assert not list(cache.cache_dir.glob('*.tmp'))
+    print("✅ store, fetch and eviction")
+
+
+if __name__ == "__main__":
+    test_cache_key()
+    test_store_fetch_evict()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Test the content-addressed video cache (no server or Manim needed)
+"""
+import os
+import tempfile
+import time
+from pathlib import Path
+from video_cache import VideoCache, cache_key
+
+RENDER_CONFIG = {"pixel_width": 1280, "pixel_height": 720, "frame_rate": 30}
+
+
+def test_cache_key():
+    """Formatting-only changes share a key, content and config changes do not"""
+    code = "class GeneratedScene(Scene):\n    def construct(self):\n        pass\n"
+    assert cache_key('dynamic', code, RENDER_CONFIG) == \
+        cache_key('dynamic', code.replace('\n', '  \r\n'), RENDER_CONFIG)
+    assert cache_key('dynamic', code, RENDER_CONFIG) != \
+        cache_key('dynamic', code, RENDER_CONFIG, narration="Hello")
+    assert cache_key('dynamic', code, RENDER_CONFIG) != \
+        cache_key('dynamic', code, dict(RENDER_CONFIG, frame_rate=15))
+    assert cache_key('template', {"type": "graph", "output_file": "a"}, RENDER_CONFIG) == \
+        cache_key('template', {"type": "graph", "output_file": "b"}, RENDER_CONFIG)
+    print("✅ cache keys")
+
+
+def test_store_fetch_evict():
+    """Stored videos are served on a hit and evicted by TTL and size"""
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        cache = VideoCache(tmp / "cache", max_bytes=250, ttl=3600)
+
+        for i, name in enumerate(("a", "b", "c")):
+            video = tmp / f"{name}.mp4"
+            video.write_bytes(b"x" * 100)
+            # Make sure access times differ so LRU order is well defined
+            os.utime(video, (time.time() - 100 + i, time.time()))
+            cache.store(name, video, {"has_audio": False})
+
+        # Only two 100 byte entries fit in 250 bytes, the least recently used one goes
+        assert cache.fetch("a", tmp / "out_a.mp4") is None
+        assert cache.fetch("c", tmp / "out_c.mp4")["has_audio"] is False
+        assert (tmp / "out_c.mp4").read_bytes() == b"x" * 100
+
+        cache.ttl = 0
+        time.sleep(0.01)
+        assert cache.fetch("c", tmp / "out_c3.mp4") is None
+
+        stats = cache.stats()
+        assert stats["hits"] == 1 and stats["misses"] == 2 and stats["evictions"] == 1
+    print("✅ store, fetch and eviction")
+
+
+if __name__ == "__main__":
+    test_cache_key()
+    test_store_fetch_evict()
@@ -0,0 +1,116 @@
+"""
+Persistent on-disk cache of synthesized TTS audio
+Audio is keyed on the cleaned narration text, voice, speech rate and provider,
+so repeated narrations cost a file read instead of a network round trip
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# Configuration
+TTS_CACHE_DIR = Path(os.getenv('TTS_CACHE_DIR', './media/cache/tts'))
+TTS_CACHE_MAX_BYTES = int(os.getenv('TTS_CACHE_MAX_BYTES', str(512 * 1024 ** 2)))
+TTS_CACHE_DISABLED = os.getenv('TTS_CACHE_DISABLED', '').lower() in ('1', 'true', 'yes')
+
+
+def tts_cache_key(clean_text: str, voice: str, speech_rate: int, provider: str) -> str:
+    """Hash everything that determines the synthesized audio"""
+    payload = json.dumps({
+        'text': clean_text,
+        'voice': voice,
+        'speech_rate': speech_rate,
+        'provider': provider,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class TTSCache:
+    """
+    Audio files stored as <key>.audio, evicted least recently used first
+    once their total size passes max_bytes
+    """
+
+    def __init__(self, cache_dir: Path = TTS_CACHE_DIR, max_bytes: int = TTS_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+    def fetch(self, key: str, output_path: Path) -> bool:
+        """Copy cached audio to output_path, returning False on a miss"""
+        audio_path = self.cache_dir / f"{key}.audio"
+        try:
+            shutil.copyfile(audio_path, output_path)
+        except FileNotFoundError:
+            self._count('misses')
+            return False
+
+        # Record the hit in the access time, which drives LRU eviction
+        os.utime(audio_path, (time.time(), audio_path.stat().st_mtime))
+        self._count('hits')
+        return True
+
+    def store(self, key: str, audio_path: Path):
+        """Add synthesized audio to the cache, then evict entries over the size limit"""
+        # Copy under a temporary name and rename, so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        os.close(fd)
+        shutil.copyfile(audio_path, tmp_path)
+        os.replace(tmp_path, self.cache_dir / f"{key}.audio")
+
+        with self._lock:
+            self._stats['stores'] += 1
+            self._evict()
+
+    def stats(self) -> dict:
+        """Hit/miss counters plus the current size of the cache"""
+        entries = list(self.cache_dir.glob('*.audio'))
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+        stats['entries'] = len(entries)
+        stats['bytes'] = sum(p.stat().st_size for p in entries if p.exists())
+        stats['max_bytes'] = self.max_bytes
+        stats['enabled'] = not TTS_CACHE_DISABLED
+        return stats
+
+    def _evict(self):
+        entries = []
+        for audio_path in self.cache_dir.glob('*.audio'):
+            try:
+                stat = audio_path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_atime, stat.st_size, audio_path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, audio_path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            audio_path.unlink(missing_ok=True)
+            self._stats['evictions'] += 1
+            total -= size
+
+    def _count(self, counter: str):
+        with self._lock:
+            self._stats[counter] += 1
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_tts_cache() -> TTSCache:
+    """Return the process-wide TTS cache, creating it on first use"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TTSCache()
+        return _cache
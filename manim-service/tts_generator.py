@@ -2,9 +2,26 @@
 Text-to-Speech generation using QWEN TTS API
 """
 import os
+import shutil
+import time
 from pathlib import Path
 import dashscope
 from dashscope.audio.tts_v2 import SpeechSynthesizer
+from tts_cache import TTS_CACHE_DISABLED, get_tts_cache, tts_cache_key
+from ffmpeg_tools import mp4_outputs, probe_duration, run_ffmpeg
+from metrics import FAILURES, TTS_SECONDS
+
+# How narration is muxed into videos, see combine_video_audio
+MUX_MODE = os.getenv('MUX_MODE', 'auto')
+
+# 'auto' narrates with Qwen when QWEN_API_KEY is set and gTTS otherwise; 'stub'
+# writes a local tone as long as the text would take to say, for load tests
+# and benchmarks that must not call DashScope or Google
+TTS_PROVIDER = os.getenv('TTS_PROVIDER', 'auto')
+
+# Speaking rate the stub assumes, and seconds it waits to stand in for the network
+STUB_CHARS_PER_SECOND = 15
+TTS_STUB_LATENCY = float(os.getenv('TTS_STUB_LATENCY', '0'))
 
 
 import re
@@ -34,7 +51,8 @@ def strip_markdown(text: str) -> str:
     return text.strip()
 
 
-def generate_tts(text: str, output_path: Path, voice: str = "longxiaochun", speech_rate: int = 0) -> bool:
+def generate_tts(text: str, output_path: Path, voice: str = "longxiaochun", speech_rate: int = 0,
+                 use_cache: bool = True) -> bool:
     """
     Generate TTS audio using QWEN's DashScope API
     
@@ -45,6 +63,8 @@ def generate_tts(text: str, output_path: Path, voice: str = "longxiaochun", spee
                Other options: longxiaochun, longwan, longyuan, longshuo, etc.
         speech_rate: Speech rate adjustment (-500 to 500, 0 is normal)
                     Negative = slower, Positive = faster
+        use_cache: Reuse audio previously synthesized for the same text, voice and rate
+                   (also disabled service-wide by TTS_CACHE_DISABLED)
     
     Returns:
         bool: True if successful, False otherwise
@@ -61,34 +81,56 @@ def generate_tts(text: str, output_path: Path, voice: str = "longxiaochun", spee
                 print("[TTS] Error: No text to generate speech from.")
                 return False
         
+        cache = get_tts_cache() if use_cache and not TTS_CACHE_DISABLED else None
+
+        if TTS_PROVIDER == 'stub':
+            return _generate_stub(clean_text, output_path, speech_rate, cache)
+
         # Get API key from environment
         api_key = os.getenv('QWEN_API_KEY')
         
         # Try Qwen TTS if API key is present
         if api_key:
+            qwen_key = tts_cache_key(clean_text, voice, speech_rate, 'qwen')
+            if cache and cache.fetch(qwen_key, output_path):
+                print(f"[TTS] Qwen TTS cache hit. Audio saved to {output_path}")
+                return True
+
             try:
                 print(f"[TTS] Attempting Qwen TTS for text: {clean_text[:50]}...")
                 dashscope.api_key = api_key
                 synthesizer = SpeechSynthesizer(model='cosyvoice-v1', voice=voice)
-                audio_data = synthesizer.call(clean_text)
+                with TTS_SECONDS.time(provider='qwen'):
+                    audio_data = synthesizer.call(clean_text)
                 if audio_data:
                     with open(output_path, 'wb') as f:
                         f.write(audio_data)
                     print(f"[TTS] Qwen TTS success. Audio saved to {output_path}")
+                    if cache:
+                        cache.store(qwen_key, output_path)
                     return True
             except Exception as e:
                 print(f"[TTS] Qwen TTS failed: {str(e)}")
                 print("[TTS] Falling back to gTTS...")
+            FAILURES.inc(cause='tts_fallback')
         else:
             print("[TTS] QWEN_API_KEY not found. Using gTTS fallback...")
 
         # Fallback to gTTS
+        gtts_key = tts_cache_key(clean_text, 'en', speech_rate, 'gtts')
+        if cache and cache.fetch(gtts_key, output_path):
+            print(f"[TTS] gTTS cache hit. Audio saved to {output_path}")
+            return True
+
         try:
             from gtts import gTTS
             print(f"[TTS] Generating audio with gTTS for text: {clean_text[:50]}...")
             tts = gTTS(text=clean_text, lang='en', slow=False)
-            tts.save(str(output_path))
+            with TTS_SECONDS.time(provider='gtts'):
+                tts.save(str(output_path))
             print(f"[TTS] gTTS success. Audio saved to {output_path}")
+            if cache:
+                cache.store(gtts_key, output_path)
             return True
         except Exception as e:
             print(f"[TTS] gTTS failed: {str(e)}")
@@ -101,10 +143,116 @@ def generate_tts(text: str, output_path: Path, voice: str = "longxiaochun", spee
         return False
 
 
-def combine_video_audio(video_path: Path, audio_path: Path, output_path: Path) -> bool:
+def _generate_stub(text: str, output_path: Path, speech_rate: int, cache) -> bool:
+    """
+    Write a 440 Hz tone as long as the text would take to speak, as an MP3
+
+    The same text and rate always give the same audio, so load tests and
+    benchmarks are repeatable; only TTS_STUB_LATENCY is spent waiting.
+    """
+    stub_key = tts_cache_key(text, 'tone', speech_rate, 'stub')
+    if cache and cache.fetch(stub_key, output_path):
+        print(f"[TTS] Stub TTS cache hit. Audio saved to {output_path}")
+        return True
+
+    # speech_rate ranges from -500 (half speed) to 500 (double speed)
+    duration = len(text) / STUB_CHARS_PER_SECOND / 2 ** (speech_rate / 500)
+    try:
+        with TTS_SECONDS.time(provider='stub'):
+            time.sleep(TTS_STUB_LATENCY)
+            run_ffmpeg([
+                '-y',
+                '-f', 'lavfi',
+                '-i', f"sine=frequency=440:duration={max(duration, 0.5):.3f}",
+                '-ac', '1',
+                '-ar', '24000',
+                '-c:a', 'libmp3lame',
+                '-f', 'mp3',
+                str(output_path)
+            ])
+    except Exception as e:
+        details = getattr(e, 'stderr', None) or str(e)
+        print(f"[TTS] Stub TTS failed: {details.strip()[-500:]}")
+        return False
+
+    print(f"[TTS] Stub TTS wrote {duration:.2f}s of audio to {output_path}")
+    if cache:
+        cache.store(stub_key, output_path)
+    return True
+
+
+def combine_video_audio(video_path: Path, audio_path: Path, output_path: Path,
+                        mode: str = MUX_MODE, hls_dir: Path = None) -> bool:
+    """
+    Attach a narration track to a video
+
+    Args:
+        video_path: Path to the video file
+        audio_path: Path to the audio file
+        output_path: Path where combined video will be saved
+        mode: 'copy' to copy the video stream untouched and only encode the audio,
+              'reencode' to re-encode everything with moviepy, or
+              'auto' to try a stream copy and fall back to moviepy
+        hls_dir: Also write the combined video as HLS into this directory while
+                 muxing; only the stream copy does, the moviepy path leaves it out
+
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    if mode in ('auto', 'copy'):
+        if _combine_stream_copy(video_path, audio_path, output_path, hls_dir):
+            return True
+        if mode == 'copy':
+            return False
+        print(f"[TTS] Stream copy failed, falling back to moviepy re-encode...")
+        FAILURES.inc(cause='mux_fallback')
+
+    return _combine_reencode(video_path, audio_path, output_path)
+
+
+def _combine_stream_copy(video_path: Path, audio_path: Path, output_path: Path,
+                         hls_dir: Path = None) -> bool:
+    """
+    Combine video and audio with ffmpeg, copying the H.264 stream as-is
+
+    Only the audio is encoded. As with the moviepy path, audio longer than the
+    video is trimmed and a longer video stays silent at the end.
+    """
+    try:
+        video_duration = probe_duration(video_path)
+        print(f"[TTS] Muxing {audio_path} into {video_path} ({video_duration:.2f}s) with stream copy...")
+
+        run_ffmpeg([
+            '-y',
+            '-i', str(video_path),
+            '-i', str(audio_path),
+            '-map', '0:v:0',
+            '-map', '1:a:0',
+            '-c:v', 'copy',
+            '-c:a', 'aac',
+            '-b:a', '192k',
+            '-t', f"{video_duration:.3f}",
+            *mp4_outputs(output_path, hls_dir)
+        ])
+
+        print(f"[TTS] Combined video saved to {output_path}")
+        return True
+
+    except Exception as e:
+        details = getattr(e, 'stderr', None) or str(e)
+        print(f"[TTS] Stream copy mux failed: {details.strip()[-500:]}")
+        output_path.unlink(missing_ok=True)
+        if hls_dir is not None:
+            shutil.rmtree(hls_dir, ignore_errors=True)
+        return False
+
+
+def _combine_reencode(video_path: Path, audio_path: Path, output_path: Path) -> bool:
     """
     Combine video and audio using moviepy, ensuring proper sync
 
+    Decodes and re-encodes the video, so it also works for inputs that cannot be stream-copied.
+
     Args:
         video_path: Path to the video file
         audio_path: Path to the audio file
@@ -145,7 +293,7 @@ def combine_video_audio(video_path: Path, audio_path: Path, output_path: Path) -
             str(output_path),
             codec='libx264',
             audio_codec='aac',
-            temp_audiofile='temp-audio.m4a',
+            temp_audiofile=str(output_path.with_name(f"{output_path.stem}_temp-audio.m4a")),
             remove_temp=True,
             fps=video.fps,
             preset='medium',
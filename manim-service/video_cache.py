@@ -0,0 +1,190 @@
+"""
+Content-addressed cache of finished videos
+Videos are keyed on the scene source, the render config and the narration,
+so repeated scenes are served without rendering or TTS
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+
+# Configuration
+VIDEO_CACHE_DIR = Path(os.getenv('VIDEO_CACHE_DIR', './media/cache/videos'))
+VIDEO_CACHE_MAX_BYTES = int(os.getenv('VIDEO_CACHE_MAX_BYTES', str(2 * 1024 ** 3)))
+VIDEO_CACHE_TTL = int(os.getenv('VIDEO_CACHE_TTL', str(7 * 24 * 3600)))
+
+
+def normalize_code(code: str) -> str:
+    """Normalize line endings and trailing whitespace, which never change the render"""
+    lines = code.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    return '\n'.join(line.rstrip() for line in lines).strip('\n')
+
+
+def cache_key(kind: str, source, render_config: dict, narration: str = '') -> str:
+    """
+    Hash everything that determines the output video
+
+    Args:
+        kind: 'dynamic' for generated code or 'template' for /generate problem data
+        source: Scene code (normalized here) or problem data dictionary
+        render_config: Resolution and frame rate the scene is rendered at
+        narration: Narration text, empty for silent videos
+
+    Returns:
+        str: Hex digest identifying the video
+    """
+    if kind == 'dynamic':
+        source = normalize_code(source)
+    else:
+        source = {k: v for k, v in source.items() if k != 'output_file'}
+
+    payload = json.dumps({
+        'kind': kind,
+        'source': source,
+        'render_config': render_config,
+        'narration': narration.strip(),
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def link_or_copy(src: Path, dest: Path):
+    """Hardlink src to dest, copying when the paths are on different filesystems"""
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copy(src, dest)
+
+
+class VideoCache:
+    """
+    Finished videos stored as <key>.mp4 with a <key>.json metadata file
+
+    Entries expire VIDEO_CACHE_TTL seconds after they are stored, and the least
+    recently hit entries are evicted once the cache grows past VIDEO_CACHE_MAX_BYTES.
+    """
+
+    def __init__(self, cache_dir: Path = VIDEO_CACHE_DIR, max_bytes: int = VIDEO_CACHE_MAX_BYTES,
+                 ttl: int = VIDEO_CACHE_TTL):
+        self.cache_dir = cache_dir
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+    def fetch(self, key: str, dest: Path):
+        """
+        Publish a cached video to dest
+
+        Returns:
+            dict: Metadata stored with the video, or None on a miss
+        """
+        video_path = self.cache_dir / f"{key}.mp4"
+        meta = self._read_meta(key)
+
+        if meta is None or not video_path.exists() or time.time() - meta['stored_at'] > self.ttl:
+            self._count('misses')
+            return None
+
+        # Link under a temporary name and rename, so a video already published at
+        # dest (e.g. a preview being upgraded) is replaced atomically
+        tmp_dest = dest.with_name(f"{dest.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            link_or_copy(video_path, tmp_dest)
+        except FileNotFoundError:
+            # Evicted between the check and the link
+            tmp_dest.unlink(missing_ok=True)
+            self._count('misses')
+            return None
+        os.replace(tmp_dest, dest)
+
+        # Record the hit in the access time, which drives LRU eviction
+        stat = video_path.stat()
+        os.utime(video_path, (time.time(), stat.st_mtime))
+        self._count('hits')
+        return meta
+
+    def store(self, key: str, video_path: Path, meta: dict = None):
+        """Add a finished video to the cache, then evict entries over the limits"""
+        meta = dict(meta or {}, stored_at=time.time())
+
+        with self._lock:
+            # Link under a temporary name and rename, so readers never see a partial entry
+            tmp_path = self.cache_dir / f".{key}.{os.getpid()}.{threading.get_ident()}.tmp"
+            link_or_copy(video_path, tmp_path)
+            os.replace(tmp_path, self.cache_dir / f"{key}.mp4")
+
+            fd, tmp_meta = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(meta, f)
+            os.replace(tmp_meta, self.cache_dir / f"{key}.json")
+
+            self._stats['stores'] += 1
+            self._evict()
+
+    def stats(self) -> dict:
+        """Hit/miss counters plus the current size of the cache"""
+        entries = list(self.cache_dir.glob('*.mp4'))
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+        stats['entries'] = len(entries)
+        stats['bytes'] = sum(p.stat().st_size for p in entries if p.exists())
+        stats['max_bytes'] = self.max_bytes
+        stats['ttl'] = self.ttl
+        return stats
+
+    def _evict(self):
+        now = time.time()
+        entries = []
+        for video_path in self.cache_dir.glob('*.mp4'):
+            try:
+                stat = video_path.stat()
+            except FileNotFoundError:
+                continue
+            if now - stat.st_mtime > self.ttl:
+                self._remove(video_path)
+            else:
+                entries.append((stat.st_atime, stat.st_size, video_path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, video_path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(video_path)
+            total -= size
+
+    def _remove(self, video_path: Path):
+        video_path.unlink(missing_ok=True)
+        video_path.with_suffix('.json').unlink(missing_ok=True)
+        self._stats['evictions'] += 1
+
+    def _read_meta(self, key: str):
+        try:
+            with open(self.cache_dir / f"{key}.json") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _count(self, counter: str):
+        with self._lock:
+            self._stats[counter] += 1
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_video_cache() -> VideoCache:
+    """Return the process-wide video cache, creating it on first use"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = VideoCache()
+        return _cache
@@ -0,0 +1,62 @@
+"""
+Counters and stage timings kept by render workers and reported to the API process
+Workers count cache hits and misses locally and send them with every render result,
+where they are added to service-wide totals for /stats and /metrics
+"""
+import threading
+
+# Counters of the current process, taken and reset with every render result
+_counts = {}
+_counts_lock = threading.Lock()
+
+# (stage, seconds) observations of the current process, taken with every render result
+_timings = []
+
+# Counters reported by the render workers, aggregated in the API process
+_totals = {}
+_totals_lock = threading.Lock()
+
+
+def count(counter: str, amount=1):
+    """Add amount to a counter of this process"""
+    with _counts_lock:
+        _counts[counter] = _counts.get(counter, 0) + amount
+
+
+def observe(stage: str, seconds: float):
+    """Record the seconds a stage of the current job took in this process"""
+    with _counts_lock:
+        _timings.append((stage, seconds))
+
+
+def take_timings() -> list:
+    """Return this process's stage timings and reset them"""
+    global _timings
+    with _counts_lock:
+        timings, _timings = _timings, []
+    return timings
+
+
+def take_counts() -> dict:
+    """Return this process's counters and reset them"""
+    global _counts
+    with _counts_lock:
+        counts, _counts = _counts, {}
+    return counts
+
+
+def record_counts(counts: dict):
+    """Add counters taken in a render worker to the service totals"""
+    if not counts:
+        return
+    with _totals_lock:
+        for counter, amount in counts.items():
+            _totals[counter] = _totals.get(counter, 0) + amount
+
+
+def totals(prefix: str) -> dict:
+    """Service totals of the counters named '<prefix>.<name>', keyed by name"""
+    prefix = f"{prefix}."
+    with _totals_lock:
+        return {name[len(prefix):]: amount for name, amount in _totals.items()
+                if name.startswith(prefix)}
@@ -32,6 +32,44 @@ function log(message: string) {
 
 import { generateManimCode } from './generate-manim-code';
 
+interface ManimJob {
+  job_id: string;
+  status: 'queued' | 'rendering' | 'tts' | 'muxing' | 'done' | 'failed';
+  error?: string;
+  details?: string;
+  result?: {
+    video_id: string;
+    video_url: string;
+    has_audio?: boolean;
+  };
+}
+
+const JOB_POLL_INTERVAL_MS = 1000;
+const JOB_TIMEOUT_MS = 5 * 60 * 1000;
+
+/**
+ * Poll a Manim service job until it is done or failed
+ */
+async function waitForManimJob(jobId: string): Promise<ManimJob> {
+  const deadline = Date.now() + JOB_TIMEOUT_MS;
+
+  while (Date.now() < deadline) {
+    const response = await fetch(`${MANIM_SERVICE_URL}/jobs/${jobId}`);
+    if (!response.ok) {
+      throw new Error(`Manim service error ${response.status} while polling job ${jobId}`);
+    }
+
+    const job: ManimJob = await response.json();
+    if (job.status === 'done' || job.status === 'failed') {
+      return job;
+    }
+
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+  }
+
+  throw new Error(`Manim job ${jobId} did not finish within ${JOB_TIMEOUT_MS / 1000}s`);
+}
+
 export default async function handler(
   req: NextApiRequest,
   res: NextApiResponse<VisualizeResponse>
@@ -80,9 +118,31 @@ export default async function handler(
         // Removed logging explanation to file to avoid large file writes
         // log(`Explanation: ${explanation}`);
 
-        // Call Manim service with generated code and narration
+        // Dry-run the scene first: runtime errors show up without rendering a frame
+        const validateResponse = await fetch(`${MANIM_SERVICE_URL}/validate`, {
+          method: 'POST',
+          headers: {
+            'Content-Type': 'application/json',
+          },
+          body: JSON.stringify({ code }),
+        });
+
+        log(`Manim validate status: ${validateResponse.status}`);
+
+        if (validateResponse.status === 422) {
+          const validation = await validateResponse.json();
+          log(`Validation failed: ${JSON.stringify(validation)}`);
+          lastError = validation.details || validation.error || 'Unknown Manim error';
+          if (attempt === MAX_RETRIES) {
+            throw new Error(`Manim service failed: ${lastError}`);
+          }
+          continue;
+        }
+        // Any other validation failure is not the code's fault, let the render decide
+
+        // Queue the render on the Manim service, then poll until it finishes
         log(`Calling Manim service at: ${MANIM_SERVICE_URL}`);
-        const manimResponse = await fetch(`${MANIM_SERVICE_URL}/generate-dynamic`, {
+        const submitResponse = await fetch(`${MANIM_SERVICE_URL}/jobs`, {
           method: 'POST',
           headers: {
             'Content-Type': 'application/json',
@@ -93,17 +153,37 @@ export default async function handler(
           }),
         });
 
-        log(`Manim response status: ${manimResponse.status}`);
+        log(`Manim submit status: ${submitResponse.status}`);
 
-        if (!manimResponse.ok) {
-          const errorData = await manimResponse.json();
+        if (!submitResponse.ok) {
+          const errorData = await submitResponse.json();
           log(`ERROR from Manim service: ${JSON.stringify(errorData)}`);
 
-          // Only retry if it's a code execution error (usually 500 from Manim service with details)
-          // If it's a 400 (bad request) or other error, it might not be fixable by LLM
-          if (manimResponse.status === 500 && errorData.details) {
+          // Code rejected by the static pre-flight checks, retry without rendering
+          if (submitResponse.status === 422 && errorData.details) {
+            lastError = errorData.details;
+            if (attempt === MAX_RETRIES) {
+              throw new Error(`Manim service failed: ${lastError}`);
+            }
+            continue;
+          }
+
+          throw new Error(errorData.error || `Manim service error ${submitResponse.status}`);
+        }
+
+        const { job_id: jobId } = await submitResponse.json();
+        const job = await waitForManimJob(jobId);
+
+        log(`Manim job ${jobId} finished with status: ${job.status}`);
+
+        if (job.status === 'failed') {
+          log(`ERROR from Manim service: ${JSON.stringify(job)}`);
+
+          // Only retry if it's a code execution error (failed render with details)
+          // Other failures (e.g. timeouts) might not be fixable by LLM
+          if (job.details) {
             // Capture error for retry
-            lastError = errorData.details || errorData.error || 'Unknown Manim error';
+            lastError = job.details || job.error || 'Unknown Manim error';
 
             // If it's the last attempt, throw to exit loop
             if (attempt === MAX_RETRIES) {
@@ -113,12 +193,15 @@ export default async function handler(
             // Continue to next iteration (retry)
             continue;
           } else {
-            // Non-retriable error (e.g. service down, bad request structure)
-            throw new Error(errorData.error || `Manim service error ${manimResponse.status}`);
+            // Non-retriable error
+            throw new Error(job.error || 'Manim service error');
           }
         }
 
-        const result = await manimResponse.json();
+        const result = job.result;
+        if (!result) {
+          throw new Error(`Manim job ${jobId} finished without a result`);
+        }
         log(`SUCCESS! Video ID: ${result.video_id}`);
 
         return res.status(200).json({